@@ -1,132 +1,273 @@
-"""
-Django settings for leetcode_forum project.
-
-Generated by 'django-admin startproject' using Django 5.1.7.
-
-For more information on this file, see
-https://docs.djangoproject.com/en/5.1/topics/settings/
-
-For the full list of settings and their values, see
-https://docs.djangoproject.com/en/5.1/ref/settings/
-"""
-
-from pathlib import Path
-
-# Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
-
-STATIC_URL = '/static/'
-STATICFILES_DIRS = [
-    BASE_DIR / "problems/static",
-]
-STATIC_ROOT = BASE_DIR / "staticfiles"
-
-MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
-
-# Quick-start development settings - unsuitable for production
-# See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
-
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-7ht$s$qqoeuxc^1mo%_844ai$$5c-v4^3ksuwa%dt6#1%8@669'
-
-# SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
-
-ALLOWED_HOSTS = []
-
-
-# Application definition
-
-INSTALLED_APPS = [
-    'django.contrib.admin',
-    'django.contrib.auth',
-    'django.contrib.contenttypes',
-    'django.contrib.sessions',
-    'django.contrib.messages',
-    'django.contrib.staticfiles',
-    'problems'
-]
-
-MIDDLEWARE = [
-    'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
-]
-
-ROOT_URLCONF = 'leetcode_forum.urls'
-
-TEMPLATES = [
-    {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
-        'APP_DIRS': True,
-        'OPTIONS': {
-            'context_processors': [
-                'django.template.context_processors.debug',
-                'django.template.context_processors.request',
-                'django.contrib.auth.context_processors.auth',
-                'django.contrib.messages.context_processors.messages',
-            ],
-        },
-    },
-]
-
-WSGI_APPLICATION = 'leetcode_forum.wsgi.application'
-
-
-# Database
-# https://docs.djangoproject.com/en/5.1/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
-
-
-# Password validation
-# https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
-
-AUTH_PASSWORD_VALIDATORS = [
-    {
-        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
-    },
-]
-
-
-# Internationalization
-# https://docs.djangoproject.com/en/5.1/topics/i18n/
-
-LANGUAGE_CODE = 'en-us'
-
-TIME_ZONE = 'UTC'
-
-USE_I18N = True
-
-USE_TZ = True
-
-
-# Static files (CSS, JavaScript, Images)
-# https://docs.djangoproject.com/en/5.1/howto/static-files/
-
-STATIC_URL = 'static/'
-
-# Default primary key field type
-# https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
-
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+"""
+Django settings for leetcode_forum project.
+
+Generated by 'django-admin startproject' using Django 5.1.7.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.1/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/5.1/ref/settings/
+"""
+
+import os
+from pathlib import Path
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+STATIC_URL = '/static/'
+STATICFILES_DIRS = [
+    BASE_DIR / "problems/static",
+]
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = 'django-insecure-7ht$s$qqoeuxc^1mo%_844ai$$5c-v4^3ksuwa%dt6#1%8@669'
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = True
+
+ALLOWED_HOSTS = []
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'problems'
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    # Collected static files, precompressed, with far-future caching (problems/storage.py)
+    'problems.middleware.StaticFilesMiddleware',
+    # Server-Timing and slow-request traces for a sample of requests (PROFILE_* below)
+    'problems.middleware.ProfilingMiddleware',
+    # gzip for HTML/JSON responses of COMPRESS_MIN_SIZE bytes or more
+    'problems.middleware.CompressionMiddleware',
+    # Reads of use_replica views stay on the primary right after a client writes
+    'problems.middleware.ReplicaPinMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'leetcode_forum.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'leetcode_forum.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+
+# SQLite by default, tuned for concurrent requests: IMMEDIATE transactions
+# take the write lock up front (so two writers queue on the busy timeout
+# instead of failing with "database is locked" when upgrading a read lock).
+# SQLITE_WAL=1 also turns on WAL, which lets readers run while someone writes.
+# WAL is recorded in the database file itself (and adds -wal/-shm files next
+# to it), so it is opt-in: with it on, even `manage.py check` rewrites the
+# header of the db.sqlite3 checked into the repository.
+# Set DATABASE_ENGINE=postgres (and the POSTGRES_* variables) for PostgreSQL.
+#
+# CONN_MAX_AGE keeps connections open between requests. It only pays off
+# under WSGI: under ASGI (the judge views are async) every sync_to_async
+# thread opens connections of its own, and persistent ones pile up and leak
+# instead of being reused, so the default is 0, a connection per request.
+# Under ASGI on PostgreSQL, set POSTGRES_POOL=1 for psycopg's connection pool
+# instead (it needs psycopg[pool] and CONN_MAX_AGE=0).
+#
+# A 'replica' alias, when configured (POSTGRES_REPLICA_HOST, or
+# SQLITE_REPLICA_PATH pointing at a copy kept fresh with
+# `manage.py sync_sqlite_replica`), serves the reads of the views marked
+# with problems.routers.use_replica; see problems/routers.py.
+CONN_MAX_AGE = int(os.environ.get('CONN_MAX_AGE', 0))
+SQLITE_WAL = os.environ.get('SQLITE_WAL') == '1'
+SQLITE_OPTIONS = {
+    'timeout': 20,  # busy_timeout, in seconds
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': ';'.join([
+        *([
+            'PRAGMA journal_mode=WAL',
+            # Durable at every checkpoint rather than every commit; safe with WAL only
+            'PRAGMA synchronous=NORMAL',
+        ] if SQLITE_WAL else []),
+        'PRAGMA mmap_size=268435456',
+        'PRAGMA cache_size=-20000',
+        'PRAGMA temp_store=MEMORY',
+    ]),
+}
+
+if os.environ.get('DATABASE_ENGINE') == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'codehub'),
+            'USER': os.environ.get('POSTGRES_USER', 'codehub'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'pool': True} if os.environ.get('POSTGRES_POOL') else {},
+        }
+    }
+    if os.environ.get('POSTGRES_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.environ['POSTGRES_REPLICA_HOST'],
+            'PORT': os.environ.get('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': SQLITE_OPTIONS,
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.environ.get('SQLITE_REPLICA_PATH'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'NAME': os.environ['SQLITE_REPLICA_PATH'],
+            'TEST': {'MIRROR': 'default'},
+        }
+
+DATABASE_ROUTERS = ['problems.routers.ReplicaRouter']
+# After a write, a client reads from the primary for this long (replication lag)
+REPLICA_PIN_SECONDS = 5
+
+
+# Password validation
+# https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/5.1/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/5.1/howto/static-files/
+
+STATIC_URL = 'static/'
+
+# collectstatic writes content-hashed copies plus .gz (and .br, when the brotli
+# package is installed) variants; run it again after changing static files
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'problems.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Smaller dynamic responses aren't worth compressing
+COMPRESS_MIN_SIZE = 1024
+
+# The 'judge' cache holds the judge's admission control state (rate limits,
+# concurrency slots; see problems/admission.py). Point JUDGE_CACHE_URL at a
+# Redis server so the limits hold across web workers; without it every process
+# keeps its own.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'judge': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['JUDGE_CACHE_URL'],
+    } if os.environ.get('JUDGE_CACHE_URL') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'judge',
+    },
+}
+
+# Sessions go through problems.sessions, which counts session writes and
+# payload bytes for ProfilingMiddleware on top of SESSION_BACKEND. With Redis
+# at JUDGE_CACHE_URL, sessions are read from it and written through to the
+# database (Django's cached_db engine). A local-memory cache is private to one
+# process: a logout or key rotation in one worker would leave the others
+# serving their stale copy, so without Redis sessions stay in the database alone.
+SESSION_ENGINE = 'problems.sessions'
+if os.environ.get('JUDGE_CACHE_URL'):
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['JUDGE_CACHE_URL'],
+    }
+    SESSION_CACHE_ALIAS = 'sessions'
+    SESSION_BACKEND = 'django.contrib.sessions.backends.cached_db'
+else:
+    SESSION_BACKEND = 'django.contrib.sessions.backends.db'
+
+# Request profiling (problems.middleware.ProfilingMiddleware). PROFILE_SAMPLE_RATE
+# is the share of requests measured (0 turns it off); the sampled ones taking
+# PROFILE_SLOW_MS or more are traced to PROFILE_LOG. Requests to
+# PROFILE_CAPTURE_PATHS (regular expressions), or sending the header with
+# PROFILE_CAPTURE_TOKEN, are also run under cProfile.
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_SLOW_MS = 500
+PROFILE_LOG = BASE_DIR / 'logs' / 'slow_requests.log'
+PROFILE_CAPTURE_HEADER = 'X-Profile'
+PROFILE_CAPTURE_TOKEN = os.environ.get('PROFILE_CAPTURE_TOKEN', '')
+PROFILE_CAPTURE_PATHS = []
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
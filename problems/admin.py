@@ -1,6 +1,172 @@
 # problems/admin.py
-from django.contrib import admin
-from .models import Problem, Tag, TestCase, Solution
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.utils import get_deleted_objects
+from django.contrib.admin.views.main import PAGE_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.db import close_old_connections, connections, transaction
+from django.template.defaultfilters import truncatechars
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils.functional import cached_property
+from . import fingerprints
+from .models import Problem, Tag, TestCase, Solution, SolutionMatch
+
+# Changelists of tables this big show an estimate instead of running COUNT(*)
+EXACT_COUNT_BELOW = 10000
+JSON_PREVIEW_CHARS = 80
+# The delete confirmation page lists this many of the objects that go
+DELETE_PREVIEW_LIMIT = 100
+DELETE_BATCH_SIZE = 500
+
+_rejudge_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='admin-rejudge')
+
+
+def estimated_count(queryset):
+    """The planner's row count of the queryset's table, or None where the database keeps none."""
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            # Written by ANALYZE; the first number of a row is the table's row count
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone():
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+                row = cursor.fetchone()
+                if row:
+                    return int(row[0].split()[0])
+            # Never analyzed: the highest rowid bounds the count and is one index seek away
+            cursor.execute(f"SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}")
+            return cursor.fetchone()[0] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Pages an unfiltered changelist of a big table without counting every row."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None and estimate >= EXACT_COUNT_BELOW:
+                return estimate
+        return super().count
+
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    """Filter on one related object picked with the admin's autocomplete box.
+
+    For foreign keys to tables too big for the usual list of links (every
+    problem, every user). The related model's admin needs search_fields.
+    """
+    template = 'admin/problems/autocomplete_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        self.parameter_name = f'{self.field_name}__id__exact'
+        self.field = model._meta.get_field(self.field_name)
+        self.admin_site = model_admin.admin_site
+        super().__init__(request, params, model, model_admin)
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value is None:
+            return queryset
+        if not value.isdigit():
+            return queryset.none()
+        return queryset.filter(**{f'{self.field_name}_id': value})
+
+    def choices(self, changelist):
+        base = changelist.get_query_string(remove=[self.parameter_name, PAGE_VAR])
+        remote = self.field.remote_field.model
+        widget = AutocompleteSelect(self.field, self.admin_site, attrs={
+            'data-filter-url': base + ('&' if len(base) > 1 else ''),
+            'onchange': "location.href = this.dataset.filterUrl"
+                        " + (this.value ? this.name + '=' + encodeURIComponent(this.value) : '')",
+        }, choices=forms.ModelChoiceField(remote._default_manager.all()).choices)
+        yield {'widget': widget.render(self.parameter_name, self.value())}
+
+
+class ProblemFilter(AutocompleteFilter):
+    title = 'problem'
+    field_name = 'problem'
+
+
+class AuthorFilter(AutocompleteFilter):
+    title = 'author'
+    field_name = 'created_by'
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Changelist settings for the big tables: estimated counts, batched deletes."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @property
+    def media(self):
+        # The autocomplete filters' select2 scripts
+        return super().media + AutocompleteSelect(None, self.admin_site).media
+
+    def get_deleted_objects(self, objs, request):
+        # Django's confirmation page lists every object that goes (with its
+        # test cases, solutions, fingerprints...); the per-model summary stays complete
+        deleted, model_count, perms_needed, protected = get_deleted_objects(objs, request, self.admin_site)
+        if len(deleted) > DELETE_PREVIEW_LIMIT:
+            deleted = deleted[:DELETE_PREVIEW_LIMIT] + [f'... and {len(deleted) - DELETE_PREVIEW_LIMIT} more']
+        return deleted, model_count, perms_needed, protected
+
+    def delete_queryset(self, request, queryset):
+        # In batches, so a big delete doesn't hold the write lock for its whole duration
+        ids = list(queryset.values_list('pk', flat=True))
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            with transaction.atomic():
+                self.model._default_manager.filter(pk__in=ids[start:start + DELETE_BATCH_SIZE]).delete()
+
+
+def _rejudge_in_background(filters):
+    close_old_connections()
+    fd, checkpoint = tempfile.mkstemp(prefix='rejudge-', suffix='.json')
+    os.close(fd)
+    os.remove(checkpoint)
+    try:
+        call_command('rejudge', checkpoint=checkpoint, **filters)
+    except Exception as exc:
+        print(f"Admin rejudge of {filters} failed: {exc}")
+    finally:
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        close_old_connections()
+
+
+def schedule_rejudge(modeladmin, request, filters, what):
+    """Run ``manage.py rejudge`` with ``filters`` on a background thread, one run at a time."""
+    transaction.on_commit(lambda: _rejudge_executor.submit(_rejudge_in_background, filters))
+    modeladmin.message_user(
+        request, f"Rejudging {what} in the background; verdicts update as each batch finishes.", messages.SUCCESS,
+    )
+
+
+def json_preview(value):
+    # Test cases store their JSON either decoded or as the submitted text
+    return truncatechars(value if isinstance(value, str) else json.dumps(value), JSON_PREVIEW_CHARS)
 
 # Customize Tag admin view
 @admin.register(Tag)
@@ -10,26 +176,115 @@ class TagAdmin(admin.ModelAdmin):
 
 # Customize TestCase admin view
 @admin.register(TestCase)
-class TestCaseAdmin(admin.ModelAdmin):
-    list_display = ('problem', 'input_value', 'expected_output')
-    list_filter = ('problem',)
-    search_fields = ('problem__title',)
+class TestCaseAdmin(ScalableAdmin):
+    list_display = ('problem', 'input_preview', 'output_preview')
+    list_select_related = ('problem',)
+    list_filter = (ProblemFilter,)
+    # Prefix search, served by problem_title_search_idx
+    search_fields = ('^problem__title',)
+    autocomplete_fields = ('problem',)
+
+    @admin.display(description='input')
+    def input_preview(self, test_case):
+        return json_preview(test_case.input_value)
+
+    @admin.display(description='expected output')
+    def output_preview(self, test_case):
+        return json_preview(test_case.expected_output)
+
+class SolutionAdminForm(forms.ModelForm):
+    # Edits the code itself; the blob it ends up in is picked on save
+    code = forms.CharField(widget=forms.Textarea(attrs={'rows': 20, 'cols': 100, 'spellcheck': 'false'}),
+                           strip=False)
+
+    class Meta:
+        model = Solution
+        exclude = ('code_blob',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.initial['code'] = self.instance.code
+
+    def save(self, commit=True):
+        self.instance.code = self.cleaned_data['code']
+        return super().save(commit)
 
 # Customize Solution admin view
 @admin.register(Solution)
-class SolutionAdmin(admin.ModelAdmin):
-    list_display = ('problem', 'created_by', 'created_at')
-    list_filter = ('problem', 'created_at')
-    search_fields = ('problem__title', 'created_by__username')
+class SolutionAdmin(ScalableAdmin):
+    form = SolutionAdminForm
+    list_display = ('problem', 'created_by', 'verdict', 'created_at')
+    list_select_related = ('problem', 'created_by')
+    list_filter = (ProblemFilter, AuthorFilter, 'verdict', 'created_at')
+    # Prefix search on the title, exact username: both use an index
+    search_fields = ('^problem__title', 'created_by__username__exact')
+    autocomplete_fields = ('problem', 'created_by')
+    actions = ('rejudge',)
+
+    @admin.action(description='Rejudge selected solutions', permissions=['change'])
+    def rejudge(self, request, queryset):
+        ids = list(queryset.values_list('pk', flat=True))
+        schedule_rejudge(self, request, {'solution': ids}, f"{len(ids)} solutions")
 
 class TestCaseInline(admin.TabularInline):
     model = TestCase
     extra = 1
 
 @admin.register(Problem)
-class ProblemAdmin(admin.ModelAdmin):
-    list_display = ('title', 'difficulty', 'created_by', 'created_at')
-    list_filter = ('difficulty', 'created_at', 'tags')
-    search_fields = ('title', 'description')
+class ProblemAdmin(ScalableAdmin):
+    list_display = ('title', 'difficulty', 'time_limit_ms', 'memory_limit_mb', 'created_by', 'created_at')
+    list_select_related = ('created_by',)
+    list_filter = ('difficulty', 'created_at', 'tags', AuthorFilter)
+    # Title prefix (problem_title_search_idx); also what the autocomplete boxes search
+    search_fields = ('^title',)
+    # Also orders the autocomplete results; problem_created_idx
+    ordering = ('-created_at',)
     filter_horizontal = ('tags',)
-    inlines = [TestCaseInline]  # Add this
\ No newline at end of file
+    autocomplete_fields = ('created_by',)
+    inlines = [TestCaseInline]  # Add this
+    actions = ('rejudge',)
+
+    @admin.action(description='Rejudge all solutions of selected problems', permissions=['change'])
+    def rejudge(self, request, queryset):
+        ids = list(queryset.values_list('pk', flat=True))
+        count = Solution.objects.filter(problem_id__in=ids).count()
+        schedule_rejudge(self, request, {'problem': ids}, f"{count} solutions of {len(ids)} problems")
+
+# Copy detection: matching pairs, and the clusters they form
+@admin.register(SolutionMatch)
+class SolutionMatchAdmin(ScalableAdmin):
+    list_display = ('problem', 'solution', 'other', 'similarity', 'shared', 'detected_at')
+    list_select_related = ('problem', 'solution__created_by', 'other__created_by')
+    list_filter = ('detected_at',)
+    search_fields = ('problem__title', 'solution__created_by__username', 'other__created_by__username')
+    ordering = ('-similarity',)
+    change_list_template = 'admin/problems/solutionmatch/change_list.html'
+    max_clusters = 200
+
+    def get_urls(self):
+        return [
+            path('clusters/', self.admin_site.admin_view(self.clusters_view), name='problems_solutionmatch_clusters'),
+        ] + super().get_urls()
+
+    def clusters_view(self, request):
+        problem_id = request.GET.get('problem')
+        clusters = fingerprints.clusters(int(problem_id) if problem_id and problem_id.isdigit() else None)
+        shown = clusters[:self.max_clusters]
+        solutions = Solution.objects.select_related('problem', 'created_by').in_bulk(
+            {solution_id for cluster in shown for solution_id in cluster['solution_ids']}
+        )
+        for cluster in shown:
+            cluster['solutions'] = sorted(
+                (solutions[solution_id] for solution_id in cluster['solution_ids'] if solution_id in solutions),
+                key=lambda solution: solution.created_at,
+            )
+            cluster['problem'] = cluster['solutions'][0].problem if cluster['solutions'] else None
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Suspicious solution clusters',
+            'clusters': shown,
+            'total': len(clusters),
+        }
+        return TemplateResponse(request, 'admin/problems/solutionmatch/clusters.html', context)
@@ -0,0 +1,246 @@
+# problems/admission.py
+#
+# Admission control in front of the judge. Every run (Run, Submit, the
+# streamed variant, the create-problem check) has to get past:
+#   1. a token bucket per user (or per IP for anonymous runs): BUCKET_SIZE
+#      runs in a burst, then one every 1 / REFILL_PER_SECOND seconds;
+#   2. a global ceiling of MAX_CONCURRENT runs, as self-expiring slot leases
+#      that the run renews while it lasts, so a long run keeps its slot and
+#      a worker that dies mid-run can't leak capacity;
+#   3. a bounded wait for a slot: past MAX_WAITING queued runs, or after
+#      MAX_WAIT seconds, the run is shed with a "retry in N s" answer and
+#      its token goes back to the bucket (retrying doesn't use up the rate).
+# The state lives in the 'judge' cache (Redis via JUDGE_CACHE_URL, so limits
+# hold across web workers); if that cache is unreachable, a per-process
+# local-memory cache takes over until it comes back.
+import asyncio
+import math
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+BUCKET_SIZE = 6
+REFILL_PER_SECOND = 0.2
+MAX_CONCURRENT = 8
+MAX_WAITING = 16
+MAX_WAIT = 10
+POLL_INTERVAL = 0.1
+# A held slot's lease is renewed every SLOT_RENEW_EVERY seconds for as long as
+# the run lasts; a crashed worker's slot frees itself SLOT_LEASE seconds later
+SLOT_LEASE = 30
+SLOT_RENEW_EVERY = 10
+# How long the count of waiting runs outlives its last change
+QUEUE_TTL = MAX_WAIT * 3
+# Used to turn the queue depth into a Retry-After estimate
+TYPICAL_RUN_SECONDS = 3
+SHARED_RETRY_AFTER = 30
+
+_local = LocMemCache('judge-admission', {})
+_shared_down_until = 0.0
+# Running renewal tasks (the event loop only keeps weak references)
+_renewals = set()
+
+
+class Throttled(Exception):
+    """The run was not admitted; ``status`` is 429 (the user's rate) or 503 (the judge is busy)."""
+
+    def __init__(self, message, retry_after, status):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status = status
+
+
+def client_key(request, user):
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+async def _cache(method, *args):
+    """Call a cache method on the shared cache, or on the local fallback while it is down."""
+    global _shared_down_until
+    alias = 'judge' if 'judge' in settings.CACHES else 'default'
+    if time.monotonic() >= _shared_down_until:
+        try:
+            return await getattr(caches[alias], method)(*args)
+        except ValueError:
+            # incr/decr of a missing key: not an outage
+            raise
+        except Exception as exc:
+            print(f"Judge admission cache unavailable, using local limits for {SHARED_RETRY_AFTER}s: {exc}")
+            _shared_down_until = time.monotonic() + SHARED_RETRY_AFTER
+    return await getattr(_local, method)(*args)
+
+
+@asynccontextmanager
+async def _bucket_lock(bucket):
+    lock = f'{bucket}:lock'
+    locked = False
+    for _ in range(20):
+        locked = await _cache('aadd', lock, 1, 1)
+        if locked:
+            break
+        await asyncio.sleep(0.005)
+    # Without the lock (another request of the same client holds it) the
+    # worst case is one extra token; better than failing the run
+    try:
+        yield
+    finally:
+        if locked:
+            await _cache('adelete', lock)
+
+
+async def _add_tokens(bucket, delta):
+    """Refill the bucket up to now, add ``delta`` tokens; returns the tokens it had before ``delta``."""
+    now = time.time()
+    tokens, updated = await _cache('aget', bucket) or (BUCKET_SIZE, now)
+    tokens = min(BUCKET_SIZE, tokens + (now - updated) * REFILL_PER_SECOND)
+    if tokens + delta >= 0:
+        await _cache('aset', bucket, (min(BUCKET_SIZE, tokens + delta), now), math.ceil(BUCKET_SIZE / REFILL_PER_SECOND))
+    return tokens
+
+
+async def _take_token(key):
+    """0 if the client may run now, else the seconds until it may."""
+    bucket = f'judge:bucket:{key}'
+    async with _bucket_lock(bucket):
+        tokens = await _add_tokens(bucket, -1)
+        return 0 if tokens >= 1 else (1 - tokens) / REFILL_PER_SECOND
+
+
+async def _refund_token(key):
+    """Give back the token of a run that was shed, so retrying an overloaded judge doesn't use up the rate."""
+    bucket = f'judge:bucket:{key}'
+    async with _bucket_lock(bucket):
+        await _add_tokens(bucket, 1)
+
+
+async def _try_slot():
+    lease = uuid.uuid4().hex
+    for index in range(MAX_CONCURRENT):
+        slot = f'judge:slot:{index}'
+        if await _cache('aadd', slot, lease, SLOT_LEASE):
+            task = asyncio.create_task(_renew((slot, lease)))
+            _renewals.add(task)
+            task.add_done_callback(_renewals.discard)
+            return slot, lease
+    return None
+
+
+async def _renew(slot):
+    """Extend a slot's lease while it is held; ends once the slot is released (or lost)."""
+    key, lease = slot
+    try:
+        while True:
+            await asyncio.sleep(SLOT_RENEW_EVERY)
+            if await _cache('aget', key) != lease:
+                return
+            await _cache('atouch', key, SLOT_LEASE)
+    except Exception as exc:
+        print(f"Renewing judge slot {key} failed: {exc}")
+
+
+async def _queue_depth(delta):
+    """Add ``delta`` to the number of runs waiting for a slot; returns the new number."""
+    key = 'judge:waiting'
+    await _cache('aadd', key, 0, QUEUE_TTL)
+    try:
+        waiting = await _cache('aincr', key, delta)
+    except ValueError:
+        # Expired between the two calls
+        return max(delta, 0)
+    if waiting < 0:
+        # The count expired (or was evicted) while runs were waiting, and
+        # their leaving took the new one below zero
+        await _cache('aincr', key, -waiting)
+        return 0
+    await _cache('atouch', key, QUEUE_TTL)
+    return waiting
+
+
+def _busy(waiting):
+    retry_after = max(1, math.ceil(TYPICAL_RUN_SECONDS * (waiting + 1) / MAX_CONCURRENT))
+    return Throttled(f"The judge is busy, retry in {retry_after} s.", retry_after, 503)
+
+
+async def acquire(key):
+    """Admit one run for a client; returns the slot to pass to release(), or raises Throttled."""
+    wait = await _take_token(key)
+    if wait:
+        retry_after = math.ceil(wait)
+        raise Throttled(f"You're running code too often, retry in {retry_after} s.", retry_after, 429)
+
+    try:
+        return await _wait_for_slot()
+    except Throttled:
+        await _refund_token(key)
+        raise
+
+
+async def _wait_for_slot():
+    slot = await _try_slot()
+    if slot is not None:
+        return slot
+    waiting = await _queue_depth(1)
+    try:
+        if waiting > MAX_WAITING:
+            raise _busy(waiting)
+        deadline = time.monotonic() + MAX_WAIT
+        while slot is None:
+            if time.monotonic() >= deadline:
+                raise _busy(waiting)
+            await asyncio.sleep(POLL_INTERVAL)
+            slot = await _try_slot()
+        return slot
+    finally:
+        await _queue_depth(-1)
+
+
+async def release(slot):
+    key, lease = slot
+    # Only our own lease: if it expired, the slot may belong to another run now
+    if await _cache('aget', key) == lease:
+        await _cache('adelete', key)
+
+
+class SlotStream:
+    """An async iterator (a streamed response's content) that holds a slot until it is done.
+
+    The slot is released when the stream ends or fails, or, if it never
+    started (the client left first), when the response is closed.
+    """
+
+    def __init__(self, stream, slot):
+        self.stream = stream
+        self.slot = slot
+
+    async def __aiter__(self):
+        try:
+            async for item in self.stream:
+                yield item
+        finally:
+            await self.arelease()
+
+    async def arelease(self):
+        slot, self.slot = self.slot, None
+        if slot is not None:
+            await release(slot)
+
+    def close(self):
+        # StreamingHttpResponse.close(), called from a sync context
+        if self.slot is not None:
+            async_to_sync(self.arelease)()
+
+
+@asynccontextmanager
+async def judge_slot(key):
+    slot = await acquire(key)
+    try:
+        yield
+    finally:
+        await release(slot)
@@ -0,0 +1,262 @@
+# problems/autocomplete.py
+#
+# In-memory prefix index behind the search box's type-ahead (views.search_suggestions).
+# Problem titles and tag names are normalized (accents and punctuation gone,
+# case folded) and indexed from the start of every word, so "sum" finds
+# "Two Sum"; the keys live in one sorted array searched with bisect.
+# Matches are ranked by popularity: solves for problems, uses for tags.
+#
+# Each process builds the index on first use and keeps it current from the
+# signal handlers in signals.py. Changes made by other processes reach it
+# through the 'autocomplete' ContentVersion counter, checked every
+# CHECK_SECONDS: a changed counter (new, renamed or deleted problems and
+# tags) rebuilds the index in the background while the old one keeps
+# serving. Solve counts change too often for that and are resynced by a
+# rebuild every REBUILD_SECONDS.
+import bisect
+import heapq
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+
+from django.db import close_old_connections
+from django.db.models import Count
+
+from .models import ContentVersion, Problem, Tag
+from .versioning import bump
+
+INDEX_KEY = 'autocomplete'
+PROBLEM = 'problem'
+TAG = 'tag'
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+MAX_QUERY_CHARS = 100
+# Words starting further into a label than this aren't indexed
+MAX_WORD_OFFSET = 256
+# Ranges with more entries than this (short, common prefixes) are answered by
+# walking the items in popularity order instead of ranking the whole range
+SCAN_LIMIT = 2000
+CHECK_SECONDS = 30
+REBUILD_SECONDS = 10 * 60
+
+
+def normalize(text):
+    """Lower-case words without accents or punctuation, single-spaced."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+    return ' '.join(''.join(c if c.isalnum() else ' ' for c in stripped).split())
+
+
+class PrefixIndex:
+    """Sorted suffixes of the normalized labels, starting at each word.
+
+    An entry is the number of an item and the offset of a word in its
+    ' ' + normalized label, packed in one int (item << 8 | offset), so the
+    keys take 8 bytes each in an array instead of a string per word; bisect
+    compares the label text from that offset on. Items are numbered in
+    parallel lists; a removed item leaves a hole until the next rebuild.
+    """
+
+    def __init__(self, items):
+        """``items``: (kind, id, label, score) for every problem and tag."""
+        self.lock = threading.Lock()
+        self.kinds = []
+        self.pks = []
+        self.labels = []
+        self.spaced = []
+        self.scores = []
+        self.numbers = {}
+        entries = []
+        for kind, pk, label, score in items:
+            entries.extend(self._entries(self._store(kind, pk, label, score)))
+        entries.sort(key=self._key)
+        self.entries = array('q', entries)
+        self.by_score = array('q', sorted(self.numbers.values(), key=lambda number: -self.scores[number]))
+
+    def _store(self, kind, pk, label, score):
+        number = len(self.labels)
+        self.kinds.append(kind)
+        self.pks.append(pk)
+        self.labels.append(label)
+        self.spaced.append(' ' + normalize(label))
+        self.scores.append(score)
+        self.numbers[(kind, pk)] = number
+        return number
+
+    def _entries(self, number):
+        return [number << 8 | offset for offset, char in enumerate(self.spaced[number][:MAX_WORD_OFFSET]) if char == ' ']
+
+    def _key(self, entry):
+        return self.spaced[entry >> 8][(entry & 0xff) + 1:]
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """[(kind, id, label, score)] of the best ``limit`` items with a word starting with ``query``."""
+        query = normalize(query[:MAX_QUERY_CHARS])
+        if not query:
+            return []
+        with self.lock:
+            lo = bisect.bisect_left(self.entries, query, key=self._key)
+            hi = bisect.bisect_left(self.entries, query + '\U0010ffff', lo, key=self._key)
+            if hi - lo <= SCAN_LIMIT:
+                candidates = {entry >> 8 for entry in self.entries[lo:hi]}
+            else:
+                # Matches are common here, so the most popular ones come up quickly
+                needle = ' ' + query
+                candidates = []
+                for number in self.by_score:
+                    if needle in self.spaced[number]:
+                        candidates.append(number)
+                        # by_score is only re-sorted on rebuilds; take some slack for changed scores
+                        if len(candidates) >= limit * 4:
+                            break
+            best = heapq.nsmallest(limit, candidates, key=lambda number: (-self.scores[number], self.labels[number]))
+            return [(self.kinds[n], self.pks[n], self.labels[n], self.scores[n]) for n in best]
+
+    def put(self, kind, pk, label, score=None):
+        """Add an item, or re-index it under a new label. Returns whether anything changed."""
+        with self.lock:
+            number = self.numbers.get((kind, pk))
+            if number is None:
+                number = self._store(kind, pk, label, score or 0)
+                self.by_score.append(number)
+            elif self.labels[number] == label:
+                return False
+            else:
+                self._unindex(number)
+                self.labels[number] = label
+                self.spaced[number] = ' ' + normalize(label)
+                if score is not None:
+                    self.scores[number] = score
+            for entry in self._entries(number):
+                bisect.insort(self.entries, entry, key=self._key)
+            return True
+
+    def remove(self, kind, pk):
+        with self.lock:
+            number = self.numbers.pop((kind, pk), None)
+            if number is None:
+                return False
+            self._unindex(number)
+            self.by_score.remove(number)
+            # The hole stays until the next rebuild; nothing points at it any more
+            self.labels[number] = self.spaced[number] = ''
+            return True
+
+    def _unindex(self, number):
+        for entry in self._entries(number):
+            position = bisect.bisect_left(self.entries, self._key(entry), key=self._key)
+            while self.entries[position] != entry:
+                position += 1
+            del self.entries[position]
+
+    def adjust(self, kind, pk, delta):
+        with self.lock:
+            number = self.numbers.get((kind, pk))
+            if number is not None:
+                self.scores[number] = max(self.scores[number] + delta, 0)
+
+    def memory_bytes(self):
+        """Approximate size of the index (strings, tuples and ints included)."""
+        total = sum(sys.getsizeof(container) for container in (
+            self.kinds, self.pks, self.labels, self.spaced, self.scores, self.numbers, self.entries, self.by_score))
+        total += sum(map(sys.getsizeof, self.labels)) + sum(map(sys.getsizeof, self.spaced))
+        total += sum(map(sys.getsizeof, self.numbers))
+        # Small ints are shared by the interpreter; the rest are objects of their own
+        total += sum(sys.getsizeof(value) for values in (self.pks, self.scores) for value in values if value > 256)
+        return total
+
+
+def load_items():
+    problems = Problem.objects.annotate(solves=Count('solved_by')).values_list('pk', 'title', 'solves')
+    tags = Tag.objects.annotate(uses=Count('problem')).values_list('pk', 'name', 'uses')
+    return ([(PROBLEM, pk, title, solves) for pk, title, solves in problems.iterator()]
+            + [(TAG, pk, name, uses) for pk, name, uses in tags.iterator()])
+
+
+def current_version():
+    return ContentVersion.objects.filter(key=INDEX_KEY).values_list('version', flat=True).first() or 0
+
+
+_index = None
+_version = None
+_built_at = 0.0
+_checked_at = 0.0
+_rebuilding = False
+_build_lock = threading.Lock()
+
+
+def _build():
+    global _index, _version, _built_at
+    version = current_version()
+    index = PrefixIndex(load_items())
+    _index, _version, _built_at = index, version, time.monotonic()
+    return index
+
+
+def _rebuild_in_background():
+    global _rebuilding
+    close_old_connections()
+    try:
+        _build()
+    except Exception as exc:
+        print(f"Autocomplete index rebuild failed: {exc}")
+    finally:
+        _rebuilding = False
+        close_old_connections()
+
+
+def get_index():
+    """This process's index, built on first use; schedules a rebuild when other processes changed the data."""
+    global _checked_at, _rebuilding
+    if _index is None:
+        with _build_lock:
+            return _index or _build()
+    now = time.monotonic()
+    if now - _checked_at >= CHECK_SECONDS and not _rebuilding:
+        _checked_at = now
+        if current_version() != _version or now - _built_at >= REBUILD_SECONDS:
+            _rebuilding = True
+            threading.Thread(target=_rebuild_in_background, name='autocomplete-rebuild', daemon=True).start()
+    return _index
+
+
+def search(query, limit=DEFAULT_LIMIT):
+    return get_index().search(query, limit)
+
+
+# --- Updates from signals.py ---
+# A process with an index of its own compares a saved label with the indexed
+# one; without one, signals.py compares it with the stored label, and passes
+# ``changed``. Only new, renamed or deleted items make the others rebuild.
+
+def has_index():
+    return _index is not None
+
+
+def item_saved(kind, pk, label, changed=True):
+    if _index is not None:
+        changed = _index.put(kind, pk, label)
+    if changed:
+        _announce()
+
+
+def item_deleted(kind, pk):
+    if _index is None or _index.remove(kind, pk):
+        _announce()
+
+
+def _announce():
+    """Tell the other processes to rebuild (and count our own next check as current)."""
+    global _version
+    bump(INDEX_KEY)
+    _version = current_version()
+
+
+def adjust_score(kind, pk, delta):
+    if _index is not None:
+        _index.adjust(kind, pk, delta)
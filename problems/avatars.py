@@ -0,0 +1,146 @@
+# problems/avatars.py
+#
+# Profile pictures are uploaded at whatever size the camera produced but shown
+# at 24-120px. After an upload the picture is resized into a few square
+# variants, re-encoded as WebP and JPEG (without EXIF) and stored as
+# avatars/<content hash>-<px>.<format>. The names change whenever the content
+# does, so avatar_file serves them with a one-year immutable Cache-Control.
+#
+# Processing runs on a background thread once the upload is committed, so the
+# request that uploads never waits on it; ``manage.py process_avatars`` picks
+# up anything that was missed (a restart mid-way, pictures uploaded before).
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.templatetags.static import static
+
+from .models import Profile
+from .versioning import bump_catalogue, bump_user
+
+# Display size in CSS pixels; every size is also rendered at 2x for HiDPI screens
+SIZES = {
+    'small': 32,
+    'large': 120,
+}
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 6},
+    'jpg': {'format': 'JPEG', 'quality': 85, 'optimize': True, 'progressive': True},
+}
+DIRECTORY = 'avatars'
+CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='avatars')
+
+
+def pixel_sizes():
+    return sorted({px * scale for px in SIZES.values() for scale in (1, 2)})
+
+
+def variant_name(digest, px, extension):
+    return f'{DIRECTORY}/{digest}-{px}.{extension}'
+
+
+def variant_url(profile, size, extension, scale=1):
+    return default_storage.url(variant_name(profile.avatar_hash, SIZES[size] * scale, extension))
+
+
+def variant_size(profile, size, extension):
+    return default_storage.size(variant_name(profile.avatar_hash, SIZES[size], extension))
+
+
+def sources(user, size):
+    """Where a user's picture at ``size`` is: {'src', 'srcset', 'webp_srcset'}.
+
+    The srcsets are None until the upload has been processed (the original is
+    shown) and for users without a picture (the default is).
+    """
+    try:
+        profile = user.profile
+    except ObjectDoesNotExist:
+        profile = None
+    if profile is None or not profile.profile_picture:
+        return {'src': static('problems/default_profile.png'), 'srcset': None, 'webp_srcset': None}
+    if profile.avatar_pending:
+        return {'src': profile.profile_picture.url, 'srcset': None, 'webp_srcset': None}
+
+    def srcset(extension):
+        return ', '.join(f'{variant_url(profile, size, extension, scale)} {scale}x' for scale in (1, 2))
+
+    return {'src': variant_url(profile, size, 'jpg'), 'srcset': srcset('jpg'), 'webp_srcset': srcset('webp')}
+
+
+def render_variants(data):
+    """{(px, extension): encoded bytes} for one uploaded picture."""
+    # Imported here: Pillow is only needed by the processing thread and
+    # process_avatars, not by every process that loads the signal handlers
+    from PIL import Image, ImageOps
+
+    variants = {}
+    largest = max(pixel_sizes())
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEGs can be decoded at a fraction of their size, much faster than full size + resize
+        image.draft('RGB', (largest, largest))
+        # Apply the EXIF orientation before the EXIF goes
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        for px in pixel_sizes():
+            square = ImageOps.fit(image, (px, px), Image.Resampling.LANCZOS)
+            for extension, options in FORMATS.items():
+                frame = square
+                if options['format'] == 'JPEG' and has_alpha:
+                    frame = Image.new('RGB', square.size, 'white')
+                    frame.paste(square, mask=square.getchannel('A'))
+                buffer = io.BytesIO()
+                # Nothing but pixels is written: no EXIF, no ICC profile, no comments
+                frame.save(buffer, **options)
+                variants[(px, extension)] = buffer.getvalue()
+    return variants
+
+
+def process(profile):
+    """Make the variants of a profile's current picture; returns the bytes written (0 if they existed)."""
+    source = profile.profile_picture.name
+    with profile.profile_picture.open('rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    written = 0
+    if not all(default_storage.exists(variant_name(digest, px, extension))
+               for px in pixel_sizes() for extension in FORMATS):
+        for (px, extension), content in render_variants(data).items():
+            name = variant_name(digest, px, extension)
+            if not default_storage.exists(name):
+                default_storage.save(name, ContentFile(content))
+                written += len(content)
+    # Only if the picture wasn't replaced in the meantime
+    Profile.objects.filter(pk=profile.pk, profile_picture=source).update(avatar_hash=digest, avatar_source=source)
+    profile.avatar_hash, profile.avatar_source = digest, source
+    # update() skips post_save, so invalidate the pages showing the avatar here
+    bump_user(profile.user_id)
+    bump_catalogue()
+    return written
+
+
+def _process_in_background(profile_id):
+    close_old_connections()
+    try:
+        profile = Profile.objects.filter(pk=profile_id).first()
+        if profile and profile.avatar_pending:
+            process(profile)
+            print(f"Avatar variants ready for profile {profile_id}")
+    except Exception as exc:
+        # Left pending: the page keeps showing the original, process_avatars retries
+        print(f"Avatar processing failed for profile {profile_id}: {exc}")
+    finally:
+        close_old_connections()
+
+
+def schedule(profile):
+    """Process a profile's new picture in the background, once the upload is committed."""
+    profile_id = profile.pk
+    transaction.on_commit(lambda: _executor.submit(_process_in_background, profile_id))
@@ -0,0 +1,35 @@
+# problems/blobs.py
+#
+# Encoding of the content-addressed code store (models.CodeBlob). A blob is
+# keyed by the SHA-256 of the UTF-8 code, so the same code submitted by any
+# number of users - most often the untouched function_header template - is
+# stored once. Bodies over COMPRESS_ABOVE bytes are zlib-compressed when that
+# makes them smaller.
+#
+# Only pure functions live here: models.py and the backfill migration both
+# use them. `manage.py code_storage` reports how much space the store saves.
+import hashlib
+import zlib
+
+COMPRESS_ABOVE = 256
+COMPRESS_LEVEL = 6
+
+
+def digest(code):
+    return hashlib.sha256(code.encode()).hexdigest()
+
+
+def encode(code):
+    """(stored bytes, compressed?, size of the UTF-8 code) for some code."""
+    raw = code.encode()
+    if len(raw) > COMPRESS_ABOVE:
+        packed = zlib.compress(raw, COMPRESS_LEVEL)
+        if len(packed) < len(raw):
+            return packed, True, len(raw)
+    return raw, False, len(raw)
+
+
+def decode(data, compressed):
+    # PostgreSQL hands bytea back as a memoryview
+    data = bytes(data)
+    return (zlib.decompress(data) if compressed else data).decode()
@@ -0,0 +1,72 @@
+# problems/docker_runner.py
+#
+# The synchronous code runner on the docker SDK, for Windows hosts where the
+# Docker Engine listens on a named pipe the asyncio path (judge.py) can't open.
+# Importing the SDK costs more than the rest of the app together, so this
+# module is only imported when such a run actually happens.
+import docker
+import requests
+
+from . import judge
+
+
+def run_code_in_docker(code, test_cases, input_vars, language='python',
+                       time_limit=judge.JUDGE_TIMEOUT, mem_limit=judge.JUDGE_MEM_LIMIT):
+    results = []
+    try:
+        client = docker.DockerClient(base_url=judge.docker_base_url(), timeout=judge.DOCKER_API_TIMEOUT)
+        
+        try:
+            client.ping()
+            print("Docker daemon connection successful")
+        except docker.errors.APIError as e:
+            print(f"Failed to connect to Docker daemon: {str(e)}")
+            return [{'error': judge.DOCKER_UNAVAILABLE}]
+
+        for test_case in test_cases:
+            wrapper_code = judge.build_wrapper_code(code, test_case, input_vars, time_limit)
+            print(f"Running wrapper code:\n{wrapper_code}")
+            try:
+                container = client.containers.create(
+                    image=judge.JUDGE_IMAGE,
+                    command=['python', '-c', wrapper_code],
+                    mem_limit=mem_limit,
+                    memswap_limit=mem_limit,
+                    cpu_quota=judge.JUDGE_CPU_QUOTA,
+                    network_disabled=True,
+                    working_dir='/tmp',
+                )
+                output = judge.OutputCollector()
+                try:
+                    container.start()
+                    try:
+                        output.exit_code = container.wait(timeout=time_limit + judge.JUDGE_START_TIMEOUT).get('StatusCode')
+                    except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError):
+                        # The wrapper didn't stop itself in time; docker-py gave up on the wait call
+                        output.timed_out = True
+                        container.kill()
+                    if output.exit_code:
+                        container.reload()
+                        output.oom_killed = bool(container.attrs['State'].get('OOMKilled'))
+                    for chunk in container.logs(stdout=True, stderr=True, stream=True):
+                        output.feed(chunk)
+                        if output.full:
+                            break
+                finally:
+                    container.remove(force=True)
+                print(f"Container logs:\n{output.console_text}")
+
+                result = judge.evaluate_test_case(test_case, output)
+                print(f"Debug: actual={result['actual']}, expected={result['expected']}, verdict={result['verdict']}")
+                results.append(result)
+            except docker.errors.ContainerError as e:
+                results.append({'error': f"Container error: {str(e)}"})
+            except docker.errors.APIError as e:
+                results.append({'error': f"Execution failed: {str(e)}"})
+            except Exception as e:
+                results.append({'error': f"Unexpected error: {str(e)}"})
+    except Exception as e:
+        print(f"Docker client initialization failed: {str(e)}")
+        results.append({'error': f"Failed to initialize Docker client: {str(e)}"})
+
+    return results
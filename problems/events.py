@@ -0,0 +1,214 @@
+# problems/events.py
+#
+# Append-only log of every Run and Submit (SubmissionEvent) and the
+# per-problem rollups computed from it (ProblemStats).
+#
+# The views only append to an in-process buffer. A background thread writes
+# the buffer out with one bulk INSERT every FLUSH_SECONDS, or as soon as
+# BATCH_SIZE events are waiting, so judging never waits on the log. Events
+# still buffered when a process is killed are lost, which statistics can
+# afford; a normal exit flushes them. Events of problems or users deleted
+# before the flush are dropped with them.
+#
+# manage.py rollup_events folds the events past the newest one already
+# folded into ProblemStats: counters, distinct submitting and solving users,
+# and a histogram of accepted runtimes in log-spaced buckets that the
+# percentiles are read from. Pages only ever read ProblemStats.
+import atexit
+import bisect
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import close_old_connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .judge import verdict_for
+from .models import Problem, ProblemStats, SubmissionEvent
+from .versioning import bump_catalogue, touch_problem
+
+RUN = SubmissionEvent.RUN
+SUBMIT = SubmissionEvent.SUBMIT
+FLUSH_SECONDS = 2
+BATCH_SIZE = 500
+# A database that can't take the writes doesn't get to grow the buffer forever
+MAX_BUFFERED = 50000
+ROLLUP_BATCH = 5000
+# Ids are handed out at flush time, so an event older than this is assumed to
+# be committed along with every event with a smaller id
+SETTLE_SECONDS = 30
+# Upper bounds of the runtime buckets, 1 ms to 10 s about 26% apart; the
+# histogram has one more bucket for anything slower
+RUNTIME_BUCKETS_MS = sorted({round(10 ** (step / 10)) for step in range(41)})
+
+_buffer = []
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_writer = None
+
+
+def record(problem_id, user_id, kind, verdict, runtime_ms=None):
+    """Queue one event; written to the database by the writer thread."""
+    global _writer
+    event = SubmissionEvent(problem_id=problem_id, user_id=user_id, kind=kind, verdict=verdict,
+                            runtime_ms=runtime_ms, created_at=timezone.now())
+    with _lock:
+        _buffer.append(event)
+        full = len(_buffer) >= BATCH_SIZE
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_write_loop, name='event-writer', daemon=True)
+            _writer.start()
+    if full:
+        _wakeup.set()
+
+
+def record_results(problem_id, user_id, kind, results, case_count):
+    """Queue the event for one Run or Submit from its judge results."""
+    timings = [result['time_ms'] for result in results if 'time_ms' in result]
+    record(problem_id, user_id, kind, verdict_for(results, case_count), max(timings) if timings else None)
+
+
+def flush():
+    """Write out the buffered events now; returns how many were written."""
+    with _lock:
+        batch = _buffer[:]
+        _buffer.clear()
+    if not batch:
+        return 0
+    try:
+        batch = _still_referenced(batch)
+        SubmissionEvent.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+    except Exception:
+        # Retried with the next flush
+        with _lock:
+            _buffer[:0] = batch
+            del _buffer[:-MAX_BUFFERED]
+        raise
+    return len(batch)
+
+
+def _still_referenced(batch):
+    # One orphan would fail the whole INSERT on its foreign key, batch after batch
+    problems = set(Problem.objects.filter(pk__in={event.problem_id for event in batch}).values_list('pk', flat=True))
+    users = set(User.objects.filter(pk__in={event.user_id for event in batch}).values_list('pk', flat=True))
+    return [event for event in batch if event.problem_id in problems and event.user_id in users]
+
+
+def _write_loop():
+    while True:
+        _wakeup.wait(FLUSH_SECONDS)
+        _wakeup.clear()
+        try:
+            flush()
+        except Exception as exc:
+            print(f"Writing submission events failed: {exc}")
+        finally:
+            close_old_connections()
+
+
+atexit.register(flush)
+
+
+# --- Rollups ---
+
+def bucket_of(runtime_ms):
+    return bisect.bisect_left(RUNTIME_BUCKETS_MS, runtime_ms)
+
+
+def percentile(histogram, fraction):
+    """Upper bound in ms of the bucket the given fraction of the runtimes falls in (None if empty)."""
+    total = sum(histogram)
+    if not total:
+        return None
+    seen = 0
+    for index, count in enumerate(histogram):
+        seen += count
+        if seen >= fraction * total:
+            return RUNTIME_BUCKETS_MS[min(index, len(RUNTIME_BUCKETS_MS) - 1)]
+
+
+def runtime_distribution(stats):
+    """[(upper bound in ms, count, % of the tallest bar)] over the occupied range of the histogram."""
+    histogram = stats.runtime_histogram if stats else []
+    occupied = [index for index, count in enumerate(histogram) if count]
+    if not occupied:
+        return []
+    tallest = max(histogram)
+    bounds = RUNTIME_BUCKETS_MS + [None]
+    return [(bounds[index], histogram[index], round(100 * histogram[index] / tallest))
+            for index in range(occupied[0], occupied[-1] + 1)]
+
+
+def _new_users(problem_id, user_ids, before, **conditions):
+    """The users among ``user_ids`` without a matching event for the problem up to event ``before``."""
+    if not user_ids:
+        return set()
+    seen = SubmissionEvent.objects.filter(problem_id=problem_id, user_id__in=user_ids, kind=SUBMIT,
+                                          pk__lte=before, **conditions).values_list('user_id', flat=True)
+    return set(user_ids) - set(seen)
+
+
+def rollup(batch_size=ROLLUP_BATCH):
+    """Fold up to ``batch_size`` new events into ProblemStats; returns how many were folded.
+
+    The newest folded event is the largest ProblemStats.last_event_id, so
+    there is no separate cursor to keep in step. Run one rollup at a time.
+    """
+    settled = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    with transaction.atomic():
+        after = ProblemStats.objects.aggregate(last=Max('last_event_id'))['last'] or 0
+        events = []
+        for event in SubmissionEvent.objects.filter(pk__gt=after).order_by('pk')[:batch_size]:
+            if event.created_at > settled:
+                break
+            events.append(event)
+        if not events:
+            return 0
+        last_id = events[-1].pk
+
+        by_problem = defaultdict(list)
+        for event in events:
+            by_problem[event.problem_id].append(event)
+        # Problems deleted since; their events go with them
+        live = set(Problem.objects.filter(pk__in=by_problem).values_list('pk', flat=True))
+        existing = {stats.problem_id: stats for stats in ProblemStats.objects.filter(problem_id__in=live)}
+        now = timezone.now()
+        created, updated = [], []
+        for problem_id in live:
+            stats = existing.get(problem_id)
+            if stats is None:
+                stats = ProblemStats(problem_id=problem_id)
+                created.append(stats)
+            else:
+                updated.append(stats)
+            histogram = stats.runtime_histogram or [0] * (len(RUNTIME_BUCKETS_MS) + 1)
+            submitters, solvers = set(), set()
+            for event in by_problem[problem_id]:
+                if event.kind == RUN:
+                    stats.runs += 1
+                    continue
+                stats.submissions += 1
+                submitters.add(event.user_id)
+                if event.verdict == 'accepted':
+                    stats.accepted += 1
+                    solvers.add(event.user_id)
+                    if event.runtime_ms is not None:
+                        histogram[bucket_of(event.runtime_ms)] += 1
+            stats.attempted_users += len(_new_users(problem_id, submitters, after))
+            stats.solved_users += len(_new_users(problem_id, solvers, after, verdict='accepted'))
+            stats.runtime_histogram = histogram
+            stats.runtime_p50_ms = percentile(histogram, 0.5)
+            stats.runtime_p90_ms = percentile(histogram, 0.9)
+            stats.last_event_id = last_id
+            stats.updated_at = now
+        ProblemStats.objects.bulk_create(created)
+        ProblemStats.objects.bulk_update(updated, [
+            'runs', 'submissions', 'accepted', 'attempted_users', 'solved_users', 'runtime_histogram',
+            'runtime_p50_ms', 'runtime_p90_ms', 'last_event_id', 'updated_at',
+        ])
+        if live:
+            bump_catalogue()
+            touch_problem(*live)
+    return len(events)
@@ -0,0 +1,211 @@
+# problems/fingerprints.py
+#
+# Copy detection for solutions. A solution's code is tokenized with names,
+# numbers and strings normalised (renaming variables doesn't hide a copy),
+# hashed in K-token grams and winnowed: of every WINDOW consecutive gram
+# hashes only the smallest is kept. Two copies share long runs of tokens, so
+# they keep the same fingerprints wherever they overlap.
+#
+# Fingerprints are stored per problem (SolutionFingerprint); finding what a
+# new solution resembles is an index lookup of its own fingerprints, whose
+# cost grows with the number of matching solutions rather than with the
+# problem's solution count. Pairs above SUSPICIOUS_SIMILARITY are kept as
+# SolutionMatch rows and grouped into clusters for the admin.
+#
+# A saved solution is indexed on a background thread once it is committed,
+# so submitting never waits on it; ``manage.py backfill_fingerprints`` picks
+# up solutions that were missed (a restart mid-way, a failure).
+import builtins
+import hashlib
+import io
+import keyword
+import re
+import tokenize
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Q
+
+from .models import Solution, SolutionFingerprint, SolutionMatch
+
+GRAM_SIZE = 5
+WINDOW = 4
+# Shared fingerprints over the smaller solution's; tiny solutions all look
+# alike, so both sides need MIN_FINGERPRINTS before a pair counts
+SUSPICIOUS_SIMILARITY = 0.8
+MIN_FINGERPRINTS = 8
+CHUNK_SIZE = 500
+
+_BUILTINS = frozenset(dir(builtins))
+_SKIPPED = {tokenize.COMMENT, tokenize.NL, tokenize.INDENT, tokenize.DEDENT, tokenize.ENCODING, tokenize.ENDMARKER}
+_FSTRING_PARTS = {getattr(tokenize, name) for name in ('FSTRING_MIDDLE', 'FSTRING_END') if hasattr(tokenize, name)}
+_FSTRING_START = getattr(tokenize, 'FSTRING_START', None)
+_FALLBACK_TOKEN = re.compile(r'\w+|[^\w\s]')
+# One worker, so the saves of one solution are indexed in order
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fingerprints')
+
+
+def _normalise(text):
+    if keyword.iskeyword(text) or text in _BUILTINS:
+        return text
+    if text[0].isdigit():
+        return '0'
+    if text[0].isalpha() or text[0] == '_':
+        return 'x'
+    return text
+
+
+def normalized_tokens(code):
+    """The code's tokens with identifiers, numbers and strings replaced by placeholders."""
+    try:
+        raw = list(tokenize.generate_tokens(io.StringIO(code).readline))
+    except (tokenize.TokenError, SyntaxError):
+        # Code that doesn't tokenize (it was never accepted, or isn't Python)
+        return [_normalise(text) for text in _FALLBACK_TOKEN.findall(code)]
+    tokens = []
+    for token in raw:
+        if token.type in _SKIPPED or token.type in _FSTRING_PARTS:
+            continue
+        if token.type == tokenize.NEWLINE:
+            tokens.append(';')
+        elif token.type in (tokenize.STRING, _FSTRING_START):
+            tokens.append('"')
+        elif token.type == tokenize.NUMBER:
+            tokens.append('0')
+        else:
+            tokens.append(_normalise(token.string))
+    return tokens
+
+
+def _hash(gram):
+    digest = hashlib.blake2b(' '.join(gram).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def fingerprint(code):
+    """The winnowed fingerprint set of some code."""
+    tokens = normalized_tokens(code)
+    if not tokens:
+        return set()
+    hashes = [_hash(tokens[i:i + GRAM_SIZE]) for i in range(max(len(tokens) - GRAM_SIZE + 1, 1))]
+    if len(hashes) <= WINDOW:
+        return {min(hashes)}
+    return {min(hashes[i:i + WINDOW]) for i in range(len(hashes) - WINDOW + 1)}
+
+
+def base_fingerprints(problem):
+    """Fingerprints every solution inherits from the problem's function header."""
+    return fingerprint(problem.function_header or '')
+
+
+def similarity(shared, size_a, size_b):
+    smaller = min(size_a, size_b)
+    if smaller < MIN_FINGERPRINTS:
+        return 0.0
+    return shared / smaller
+
+
+def make_match(problem_id, solution_id, other_id, shared, size_a, size_b):
+    """An unsaved SolutionMatch for a suspicious pair, or None."""
+    score = similarity(shared, size_a, size_b)
+    if score < SUSPICIOUS_SIMILARITY:
+        return None
+    low, high = sorted((solution_id, other_id))
+    return SolutionMatch(problem_id=problem_id, solution_id=low, other_id=high, similarity=score, shared=shared)
+
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+
+def find_matches(solution, hashes):
+    """SolutionMatch rows (unsaved) between one solution and other users' solutions of its problem."""
+    shared = Counter()
+    for chunk in _chunks(hashes):
+        shared.update(dict(
+            SolutionFingerprint.objects.filter(problem_id=solution.problem_id, hash__in=chunk)
+            .exclude(solution_id=solution.pk).values_list('solution_id').annotate(n=Count('pk')).order_by()
+        ))
+    # Solutions that can't reach the threshold even at the minimum size
+    candidates = [other for other, n in shared.items() if n >= SUSPICIOUS_SIMILARITY * MIN_FINGERPRINTS]
+    sizes, authors = {}, {}
+    for chunk in _chunks(candidates):
+        sizes.update(SolutionFingerprint.objects.filter(solution_id__in=chunk)
+                     .values_list('solution_id').annotate(n=Count('pk')).order_by())
+        authors.update(Solution.objects.filter(pk__in=chunk).values_list('pk', 'created_by_id'))
+    matches = []
+    for other in candidates:
+        if authors.get(other) == solution.created_by_id:
+            # Resubmitting your own code isn't copying
+            continue
+        match = make_match(solution.problem_id, solution.pk, other, shared[other], len(hashes), sizes.get(other, 0))
+        if match:
+            matches.append(match)
+    return matches
+
+
+def index_solution(solution):
+    """(Re)index one solution's fingerprints and matches; returns how many matches it has."""
+    hashes = fingerprint(solution.code) - base_fingerprints(solution.problem)
+    with transaction.atomic():
+        SolutionFingerprint.objects.filter(solution=solution).delete()
+        SolutionMatch.objects.filter(Q(solution=solution) | Q(other=solution)).delete()
+        SolutionFingerprint.objects.bulk_create([
+            SolutionFingerprint(problem_id=solution.problem_id, solution_id=solution.pk, hash=value)
+            for value in hashes
+        ])
+        matches = find_matches(solution, hashes)
+        SolutionMatch.objects.bulk_create(matches)
+    return len(matches)
+
+
+def _index_in_background(solution_id):
+    close_old_connections()
+    try:
+        solution = Solution.objects.select_related('problem', 'code_blob').filter(pk=solution_id).first()
+        if solution:
+            index_solution(solution)
+    except Exception as exc:
+        print(f"Fingerprinting solution {solution_id} failed: {exc}")
+    finally:
+        close_old_connections()
+
+
+def schedule(solution):
+    """Index a solution in the background, once its save is committed."""
+    solution_id = solution.pk
+    transaction.on_commit(lambda: _executor.submit(_index_in_background, solution_id))
+
+
+def clusters(problem_id=None):
+    """Groups of solutions linked by matches, largest first.
+
+    Each cluster is a dict with the problem id, the solution ids, the number
+    of matching pairs and the highest similarity among them.
+    """
+    matches = SolutionMatch.objects.all()
+    if problem_id is not None:
+        matches = matches.filter(problem_id=problem_id)
+    parent = {}
+
+    def find(node):
+        while parent.setdefault(node, node) != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    rows = list(matches.values_list('problem_id', 'solution_id', 'other_id', 'similarity'))
+    for _, solution_id, other_id, _ in rows:
+        parent[find(solution_id)] = find(other_id)
+    groups = {}
+    for problem_id, solution_id, other_id, score in rows:
+        group = groups.setdefault(find(solution_id), {
+            'problem_id': problem_id, 'solution_ids': set(), 'pairs': 0, 'max_similarity': 0.0,
+        })
+        group['solution_ids'].update((solution_id, other_id))
+        group['pairs'] += 1
+        group['max_similarity'] = max(group['max_similarity'], score)
+    return sorted(groups.values(), key=lambda group: (-len(group['solution_ids']), -group['max_similarity']))
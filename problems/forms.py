@@ -14,7 +14,7 @@ class ProblemForm(forms.ModelForm):
 
     class Meta:
         model = Problem
-        fields = ['title', 'description', 'difficulty', 'solution_code']
+        fields = ['title', 'description', 'difficulty', 'comparison', 'time_limit_ms', 'memory_limit_mb', 'solution_code']
 
     def save(self, commit=True, user=None):
         problem = super().save(commit=False)
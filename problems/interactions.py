@@ -0,0 +1,146 @@
+# problems/interactions.py
+#
+# Race-free vote and favorite writes. Every change to a rating/favorite row and
+# the matching change to the denormalized counters on Problem happen in the same
+# transaction, using INSERT ... ON CONFLICT / UPDATE ... RETURNING so that a
+# click costs two or three statements and concurrent clicks cannot double count.
+# The SQL below is understood by both SQLite (3.35+) and PostgreSQL.
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import FavoriteProblem, Problem, ProblemRating
+from .versioning import CATALOGUE_KEY, bump, user_key
+
+RATING_TABLE = ProblemRating._meta.db_table
+FAVORITE_TABLE = FavoriteProblem._meta.db_table
+PROBLEM_TABLE = Problem._meta.db_table
+
+
+class ProblemNotFound(Exception):
+    pass
+
+
+def _write_vote(cursor, problem_id, user_id, vote, now):
+    """Store ``vote`` (1, -1 or 0 to clear) and return the previous vote."""
+    if vote == 0:
+        cursor.execute(
+            f"DELETE FROM {RATING_TABLE} WHERE problem_id = %s AND user_id = %s RETURNING vote",
+            [problem_id, user_id],
+        )
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    # Flip an existing opposite vote...
+    cursor.execute(
+        f"UPDATE {RATING_TABLE} SET vote = %s, updated_at = %s "
+        f"WHERE problem_id = %s AND user_id = %s AND vote <> %s",
+        [vote, now, problem_id, user_id, vote],
+    )
+    if cursor.rowcount:
+        return -vote
+    # ...or insert a new one; a conflict means the same vote is already stored
+    cursor.execute(
+        f"INSERT INTO {RATING_TABLE} (problem_id, user_id, vote, created_at, updated_at) "
+        f"VALUES (%s, %s, %s, %s, %s) ON CONFLICT (problem_id, user_id) DO NOTHING",
+        [problem_id, user_id, vote, now, now],
+    )
+    return 0 if cursor.rowcount else vote
+
+
+def _vote_deltas(old, new):
+    likes = (new == 1) - (old == 1)
+    dislikes = (new == -1) - (old == -1)
+    return likes, dislikes
+
+
+def _apply_vote(cursor, problem_id, user_id, vote, now):
+    """Write one vote and adjust the counters; returns (likes, dislikes)."""
+    old = _write_vote(cursor, problem_id, user_id, vote, now)
+    likes, dislikes = _vote_deltas(old, vote)
+    if likes or dislikes:
+        # Also refreshes the detail page validators (see versioning.py)
+        cursor.execute(
+            f"UPDATE {PROBLEM_TABLE} SET like_count = like_count + %s, dislike_count = dislike_count + %s, "
+            f"version = version + 1, updated_at = %s WHERE id = %s RETURNING like_count, dislike_count",
+            [likes, dislikes, now, problem_id],
+        )
+    else:
+        cursor.execute(f"SELECT like_count, dislike_count FROM {PROBLEM_TABLE} WHERE id = %s", [problem_id])
+    row = cursor.fetchone()
+    if row is None:
+        raise ProblemNotFound(problem_id)
+    return row
+
+
+def _apply_favorite(cursor, problem_id, user_id, favorited, now):
+    """Set (True/False) or toggle (None) a favorite; returns (is_favorited, favorite_count)."""
+    removed = 0
+    if favorited is not True:
+        cursor.execute(
+            f"DELETE FROM {FAVORITE_TABLE} WHERE problem_id = %s AND user_id = %s",
+            [problem_id, user_id],
+        )
+        removed = cursor.rowcount
+    added = 0
+    if favorited is True or (favorited is None and not removed):
+        cursor.execute(
+            f"INSERT INTO {FAVORITE_TABLE} (problem_id, user_id, created_at) "
+            f"VALUES (%s, %s, %s) ON CONFLICT (problem_id, user_id) DO NOTHING",
+            [problem_id, user_id, now],
+        )
+        added = cursor.rowcount
+    is_favorited = favorited if favorited is not None else not removed
+    if added or removed:
+        cursor.execute(
+            f"UPDATE {PROBLEM_TABLE} SET favorite_count = favorite_count + %s WHERE id = %s RETURNING favorite_count",
+            [added - removed, problem_id],
+        )
+    else:
+        cursor.execute(f"SELECT favorite_count FROM {PROBLEM_TABLE} WHERE id = %s", [problem_id])
+    row = cursor.fetchone()
+    if row is None:
+        raise ProblemNotFound(problem_id)
+    return is_favorited, row[0]
+
+
+def _now():
+    return connection.ops.adapt_datetimefield_value(timezone.now())
+
+
+def set_vote(problem_id, user_id, vote):
+    """Atomically record ``vote`` for a user; returns the problem's (likes, dislikes)."""
+    now = _now()
+    with transaction.atomic(), connection.cursor() as cursor:
+        counts = _apply_vote(cursor, problem_id, user_id, vote, now)
+        bump(CATALOGUE_KEY, user_key(user_id))
+    return counts
+
+
+def toggle_favorite(problem_id, user_id):
+    """Atomically flip a favorite; returns (is_favorited, favorite_count)."""
+    now = _now()
+    with transaction.atomic(), connection.cursor() as cursor:
+        result = _apply_favorite(cursor, problem_id, user_id, None, now)
+        bump(user_key(user_id))
+    return result
+
+
+def apply_batch(user_id, votes=(), favorites=()):
+    """Apply many ``(problem_id, vote)`` and ``(problem_id, favorited)`` changes in one transaction.
+
+    Returns ``{problem_id: {...counters...}}`` for every problem touched. Raises
+    ProblemNotFound (and rolls everything back) if any problem does not exist.
+    """
+    now = _now()
+    results = {}
+    with transaction.atomic(), connection.cursor() as cursor:
+        for problem_id, vote in votes:
+            likes, dislikes = _apply_vote(cursor, problem_id, user_id, vote, now)
+            results.setdefault(problem_id, {}).update({'likes': likes, 'dislikes': dislikes, 'user_vote': vote})
+        for problem_id, favorited in favorites:
+            is_favorited, favorite_count = _apply_favorite(cursor, problem_id, user_id, favorited, now)
+            results.setdefault(problem_id, {}).update({'is_favorited': is_favorited, 'favorites': favorite_count})
+        keys = [user_key(user_id)]
+        if votes:
+            keys.append(CATALOGUE_KEY)
+        bump(*keys)
+    return results
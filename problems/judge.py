@@ -0,0 +1,780 @@
+# problems/judge.py
+#
+# Pieces of the code runner shared by the synchronous docker-SDK path
+# (docker_runner.run_code_in_docker) and the asyncio path used by the async views.
+# The async path talks to the Docker Engine HTTP API directly over its socket,
+# so a submission waiting on its sandbox holds no thread.
+#
+# When the judge image built by `manage.py build_judge_image` is present, the
+# async path runs all cases of a submission in one container of that image
+# (see judge_harness.py) instead of one stock container per case.
+import asyncio
+import base64
+import contextlib
+import hashlib
+import json
+import math
+import os
+import platform
+import struct
+import time
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+from . import judge_harness, profiling
+
+JUDGE_IMAGE = 'python:3.9-slim'
+HARNESS_REPOSITORY = 'codehub-judge'
+# Built FROM JUDGE_IMAGE; the official images ship without bytecode, so the
+# standard library is compiled once here instead of in every container
+HARNESS_DOCKERFILE = '''\
+FROM {base}
+COPY judge_harness.py /judge/judge_harness.py
+RUN python -m compileall -q -j 0 /usr/local/lib /judge
+ENV PYTHONPATH=/judge PYTHONDONTWRITEBYTECODE=1 PYTHONUNBUFFERED=1
+WORKDIR /tmp
+LABEL org.codehub.harness-version="{version}"
+'''
+# The harness and its preloaded modules on top of the solution's memory limit
+HARNESS_MEMORY_HEADROOM = 64 * 1024 * 1024
+# Cases go to the harness as arguments; a batch's arguments stay well under ARG_MAX
+HARNESS_ARGS_BUDGET = 1024 * 1024
+# Container start and preloading, on top of the cases' time limits
+HARNESS_START_TIMEOUT = 10
+HARNESS_RECHECK_SECONDS = 60
+# Defaults for runs without a problem; problems carry their own limits (Problem.judge_limits)
+JUDGE_MEM_LIMIT = 128 * 1024 * 1024
+JUDGE_TIMEOUT = 5  # seconds of wall time per test case, from when the solution's code starts
+# A stock container stops itself at the time limit (see build_wrapper_code);
+# its interpreter startup gets this much on top before the judge kills it
+JUDGE_START_TIMEOUT = 5
+TIME_LIMIT_EXIT = 124
+# A tenth of a CPU (per 100 ms period) per container. Time limits are wall
+# time (ITIMER_REAL in the wrapper, a deadline in the harness), so this also
+# caps the CPU time a case can use at a tenth of its limit
+JUDGE_CPU_QUOTA = 10000
+DOCKER_API_TIMEOUT = 10
+
+RESULT_SEPARATOR = "RESULT_SEPARATOR:"
+RESULT_MARKER = RESULT_SEPARATOR.encode()
+# Output caps per test case: a result line over RESULT_LIMIT fails the case
+CONSOLE_LIMIT = 64 * 1024
+RESULT_LIMIT = 1024 * 1024
+FLOAT_REL_TOL = 1e-6
+FLOAT_ABS_TOL = 1e-9
+DOCKER_UNAVAILABLE = 'Cannot connect to Docker service. Please ensure Docker is running.'
+
+type_converters = {
+    'int': int,
+    'float': float,
+    'str': str,
+    'bool': lambda x: str(x).lower() == 'true',
+    'list': json.loads,
+    'dict': json.loads,
+    'None': lambda x: None if str(x).lower() == 'null' else x
+}
+type_checks = {
+    'int': int,
+    'float': float,
+    'str': str,
+    'bool': bool,
+    'list': list,
+    'dict': dict,
+    'None': type(None)
+}
+
+
+def docker_base_url():
+    if platform.system() == 'Windows':
+        return 'npipe:////./pipe/docker_engine'
+    return os.environ.get('DOCKER_HOST', 'unix:///var/run/docker.sock')
+
+
+def harness_context(base=JUDGE_IMAGE):
+    """{file name: contents} of the judge image's build context."""
+    return {
+        'Dockerfile': HARNESS_DOCKERFILE.format(base=base, version=judge_harness.HARNESS_VERSION).encode(),
+        'judge_harness.py': Path(judge_harness.__file__).read_bytes(),
+    }
+
+
+@lru_cache(maxsize=None)
+def harness_image(base=JUDGE_IMAGE):
+    """Tag of the judge image for this code: the harness version plus a digest of the build context.
+
+    Whoever deploys a changed harness has to build the image it pins;
+    until then the judge keeps using the stock image.
+    """
+    digest = hashlib.sha256()
+    for name, content in sorted(harness_context(base).items()):
+        digest.update(name.encode() + b'\0' + content + b'\0')
+    return f"{HARNESS_REPOSITORY}:{judge_harness.HARNESS_VERSION}-{digest.hexdigest()[:12]}"
+
+
+def prepare_inputs(test_case, input_vars):
+    """The keyword arguments of ``solution`` for one test case, converted to the declared types."""
+    input_dict = json.loads(test_case.input_value)
+    for var in input_vars:
+        if var['name'] in input_dict:
+            value = input_dict[var['name']]
+            expected_type = type_checks.get(var['type'], str)
+            converter = type_converters.get(var['type'], str)
+            if not isinstance(value, expected_type):
+                try:
+                    input_dict[var['name']] = converter(value)
+                except (ValueError, json.JSONDecodeError, TypeError):
+                    input_dict[var['name']] = value
+    return input_dict
+
+
+def build_wrapper_code(code, test_case, input_vars, time_limit=None):
+    """Python source that runs ``solution(**inputs)`` for one test case and prints the JSON result.
+
+    With ``time_limit`` the script exits with TIME_LIMIT_EXIT once the
+    solution has run that many seconds; interpreter startup doesn't count.
+    """
+    input_dict = prepare_inputs(test_case, input_vars)
+    input_data_str = "{"
+    for key, value in input_dict.items():
+        if isinstance(value, bool):
+            input_data_str += f'"{key}": {"True" if value else "False"}, '
+        elif value is None:
+            input_data_str += f'"{key}": None, '
+        elif isinstance(value, (list, dict)):
+            input_data_str += f'"{key}": {json.dumps(value)}, '
+        else:
+            input_data_str += f'"{key}": {repr(value)}, '
+    input_data_str = input_data_str.rstrip(", ") + "}"
+
+    alarm = ""
+    if time_limit:
+        # Bound as defaults, so the solution can't shadow them
+        alarm = (
+            "import os\n"
+            "import signal\n"
+            "signal.signal(signal.SIGALRM, lambda *_, flush=sys.stdout.flush, exit=os._exit: "
+            f"(flush(), exit({TIME_LIMIT_EXIT})))\n"
+            f"signal.setitimer(signal.ITIMER_REAL, {float(time_limit)!r})\n"
+        )
+    return (
+        "import json\n"
+        "import sys\n"
+        f"{alarm}\n"
+        f"{code}\n\n"
+        f"input_data = {input_data_str}\n"
+        "print(\"Parameters: \" + str(input_data))\n"
+        "result = solution(**input_data)\n"
+        # On a line of its own even after print(..., end="")
+        f"print(\"\\n{RESULT_SEPARATOR}\" + json.dumps(result))"
+    )
+
+
+VERDICT_LABELS = {
+    'accepted': 'Passed',
+    'wrong_answer': 'Wrong Answer',
+    'time_limit': 'Time Limit Exceeded',
+    'memory_limit': 'Memory Limit Exceeded',
+    'runtime_error': 'Runtime Error',
+}
+
+
+class OutputCollector:
+    """Incremental reader for the output of one test-case container.
+
+    Fed raw chunks as they arrive, it keeps at most ``console_limit`` bytes of
+    console output and the result line up to ``result_limit`` bytes, so a
+    solution printing megabytes never gets buffered whole. ``full`` turns true
+    once the result line is over the cap and the rest can be thrown away.
+
+    The runner also records how the container ended (``exit_code``,
+    ``timed_out``, ``oom_killed``), which decides the verdict of the case.
+    """
+
+    def __init__(self, console_limit=CONSOLE_LIMIT, result_limit=RESULT_LIMIT):
+        self.console_limit = console_limit
+        self.result_limit = result_limit
+        self.console = []
+        self.console_size = 0
+        self.console_truncated = False
+        self.result = None
+        self.full = False
+        self.exit_code = None
+        self.timed_out = False
+        self.oom_killed = False
+        self._line = bytearray()
+        self._dropping = False
+
+    def feed(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        start = 0
+        while start < len(data) and not self.full:
+            newline = data.find(b'\n', start)
+            end = len(data) if newline < 0 else newline
+            if not self._dropping:
+                self._line += data[start:end]
+                if len(self._line) > self.result_limit + len(RESULT_MARKER):
+                    self._overlong()
+            if newline < 0:
+                break
+            if not self._dropping:
+                self._finish_line(bytes(self._line))
+            self._line.clear()
+            self._dropping = False
+            start = newline + 1
+
+    def close(self):
+        if self._line and not self._dropping and not self.full:
+            self._finish_line(bytes(self._line))
+        self._line.clear()
+        return self
+
+    def _overlong(self):
+        if self._line.startswith(RESULT_MARKER):
+            self.full = True
+        else:
+            self._add_console(bytes(self._line))
+            self._dropping = True
+        self._line.clear()
+
+    def _finish_line(self, line):
+        if line.startswith(RESULT_MARKER):
+            self.result = line[len(RESULT_MARKER):].strip()
+        else:
+            self._add_console(line)
+
+    def _add_console(self, line):
+        room = self.console_limit - self.console_size
+        if room <= 0:
+            self.console_truncated = True
+            return
+        if len(line) > room:
+            line = line[:room]
+            self.console_truncated = True
+        self.console.append(line.decode(errors='replace'))
+        self.console_size += len(line) + 1
+
+    @property
+    def console_text(self):
+        text = "\n".join(self.console).strip()
+        if self.console_truncated:
+            text += f"\n... (console output truncated at {self.console_limit} bytes)"
+        return text or "No console output"
+
+
+def _to_int(value):
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _to_float(value):
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            return value
+    if isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def _to_bool(value):
+    if isinstance(value, str) and value.strip().lower() in ('true', 'false'):
+        return value.strip().lower() == 'true'
+    return value
+
+
+def _to_str(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return str(value)
+
+
+NORMALIZERS = {
+    'int': _to_int,
+    'float': _to_float,
+    'bool': _to_bool,
+    'str': _to_str,
+    'None': lambda value: None if value in (None, 'null', '') else value,
+}
+
+
+def _close_enough(actual, expected):
+    if isinstance(actual, bool) or isinstance(expected, bool):
+        return actual == expected
+    if isinstance(actual, (int, float)) and isinstance(expected, (int, float)):
+        return math.isclose(actual, expected, rel_tol=FLOAT_REL_TOL, abs_tol=FLOAT_ABS_TOL)
+    if isinstance(actual, list) and isinstance(expected, list):
+        return len(actual) == len(expected) and all(map(_close_enough, actual, expected))
+    if isinstance(actual, dict) and isinstance(expected, dict):
+        return actual.keys() == expected.keys() and all(_close_enough(actual[k], expected[k]) for k in expected)
+    return actual == expected
+
+
+def _canonical(value):
+    # Hashable stand-in for any JSON value, so lists of lists/dicts can be counted
+    return json.dumps(value, sort_keys=True)
+
+
+def _unordered(actual, expected):
+    if not (isinstance(actual, list) and isinstance(expected, list)):
+        return actual == expected
+    return set(map(_canonical, actual)) == set(map(_canonical, expected))
+
+
+def _multiset(actual, expected):
+    if not (isinstance(actual, list) and isinstance(expected, list)):
+        return actual == expected
+    return len(actual) == len(expected) and Counter(map(_canonical, actual)) == Counter(map(_canonical, expected))
+
+
+COMPARATORS = {
+    'exact': lambda actual, expected: actual == expected,
+    'float': _close_enough,
+    'unordered': _unordered,
+    'multiset': _multiset,
+}
+
+
+@lru_cache(maxsize=None)
+def comparator_for(return_type, comparison='auto'):
+    """Compiled ``check(actual, expected)`` for one problem's return type and comparison mode.
+
+    Both values are structured (already JSON-decoded); each side is
+    normalized once and compared without any string round trip.
+    """
+    if comparison not in COMPARATORS:
+        comparison = 'float' if return_type == 'float' else 'exact'
+    normalize = NORMALIZERS.get(return_type, lambda value: value)
+    compare = COMPARATORS[comparison]
+
+    def check(actual, expected):
+        return compare(normalize(actual), normalize(expected))
+    return check
+
+
+def parse_expected(expected_output):
+    if isinstance(expected_output, (list, dict)) or expected_output is None:
+        return expected_output
+    try:
+        return json.loads(expected_output)
+    except (json.JSONDecodeError, TypeError):
+        return expected_output
+
+
+def case_verdict(output):
+    """How the run itself ended, before looking at the answer: None if it finished cleanly."""
+    # Killed by the judge, or stopped itself at the limit (build_wrapper_code)
+    if output.timed_out or output.exit_code == TIME_LIMIT_EXIT:
+        return 'time_limit'
+    # Killed by the cgroup, or Python gave up allocating before the kernel stepped in
+    if output.oom_killed or (output.exit_code and output.console and 'MemoryError' in output.console[-1]):
+        return 'memory_limit'
+    # A result line over the cap is an answer, just too big to be right
+    if output.exit_code or (output.result is None and not output.full):
+        return 'runtime_error'
+    return None
+
+
+def evaluate_test_case(test_case, output):
+    """Judge the output of one test case (an OutputCollector, or the whole log text) against its expected output."""
+    if not isinstance(output, OutputCollector):
+        logs, output = output, OutputCollector()
+        output.feed(logs)
+    output.close()
+    expected_output = test_case.expected_output
+    check = comparator_for(getattr(test_case, 'return_type', 'str'), getattr(test_case, 'comparison', 'auto'))
+
+    actual_raw = output.result.decode(errors='replace') if output.result is not None else ""
+    verdict = case_verdict(output)
+    if verdict is None and output.full:
+        actual_raw = f"(result larger than {output.result_limit} bytes)"
+        verdict = 'wrong_answer'
+    elif verdict is None:
+        try:
+            actual = json.loads(actual_raw)
+        except json.JSONDecodeError:
+            actual = actual_raw
+        verdict = 'accepted' if check(actual, parse_expected(expected_output)) else 'wrong_answer'
+
+    return {
+        'input': test_case.input_value,
+        'expected': json.dumps(expected_output) if isinstance(expected_output, (list, dict)) else str(expected_output),
+        'actual': actual_raw,
+        'passed': verdict == 'accepted',
+        'verdict': verdict,
+        'status': VERDICT_LABELS[verdict],
+        'console_logs': output.console_text,
+    }
+
+
+def verdict_for(results, case_count):
+    """Solution.verdict for the judge results of one submission: the verdict of the first failing case."""
+    if len(results) == case_count and all(result.get('passed') for result in results):
+        return 'accepted'
+    for result in results:
+        if not result.get('passed'):
+            return result.get('verdict', 'error')
+    return 'wrong_answer'
+
+
+class DockerAPIError(Exception):
+    pass
+
+
+class LogDemuxer:
+    """Strips the 8-byte stream headers Docker adds to non-TTY log output, across chunk boundaries."""
+
+    def __init__(self):
+        self._header = bytearray()
+        self._remaining = 0
+
+    def feed(self, data):
+        while data:
+            if self._remaining:
+                piece = data[:self._remaining]
+                data = data[len(piece):]
+                self._remaining -= len(piece)
+                yield piece
+            else:
+                missing = 8 - len(self._header)
+                self._header += data[:missing]
+                data = data[missing:]
+                if len(self._header) == 8:
+                    _, self._remaining = struct.unpack('>BxxxL', self._header)
+                    self._header.clear()
+
+
+class AsyncDockerClient:
+    """Minimal asyncio client for the handful of Docker Engine API calls the judge needs."""
+
+    def __init__(self, base_url=None, timeout=DOCKER_API_TIMEOUT):
+        self.base_url = base_url or docker_base_url()
+        self.timeout = timeout
+
+    async def _connect(self):
+        url = urlsplit(self.base_url)
+        if url.scheme in ('unix', 'http+unix'):
+            return await asyncio.open_unix_connection(url.path)
+        if url.scheme in ('tcp', 'http'):
+            return await asyncio.open_connection(url.hostname, url.port or 2375)
+        raise DockerAPIError(f"Unsupported DOCKER_HOST for the async judge: {self.base_url}")
+
+    async def _send(self, method, path, params=None, body=None):
+        """Open a connection, send one request and read the response head.
+
+        Returns (reader, writer, status, headers); the caller reads the body
+        with ``_body`` and closes the writer.
+        """
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        payload = json.dumps(body).encode() if body is not None else b''
+        head = (
+            f"{method} {path} HTTP/1.1\r\n"
+            "Host: docker\r\n"
+            "Connection: close\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n\r\n"
+        ).encode()
+        reader, writer = await self._connect()
+        try:
+            writer.write(head + payload)
+            await writer.drain()
+            header_blob = await reader.readuntil(b'\r\n\r\n')
+        except BaseException:
+            writer.close()
+            raise
+        lines = header_blob.decode('latin-1').strip().split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(':') for line in lines[1:])}
+        return reader, writer, status, headers
+
+    @staticmethod
+    async def _body(reader, headers):
+        """Yield the response body piece by piece, undoing chunked transfer encoding."""
+        if headers.get('transfer-encoding', '').lower() != 'chunked':
+            while chunk := await reader.read(65536):
+                yield chunk
+            return
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                return
+            yield await reader.readexactly(size)
+            await reader.readline()
+
+    async def request(self, method, path, params=None, body=None, timeout=None):
+        """Send one request (one connection per request) and return (status, body bytes)."""
+        async def exchange():
+            reader, writer, status, headers = await self._send(method, path, params, body)
+            try:
+                return status, b''.join([chunk async for chunk in self._body(reader, headers)])
+            finally:
+                writer.close()
+
+        status, content = await asyncio.wait_for(exchange(), timeout or self.timeout)
+        if status >= 400:
+            raise DockerAPIError(f"{method} {path} -> {status}: {content.decode(errors='replace')}")
+        return status, content
+
+    async def stream_logs(self, container_id, output, timeout=None):
+        """Feed a finished container's stdout/stderr into ``output`` (an OutputCollector) as it arrives.
+
+        Stops reading as soon as the collector is full.
+        """
+        async def exchange():
+            reader, writer, status, headers = await self._send(
+                'GET', f'/containers/{container_id}/logs', params={'stdout': 1, 'stderr': 1})
+            try:
+                if status >= 400:
+                    raise DockerAPIError(f"logs of {container_id} -> {status}")
+                demux = LogDemuxer()
+                async for chunk in self._body(reader, headers):
+                    for payload in demux.feed(chunk):
+                        output.feed(payload)
+                    if output.full:
+                        break
+            finally:
+                writer.close()
+
+        await asyncio.wait_for(exchange(), timeout or self.timeout)
+        return output
+
+    async def follow_logs(self, container_id):
+        """Yield a running container's stdout/stderr line by line (newline included) until it exits."""
+        reader, writer, status, headers = await self._send(
+            'GET', f'/containers/{container_id}/logs', params={'stdout': 1, 'stderr': 1, 'follow': 1})
+        try:
+            if status >= 400:
+                raise DockerAPIError(f"logs of {container_id} -> {status}")
+            demux = LogDemuxer()
+            line = bytearray()
+            async for chunk in self._body(reader, headers):
+                for payload in demux.feed(chunk):
+                    start = 0
+                    while (newline := payload.find(b'\n', start)) >= 0:
+                        line += payload[start:newline + 1]
+                        yield bytes(line)
+                        line.clear()
+                        start = newline + 1
+                    line += payload[start:]
+            if line:
+                yield bytes(line)
+        finally:
+            writer.close()
+
+    async def ping(self):
+        await self.request('GET', '/_ping')
+
+    async def image_exists(self, image):
+        try:
+            await self.request('GET', f'/images/{image}/json')
+        except DockerAPIError:
+            return False
+        return True
+
+    async def create_container(self, command, image=JUDGE_IMAGE, mem_limit=JUDGE_MEM_LIMIT, cpu_quota=JUDGE_CPU_QUOTA):
+        """Create (but don't start) a sandboxed container for ``command``; returns its id."""
+        _, created = await self.request('POST', '/containers/create', body={
+            'Image': image,
+            'Cmd': command,
+            'WorkingDir': '/tmp',
+            'NetworkDisabled': True,
+            # No swap, so going over the limit is an OOM kill rather than a slow crawl
+            'HostConfig': {'Memory': mem_limit, 'MemorySwap': mem_limit, 'CpuQuota': cpu_quota},
+        })
+        return json.loads(created)['Id']
+
+    async def run_container(self, command, output=None, image=JUDGE_IMAGE, mem_limit=JUDGE_MEM_LIMIT,
+                            cpu_quota=JUDGE_CPU_QUOTA, time_limit=JUDGE_TIMEOUT):
+        """Run ``command`` in a throwaway container and collect its output into an OutputCollector.
+
+        ``command`` is expected to enforce ``time_limit`` itself; the container
+        is killed once JUDGE_START_TIMEOUT more seconds pass. How it ended is
+        recorded on the collector.
+        """
+        output = output or OutputCollector()
+        container_id = await self.create_container(command, image, mem_limit, cpu_quota)
+        try:
+            await self.request('POST', f'/containers/{container_id}/start')
+            try:
+                _, waited = await self.request('POST', f'/containers/{container_id}/wait',
+                                                 timeout=time_limit + JUDGE_START_TIMEOUT)
+                output.exit_code = json.loads(waited).get('StatusCode')
+            except asyncio.TimeoutError:
+                output.timed_out = True
+                await self.request('POST', f'/containers/{container_id}/kill')
+            if output.exit_code:
+                _, inspected = await self.request('GET', f'/containers/{container_id}/json')
+                output.oom_killed = bool(json.loads(inspected).get('State', {}).get('OOMKilled'))
+            return await self.stream_logs(container_id, output)
+        finally:
+            await self.request('DELETE', f'/containers/{container_id}', params={'force': 1})
+
+
+_harness_checks = {}
+
+
+async def harness_available(client):
+    """Whether the pinned judge image is on the Docker host; looked up every HARNESS_RECHECK_SECONDS.
+
+    ``JUDGE_HARNESS=0`` in the environment turns the judge image off.
+    """
+    if os.environ.get('JUDGE_HARNESS', '1') == '0':
+        return False
+    image = harness_image()
+    available, checked_at = _harness_checks.get(image, (False, None))
+    now = time.monotonic()
+    if checked_at is None or now - checked_at >= HARNESS_RECHECK_SECONDS:
+        available = await client.image_exists(image)
+        _harness_checks[image] = (available, now)
+        if not available:
+            print(f"Judge image {image} not found, running cases in {JUDGE_IMAGE} "
+                  f"(build it with manage.py build_judge_image)")
+    return available
+
+
+def harness_batches(code, test_cases, input_vars):
+    """[(test cases, their harness arguments)], split so each container's arguments fit HARNESS_ARGS_BUDGET."""
+    batches = []
+    room = 0
+    for test_case in test_cases:
+        argument = json.dumps(prepare_inputs(test_case, input_vars))
+        size = len(argument.encode())
+        if not batches or size > room:
+            batches.append(([], []))
+            room = HARNESS_ARGS_BUDGET - len(code.encode())
+        batches[-1][0].append(test_case)
+        batches[-1][1].append(argument)
+        room -= size
+    return batches
+
+
+def harness_result(test_case, record):
+    """The result dict of one case from the harness's report on it."""
+    output = OutputCollector()
+    output.feed(base64.b64decode(record['output']))
+    output.exit_code = record['exit_code']
+    output.timed_out = record['timed_out']
+    output.oom_killed = record['oom_killed']
+    result = evaluate_test_case(test_case, output)
+    result['time_ms'] = record['time_ms']
+    return result
+
+
+async def iter_harness_async(client, code, test_cases, input_vars, time_limit, mem_limit, fail_fast=False):
+    """iter_code_async on the judge image: one container per batch of cases, results streamed as they come."""
+    options = json.dumps({'time_limit': time_limit, 'mem_limit': mem_limit})
+    marker = judge_harness.CASE_MARKER.encode()
+    for cases, arguments in harness_batches(code, test_cases, input_vars):
+        deadline = time.monotonic() + HARNESS_START_TIMEOUT + len(cases) * (time_limit + 1)
+        reported = 0
+        error = "The judge stopped before running this case"
+        container_id = await client.create_container(
+            ['python', '-m', 'judge_harness', options, code, *arguments],
+            image=harness_image(), mem_limit=mem_limit + HARNESS_MEMORY_HEADROOM)
+        try:
+            await client.request('POST', f'/containers/{container_id}/start')
+            async with contextlib.aclosing(client.follow_logs(container_id)) as lines:
+                while reported < len(cases):
+                    try:
+                        line = await asyncio.wait_for(anext(lines), max(deadline - time.monotonic(), 0))
+                    except StopAsyncIteration:
+                        break
+                    if not line.startswith(marker):
+                        # The harness itself failed; its traceback is all there is to show
+                        error = f"The judge failed: {line.decode(errors='replace').strip()}"
+                        continue
+                    record = json.loads(line[len(marker):])
+                    result = harness_result(cases[record['case']], record)
+                    reported += 1
+                    profiling.record('judge', record['time_ms'] / 1000)
+                    yield result
+                    if fail_fast and not result.get('passed'):
+                        return
+        except asyncio.TimeoutError:
+            error = "The judge did not answer in time"
+        except DockerAPIError as e:
+            error = f"Execution failed: {str(e)}"
+        finally:
+            await client.request('DELETE', f'/containers/{container_id}', params={'force': 1})
+        for _ in cases[reported:]:
+            yield {'error': error, 'time_ms': 0}
+            if fail_fast:
+                return
+
+
+async def iter_code_async(code, test_cases, input_vars, language='python',
+                          time_limit=JUDGE_TIMEOUT, mem_limit=JUDGE_MEM_LIMIT, fail_fast=False, use_harness=True):
+    """Run the test cases one by one, yielding each result dict as soon as it is known.
+
+    Every result carries ``time_ms`` (wall time of that case). Connection
+    problems are reported as a single ``{'error': ...}`` result. With
+    ``fail_fast`` the run stops at the first failing case, which is all a
+    verdict needs. Cases run on the judge image when it is available, unless
+    ``use_harness`` is false.
+    """
+    client = AsyncDockerClient()
+    if client.base_url.startswith('npipe:'):
+        # No asyncio transport for Windows named pipes; fall back to the docker SDK in a thread
+        from asgiref.sync import sync_to_async
+        from .docker_runner import run_code_in_docker
+        for test_case in test_cases:
+            started = time.monotonic()
+            result = (await sync_to_async(run_code_in_docker, thread_sensitive=False)(
+                code, [test_case], input_vars, language, time_limit=time_limit, mem_limit=mem_limit))[0]
+            result['time_ms'] = round((time.monotonic() - started) * 1000)
+            profiling.record('judge', time.monotonic() - started)
+            yield result
+            if fail_fast and not result.get('passed'):
+                return
+        return
+
+    try:
+        await client.ping()
+    except (OSError, asyncio.TimeoutError, DockerAPIError) as e:
+        print(f"Failed to connect to Docker daemon: {str(e)}")
+        yield {'error': DOCKER_UNAVAILABLE}
+        return
+
+    if use_harness and await harness_available(client):
+        async for result in iter_harness_async(client, code, test_cases, input_vars, time_limit, mem_limit, fail_fast):
+            yield result
+        return
+
+    for test_case in test_cases:
+        wrapper_code = build_wrapper_code(code, test_case, input_vars, time_limit)
+        started = time.monotonic()
+        try:
+            output = await client.run_container(['python', '-c', wrapper_code],
+                                                time_limit=time_limit, mem_limit=mem_limit)
+            result = evaluate_test_case(test_case, output)
+        except asyncio.TimeoutError:
+            result = {'error': "The judge did not answer in time"}
+        except DockerAPIError as e:
+            result = {'error': f"Execution failed: {str(e)}"}
+        except Exception as e:
+            result = {'error': f"Unexpected error: {str(e)}"}
+        result['time_ms'] = round((time.monotonic() - started) * 1000)
+        profiling.record('judge', time.monotonic() - started)
+        yield result
+        if fail_fast and not result.get('passed'):
+            return
+
+
+async def run_code_async(code, test_cases, input_vars, language='python', **limits):
+    """asyncio counterpart of docker_runner.run_code_in_docker, returning the same result dicts.
+
+    ``limits`` are passed on to iter_code_async (time_limit, mem_limit, fail_fast, use_harness).
+    """
+    return [result async for result in iter_code_async(code, test_cases, input_vars, language, **limits)]
@@ -0,0 +1,199 @@
+# problems/judge_harness.py
+#
+# Entrypoint of the judge image built by `manage.py build_judge_image`. It
+# runs inside the container, so it uses the standard library only and must
+# stay compatible with the image's Python (3.9).
+#
+# One container runs a batch of test cases of one submission:
+#
+#     python -m judge_harness OPTIONS_JSON CODE INPUTS_JSON [INPUTS_JSON ...]
+#
+# The harness imports PRELOAD once, then forks a child per case that runs
+# the solution the way judge.build_wrapper_code does, so cases skip
+# interpreter startup and the imports solutions usually need. The parent
+# enforces the time limit of each case and caps the child's address space at
+# the memory limit. It reports each case as soon as it ends, on one line:
+#
+#     CASE_MARKER {"case": i, "exit_code": ..., "timed_out": ..., "oom_killed": ...,
+#                  "time_ms": ..., "output": <base64 of the child's stdout+stderr>}
+#
+# judge.iter_harness_async turns these back into OutputCollectors.
+import base64
+import json
+import os
+import selectors
+import signal
+import sys
+import time
+
+# Bump when the protocol or the behaviour changes; part of the image tag
+HARNESS_VERSION = '2'
+CASE_MARKER = 'JUDGE_CASE:'
+# As in judge.py; the host applies the same caps again with OutputCollector
+RESULT_SEPARATOR = 'RESULT_SEPARATOR:'
+CONSOLE_LIMIT = 64 * 1024
+RESULT_LIMIT = 1024 * 1024
+PRELOAD = (
+    'array', 'bisect', 'collections', 'copy', 'dataclasses', 'decimal', 'fractions', 'functools',
+    'heapq', 'itertools', 'json', 'math', 'operator', 'random', 're', 'statistics', 'string',
+    'traceback', 'typing',
+)
+
+
+def preload():
+    for name in PRELOAD:
+        __import__(name)
+
+
+def limit_memory(mem_limit):
+    """Cap the address space the case may add to what the forked interpreter already maps."""
+    import resource
+    try:
+        with open('/proc/self/statm') as f:
+            mapped = int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        mapped = 0
+    resource.setrlimit(resource.RLIMIT_AS, (mapped + mem_limit, mapped + mem_limit))
+
+
+class Capture:
+    """What a case printed, cut down to what the host looks at.
+
+    Console lines are kept up to CONSOLE_LIMIT bytes and the result line up
+    to RESULT_LIMIT, each one byte over, so the host still notices and says
+    so; the rest is read and dropped, and the result line survives any
+    amount of printing before it.
+    """
+
+    def __init__(self):
+        self.kept = bytearray()
+        self.console_room = CONSOLE_LIMIT + 1
+        self.start = bytearray()
+        self.room = None
+        self.result = False
+
+    def feed(self, data):
+        while data:
+            newline = data.find(b'\n')
+            if newline < 0:
+                self._add(data)
+                return
+            self._add(data[:newline])
+            self._end_line()
+            data = data[newline + 1:]
+
+    def close(self):
+        if self.start or self.room is not None:
+            self._end_line()
+        return bytes(self.kept)
+
+    def _add(self, piece, line_ends=False):
+        if self.room is None:
+            # Until the marker could still follow, the kind of line isn't known
+            self.start += piece
+            marker = RESULT_SEPARATOR.encode()
+            if not line_ends and len(self.start) < len(marker) and marker.startswith(bytes(self.start)):
+                return
+            self.result = self.start.startswith(marker)
+            self.room = RESULT_LIMIT + len(marker) + 1 if self.result else self.console_room
+            piece = bytes(self.start)
+            self.start.clear()
+        keep = piece[:self.room]
+        self.kept += keep
+        self.room -= len(keep)
+        if not self.result:
+            self.console_room -= len(keep)
+
+    def _end_line(self):
+        if self.room is None:
+            self._add(b'', line_ends=True)
+        self.kept += b'\n'
+        self.room = None
+
+
+def run_case(code, input_data, mem_limit):
+    """In the forked child: run ``solution(**input_data)`` and print the JSON result. Never returns."""
+    status = 0
+    try:
+        if mem_limit:
+            limit_memory(mem_limit)
+        namespace = {'__name__': '__main__', 'json': json, 'sys': sys}
+        exec(compile(code, '<string>', 'exec'), namespace)
+        print("Parameters: " + str(input_data))
+        result = namespace['solution'](**input_data)
+        # On a line of its own even after print(..., end="")
+        print('\n' + RESULT_SEPARATOR + json.dumps(result))
+    except SystemExit as exc:
+        status = exc.code if isinstance(exc.code, int) else 1
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+        status = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(status)
+
+
+def judge_case(code, input_data, time_limit, mem_limit):
+    """Fork a child for one case and collect its output; returns the case record (without 'case')."""
+    read_fd, write_fd = os.pipe()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    started = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        os.dup2(write_fd, 1)
+        os.dup2(write_fd, 2)
+        os.close(write_fd)
+        run_case(code, input_data, mem_limit)
+    os.close(write_fd)
+
+    output = Capture()
+    timed_out = False
+    deadline = started + time_limit
+    with selectors.DefaultSelector() as selector:
+        selector.register(read_fd, selectors.EVENT_READ)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            if not selector.select(remaining):
+                continue
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                break
+            output.feed(chunk)
+    if timed_out:
+        os.kill(pid, signal.SIGKILL)
+    _, status = os.waitpid(pid, 0)
+    elapsed = time.monotonic() - started
+    os.close(read_fd)
+
+    killed = os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGKILL
+    return {
+        'exit_code': 137 if os.WIFSIGNALED(status) else os.WEXITSTATUS(status),
+        'timed_out': timed_out,
+        # Only the kernel (the container's cgroup) kills with SIGKILL here
+        'oom_killed': killed and not timed_out,
+        'time_ms': round(elapsed * 1000),
+        'output': base64.b64encode(output.close()).decode(),
+    }
+
+
+def main(argv):
+    options = json.loads(argv[1])
+    code = argv[2]
+    preload()
+    for index, raw in enumerate(argv[3:]):
+        record = judge_case(code, json.loads(raw), options['time_limit'], options.get('mem_limit'))
+        record['case'] = index
+        sys.stdout.write(CASE_MARKER + json.dumps(record) + '\n')
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,256 @@
+# problems/leaderboards.py
+#
+# Ranked leaderboards kept up to date incrementally. Every board is a set of
+# LeaderboardEntry rows (one per user with a non-zero score) plus one
+# LeaderboardBucket per distinct score holding that score's rank, so:
+#   - a first solve moves the solver up one point on each affected board and
+#     touches a constant number of rows (see LeaderboardBucket);
+#   - a user's rank is two index seeks (entry, then its bucket);
+#   - a top-K page is a range scan over leaderboard_top_idx.
+# Solves arrive through the solved_by signals (signals.py), which also move a
+# problem's solvers between boards when its difficulty or tags are edited; the
+# boards can be rebuilt from history with ``manage.py rebuild_leaderboards``.
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Min, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .models import LeaderboardBucket, LeaderboardEntry, Problem, Solution, Tag
+
+OVERALL = 'overall'
+# Rolling windows: live solves are added as they happen, solves that fall out
+# of the window are dropped by the periodic ``rebuild_leaderboards --windows``
+WINDOWS = {
+    '7d': 7,
+    '30d': 30,
+}
+PAGE_SIZE = 50
+
+
+def difficulty_board(difficulty):
+    return f'difficulty:{difficulty}'
+
+
+def tag_board(tag_id):
+    return f'tag:{tag_id}'
+
+
+def boards_for(difficulty, tag_ids, windows=True):
+    """Every board a solve of a problem with this difficulty and these tags counts towards."""
+    boards = [OVERALL, difficulty_board(difficulty)] + [tag_board(tag_id) for tag_id in tag_ids]
+    if windows:
+        boards += list(WINDOWS)
+    return boards
+
+
+def _tag_id(value):
+    # Tag primary keys are positive 64-bit integers
+    if not value.isascii() or not value.isdigit() or not 0 < int(value) < 2 ** 63:
+        return None
+    return int(value)
+
+
+def is_board(board):
+    """Whether ``board`` names an existing board (as opposed to an arbitrary query string)."""
+    if board == OVERALL or board in WINDOWS:
+        return True
+    kind, _, value = board.partition(':')
+    if kind == 'difficulty':
+        return value in dict(Problem.DIFFICULTY_CHOICES)
+    if kind == 'tag':
+        tag_id = _tag_id(value)
+        return tag_id is not None and Tag.objects.filter(pk=tag_id).exists()
+    return False
+
+
+def board_label(board):
+    if board == OVERALL:
+        return 'Overall'
+    if board in WINDOWS:
+        return f'Last {WINDOWS[board]} days'
+    kind, _, value = board.partition(':')
+    if kind == 'difficulty':
+        return dict(Problem.DIFFICULTY_CHOICES).get(value, value)
+    if kind == 'tag':
+        tag_id = _tag_id(value)
+        tag = Tag.objects.filter(pk=tag_id).first() if tag_id is not None else None
+        return f'Tag: {tag.name}' if tag else board
+    return board
+
+
+def _boards_by_problem(problem_ids):
+    boards = {}
+    tags = {}
+    for problem_id, tag_id in Problem.tags.through.objects.filter(problem_id__in=problem_ids).values_list('problem_id', 'tag_id'):
+        tags.setdefault(problem_id, []).append(tag_id)
+    for problem_id, difficulty in Problem.objects.filter(pk__in=problem_ids).values_list('pk', 'difficulty'):
+        boards[problem_id] = boards_for(difficulty, tags.get(problem_id, []))
+    return boards
+
+
+def _move(board, user_id, delta, when):
+    """Shift one user's score on one board by ``delta``, keeping the bucket ranks exact."""
+    entry = LeaderboardEntry.objects.select_for_update().filter(board=board, user_id=user_id).first()
+    old = entry.score if entry else 0
+    new = max(old + delta, 0)
+    if new == old:
+        return
+
+    buckets = LeaderboardBucket.objects.filter(board=board)
+    if old:
+        buckets.filter(score=old).update(users=F('users') - 1)
+        buckets.filter(score=old, users=0).delete()
+    # Only the scores the user passed over see a different number of users above them
+    if new > old:
+        buckets.filter(score__gte=old, score__lt=new).update(rank=F('rank') + 1)
+    else:
+        buckets.filter(score__gte=new, score__lt=old).update(rank=F('rank') - 1)
+
+    if not new:
+        entry.delete()
+        return
+    above = buckets.filter(score__gt=new).order_by('score').first()
+    LeaderboardBucket.objects.bulk_create(
+        [LeaderboardBucket(board=board, score=new, users=0, rank=above.rank + above.users if above else 1)],
+        ignore_conflicts=True,
+    )
+    buckets.filter(score=new).update(users=F('users') + 1)
+
+    if entry is None:
+        LeaderboardEntry.objects.create(board=board, user_id=user_id, score=new, reached_at=when)
+    else:
+        entry.score = new
+        if new > old:
+            entry.reached_at = when
+        entry.save(update_fields=['score', 'reached_at'])
+
+
+def solve_times(user_id, problem_ids, accepted_only=True):
+    """When each solve happened: the user's first accepted solution, as rebuild_leaderboards dates it.
+
+    Solves with no stored solution (older solved_by rows, admin edits) are
+    undated and only count on the all-time boards.
+    """
+    solutions = Solution.objects.filter(created_by_id=user_id, problem_id__in=problem_ids)
+    if accepted_only:
+        solutions = solutions.filter(verdict='accepted')
+    return dict(solutions.values('problem_id').annotate(first=Min('created_at')).values_list('problem_id', 'first'))
+
+
+def _in_window(board, when, now):
+    return board not in WINDOWS or (when is not None and when >= window_start(board, now))
+
+
+def record_solves(user_id, problem_ids):
+    """First solves of ``problem_ids`` by one user.
+
+    A solve reinstated by a rejudge keeps its original date, so it only lands
+    on the rolling windows it falls in.
+    """
+    now = timezone.now()
+    times = solve_times(user_id, problem_ids)
+    with transaction.atomic():
+        for problem_id, boards in _boards_by_problem(problem_ids).items():
+            when = times.get(problem_id)
+            for board in boards:
+                if _in_window(board, when, now):
+                    _move(board, user_id, 1, when or now)
+
+
+def record_unsolves(user_id, problem_ids):
+    """Solves taken back (a rejudge, or the problem being deleted)."""
+    now = timezone.now()
+    # By now the solution may no longer be accepted (that's why the solve goes)
+    times = solve_times(user_id, problem_ids, accepted_only=False)
+    with transaction.atomic():
+        for problem_id, boards in _boards_by_problem(problem_ids).items():
+            when = times.get(problem_id)
+            for board in boards:
+                if _in_window(board, when, now):
+                    _move(board, user_id, -1, now)
+
+
+def change_boards(problem_id, removed=(), added=()):
+    """A problem's difficulty or tags changed: its solvers leave the ``removed`` boards and join ``added``.
+
+    Each solver moves as a solve would, so an edit costs a few rows per solver.
+    """
+    solvers = list(Problem.solved_by.through.objects.filter(problem_id=problem_id).values_list('user_id', flat=True))
+    if not solvers or not (removed or added):
+        return
+    times = dict(
+        Solution.objects.filter(problem_id=problem_id, created_by_id__in=solvers, verdict='accepted')
+        .values('created_by_id').annotate(first=Min('created_at')).values_list('created_by_id', 'first')
+    )
+    now = timezone.now()
+    with transaction.atomic():
+        for user_id in solvers:
+            for board in removed:
+                _move(board, user_id, -1, now)
+            for board in added:
+                _move(board, user_id, 1, times.get(user_id) or now)
+
+
+def remove_user(user_id):
+    """Take a user off every board (before the account is deleted)."""
+    with transaction.atomic():
+        for board, score in LeaderboardEntry.objects.filter(user_id=user_id).values_list('board', 'score'):
+            _move(board, user_id, -score, timezone.now())
+
+
+def rank(board, user_id):
+    """(rank, score) of one user, or None when they have no points on the board."""
+    bucket_rank = LeaderboardBucket.objects.filter(board=OuterRef('board'), score=OuterRef('score')).values('rank')[:1]
+    return (
+        LeaderboardEntry.objects.filter(board=board, user_id=user_id)
+        .annotate(rank=Subquery(bucket_rank)).values_list('rank', 'score').first()
+    )
+
+
+def board_size(board):
+    return LeaderboardBucket.objects.filter(board=board).aggregate(n=Sum('users'))['n'] or 0
+
+
+def top(board, offset=0, limit=PAGE_SIZE):
+    """Entries ``offset`` to ``offset + limit`` in rank order, each with a ``rank`` attribute.
+
+    Ties share a rank and are listed by who reached the score first.
+    """
+    entries = list(
+        LeaderboardEntry.objects.filter(board=board).select_related('user')
+        .order_by('-score', 'reached_at', 'user_id')[offset:offset + limit]
+    )
+    ranks = dict(
+        LeaderboardBucket.objects.filter(board=board, score__in={entry.score for entry in entries})
+        .values_list('score', 'rank')
+    )
+    for entry in entries:
+        entry.rank = ranks.get(entry.score)
+    return entries
+
+
+def replace_board(board, scores):
+    """Swap a board's contents for ``scores`` ({user_id: (score, reached_at)})."""
+    scores = {user_id: value for user_id, value in scores.items() if value[0] > 0}
+    counts = {}
+    for score, _ in scores.values():
+        counts[score] = counts.get(score, 0) + 1
+    buckets = []
+    above = 0
+    for score in sorted(counts, reverse=True):
+        buckets.append(LeaderboardBucket(board=board, score=score, users=counts[score], rank=above + 1))
+        above += counts[score]
+
+    with transaction.atomic():
+        LeaderboardEntry.objects.filter(board=board).delete()
+        LeaderboardBucket.objects.filter(board=board).delete()
+        LeaderboardEntry.objects.bulk_create([
+            LeaderboardEntry(board=board, user_id=user_id, score=score, reached_at=reached_at)
+            for user_id, (score, reached_at) in scores.items()
+        ], batch_size=1000)
+        LeaderboardBucket.objects.bulk_create(buckets, batch_size=1000)
+
+
+def window_start(board, now=None):
+    return (now or timezone.now()) - timedelta(days=WINDOWS[board])
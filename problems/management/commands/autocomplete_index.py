@@ -0,0 +1,70 @@
+# problems/management/commands/autocomplete_index.py
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from problems import autocomplete
+
+SYLLABLES = ['ar', 'bin', 'co', 'de', 'ex', 'fi', 'gra', 'hea', 'in', 'ja', 'ka', 'li', 'max', 'no', 'or',
+             'pa', 'qu', 're', 'sum', 'tri', 'un', 've', 'wo', 'xo', 'yu', 'zig', 'st', 'th', 'pre', 'sub']
+
+
+def synthetic_items(count, seed=0):
+    """Titles of 2-6 words from a skewed vocabulary, with long-tailed solve counts, plus some tags."""
+    rng = random.Random(seed)
+    vocabulary = sorted({''.join(rng.choices(SYLLABLES, k=rng.randint(1, 4))) for _ in range(5000)})
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    items = []
+    for pk in range(1, count + 1):
+        words = rng.choices(vocabulary, weights, k=rng.randint(2, 6))
+        title = ' '.join(words).title() + ('' if rng.random() < 0.8 else f' {rng.choice("IVX")}')
+        items.append((autocomplete.PROBLEM, pk, title, int(rng.paretovariate(1.2)) - 1))
+    for pk, name in enumerate(rng.sample(vocabulary, min(300, len(vocabulary))), start=1):
+        items.append((autocomplete.TAG, pk, name, rng.randint(0, count // 50)))
+    return items
+
+
+class Command(BaseCommand):
+    help = ("Build the search box's prefix index (problems/autocomplete.py) and report its size, memory use "
+            "and query latency. --synthetic N measures a generated catalogue of N titles instead of the database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--synthetic', type=int, help="Index this many generated titles instead of the database")
+        parser.add_argument('--queries', type=int, default=20000, help="Queries for the latency measurement")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        items = synthetic_items(options['synthetic']) if options['synthetic'] else autocomplete.load_items()
+        loaded = time.perf_counter()
+        index = autocomplete.PrefixIndex(items)
+        built = time.perf_counter()
+        self.stdout.write(f"{len(index)} items, {len(index.entries)} keys; loaded in {(loaded - started) * 1000:.0f} ms, "
+                          f"indexed in {(built - loaded) * 1000:.0f} ms")
+        self.stdout.write(f"Memory: {index.memory_bytes() / 1024 / 1024:.1f} MB")
+        if not len(index):
+            return
+
+        # What people type: 1 to 8 leading characters of some word of a title
+        rng = random.Random(1)
+        labels = [label for _, _, label, _ in items]
+        queries = []
+        for _ in range(options['queries']):
+            words = autocomplete.normalize(rng.choice(labels)).split() or ['a']
+            word = rng.choice(words)
+            queries.append(word[:rng.randint(1, min(len(word), 8))])
+
+        timings = []
+        for query in queries:
+            query_started = time.perf_counter()
+            index.search(query)
+            timings.append((time.perf_counter() - query_started) * 1000)
+        timings.sort()
+        percentile = lambda p: timings[min(int(len(timings) * p), len(timings) - 1)]
+        self.stdout.write(
+            f"Latency over {len(timings)} queries: p50 {statistics.median(timings):.3f} ms, "
+            f"p99 {percentile(0.99):.3f} ms, max {timings[-1]:.3f} ms"
+        )
+        for query in ('a', 'su', 'tri'):
+            self.stdout.write(f"  {query!r}: " + ', '.join(f"{label} ({score})" for _, _, label, score in index.search(query, 5)))
@@ -0,0 +1,87 @@
+# problems/management/commands/backfill_fingerprints.py
+import time
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from problems import blobs, fingerprints
+from problems.models import Problem, SolutionFingerprint, SolutionMatch
+
+
+class Command(BaseCommand):
+    help = ("Fingerprint the stored solutions that aren't indexed yet (all of them with --rebuild) and record "
+            "the suspicious matches. Works one problem at a time, matching in memory and writing in bulk.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--problem', type=int, action='append', help="Problem id (repeatable)")
+        parser.add_argument('--rebuild', action='store_true', help="Drop and recompute existing fingerprints too")
+
+    def handle(self, *args, **options):
+        problems = Problem.objects.order_by('pk').only('pk', 'function_header')
+        if options['problem']:
+            problems = problems.filter(pk__in=options['problem'])
+
+        started = time.monotonic()
+        indexed = matched = 0
+        for problem in problems.iterator():
+            problem_indexed, problem_matched = self.backfill(problem, options['rebuild'])
+            indexed += problem_indexed
+            matched += problem_matched
+            if problem_matched:
+                self.stdout.write(f"Problem {problem.pk}: {problem_indexed} solutions indexed, {problem_matched} matches")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} solutions in {elapsed:.1f}s "
+            f"({indexed / elapsed if elapsed else 0:.0f} solutions/s), {matched} suspicious matches"
+        ))
+
+    def backfill(self, problem, rebuild):
+        solutions = [
+            (solution_id, author_id, blobs.decode(data, compressed))
+            for solution_id, author_id, data, compressed in problem.solutions.values_list(
+                'pk', 'created_by_id', 'code_blob__data', 'code_blob__compressed')
+        ]
+        authors = {solution_id: author_id for solution_id, author_id, _ in solutions}
+        known = defaultdict(set)
+        if not rebuild:
+            for solution_id, value in SolutionFingerprint.objects.filter(problem=problem).values_list('solution_id', 'hash'):
+                known[solution_id].add(value)
+        base = fingerprints.base_fingerprints(problem)
+        new = {
+            solution_id: fingerprints.fingerprint(code) - base
+            for solution_id, _, code in solutions if solution_id not in known
+        }
+        if not new:
+            return 0, 0
+
+        everything = {**known, **new}
+        inverted = defaultdict(list)
+        for solution_id, hashes in everything.items():
+            for value in hashes:
+                inverted[value].append(solution_id)
+        matches = {}
+        for solution_id, hashes in new.items():
+            shared = Counter()
+            for value in hashes:
+                shared.update(inverted[value])
+            del shared[solution_id]
+            for other, count in shared.items():
+                pair = tuple(sorted((solution_id, other)))
+                if pair in matches or authors[other] == authors[solution_id]:
+                    continue
+                match = fingerprints.make_match(problem.pk, solution_id, other, count, len(hashes), len(everything[other]))
+                if match:
+                    matches[pair] = match
+
+        with transaction.atomic():
+            if rebuild:
+                SolutionFingerprint.objects.filter(problem=problem).delete()
+                SolutionMatch.objects.filter(problem=problem).delete()
+            SolutionFingerprint.objects.bulk_create([
+                SolutionFingerprint(problem_id=problem.pk, solution_id=solution_id, hash=value)
+                for solution_id, hashes in new.items() for value in hashes
+            ], batch_size=2000)
+            SolutionMatch.objects.bulk_create(matches.values(), batch_size=2000, ignore_conflicts=True)
+        return len(new), len(matches)
@@ -0,0 +1,118 @@
+# problems/management/commands/benchmark_startup.py
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter: django.setup(), then the first URL resolution
+# (which imports the URLconf and with it every view module)
+PROBE = r'''
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+from django.urls import resolve
+resolve('/')
+resolved = time.perf_counter()
+try:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss_kb //= 1024
+except ImportError:
+    rss_kb = None
+print(json.dumps({
+    'setup_ms': (setup_done - started) * 1000,
+    'urls_ms': (resolved - setup_done) * 1000,
+    'rss_kb': rss_kb,
+    'modules': sorted(sys.modules),
+}))
+'''
+_IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+# The web path must not pull these in; they are imported on first use
+LAZY_MODULES = ('docker', 'requests', 'PIL')
+
+
+def parse_importtime(stderr):
+    """{top-level package: cumulative microseconds} from a -X importtime report."""
+    packages = {}
+    for line in stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match and not match.group(3):
+            package = match.group(4).split('.')[0]
+            packages[package] = packages.get(package, 0) + int(match.group(2))
+    return packages
+
+
+def probe():
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        capture_output=True, text=True, env={**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE},
+    )
+    if completed.returncode:
+        raise CommandError(f"Startup probe failed:\n{completed.stderr[-2000:]}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['packages'] = parse_importtime(completed.stderr)
+    return result
+
+
+class Command(BaseCommand):
+    help = ("Measure process startup: django.setup() plus the first URL resolution in fresh interpreters, "
+            "with peak RSS and the slowest imports. Compare against a saved baseline to catch regressions.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15, help="Slowest top-level imports to list")
+        parser.add_argument('--save', help="Write the results to this JSON file")
+        parser.add_argument('--baseline', help="Fail when slower or bigger than this saved JSON file")
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help="Allowed regression against the baseline (default 0.2 = 20%%)")
+
+    def handle(self, *args, **options):
+        runs = [probe() for _ in range(max(options['runs'], 1))]
+        # The first run pays for cold .pyc and disk caches; the median is what a worker sees
+        result = {
+            'setup_ms': round(statistics.median(run['setup_ms'] for run in runs), 1),
+            'urls_ms': round(statistics.median(run['urls_ms'] for run in runs), 1),
+            'rss_kb': runs[-1]['rss_kb'],
+            'modules': len(runs[-1]['modules']),
+        }
+        result['startup_ms'] = round(result['setup_ms'] + result['urls_ms'], 1)
+        packages = {
+            package: statistics.median(run['packages'].get(package, 0) for run in runs)
+            for package in runs[-1]['packages']
+        }
+
+        self.stdout.write(f"Startup over {len(runs)} runs (median): {result['startup_ms']} ms "
+                          f"(django.setup {result['setup_ms']} ms, first URL resolution {result['urls_ms']} ms)")
+        self.stdout.write(f"Peak RSS: {result['rss_kb']} KB, {result['modules']} modules loaded")
+        self.stdout.write("Slowest top-level imports (cumulative):")
+        for package, micros in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"  {micros / 1000:8.1f} ms  {package}")
+
+        problems = []
+        eager = [name for name in LAZY_MODULES if name in runs[-1]['modules']]
+        if eager:
+            problems.append(f"imported at startup, should be lazy: {', '.join(eager)}")
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            for key in ('startup_ms', 'rss_kb'):
+                if baseline.get(key) and result[key] and result[key] > baseline[key] * (1 + options['tolerance']):
+                    problems.append(f"{key} {result[key]} vs baseline {baseline[key]}")
+
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(result, f, indent=2)
+            self.stdout.write(f"Saved to {options['save']}")
+
+        if problems:
+            raise CommandError("Startup regressed: " + '; '.join(problems))
+        self.stdout.write(self.style.SUCCESS("Startup OK"))
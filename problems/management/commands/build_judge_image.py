@@ -0,0 +1,92 @@
+# problems/management/commands/build_judge_image.py
+import asyncio
+import io
+import statistics
+import tarfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from problems import judge
+
+BENCHMARK_CODE = "def solution(a: int) -> int:\n    return a\n"
+
+
+def context_tar(files):
+    """The build context as an in-memory tar archive."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as archive:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mtime = 0
+            archive.addfile(info, io.BytesIO(content))
+    buffer.seek(0)
+    return buffer
+
+
+class Command(BaseCommand):
+    help = ("Build the judge image: the stock judge image plus a harness (problems/judge_harness.py) with "
+            "precompiled bytecode that runs a submission's test cases in one container, forking a preloaded "
+            "interpreter per case. The image is tagged with the harness version and a digest of its build "
+            "context; the judge uses the tag matching its own code whenever that image exists.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-cache', action='store_true', help="Build without Docker's layer cache")
+        parser.add_argument('--pull', action='store_true', help="Pull a newer base image first")
+        parser.add_argument('--skip-build', action='store_true', help="Only run the benchmark")
+        parser.add_argument('--benchmark', type=int, metavar='CASES',
+                            help="Afterwards, compare the per-case overhead of the stock and the judge image "
+                                 "on a trivial solution with this many test cases")
+        parser.add_argument('--rounds', type=int, default=3, help="Benchmark rounds per image")
+
+    def handle(self, *args, **options):
+        image = judge.harness_image()
+        if not options['skip_build']:
+            self.build(image, options)
+        if options['benchmark']:
+            asyncio.run(self.benchmark(image, options['benchmark'], options['rounds']))
+
+    def build(self, image, options):
+        try:
+            import docker
+        except ImportError:
+            raise CommandError("The docker SDK is needed to build images (pip install docker)")
+        self.stdout.write(f"Building {image} from {judge.JUDGE_IMAGE}")
+        started = time.monotonic()
+        try:
+            client = docker.APIClient(base_url=judge.docker_base_url(), timeout=600)
+            for chunk in client.build(fileobj=context_tar(judge.harness_context()), custom_context=True, tag=image,
+                                      rm=True, nocache=options['no_cache'], pull=options['pull'], decode=True):
+                if 'error' in chunk:
+                    raise CommandError(f"Build failed: {chunk['error']}")
+                if chunk.get('stream', '').strip():
+                    self.stdout.write(f"  {chunk['stream'].rstrip()}")
+        except docker.errors.DockerException as e:
+            raise CommandError(f"Build failed: {e}")
+        self.stdout.write(self.style.SUCCESS(f"Built {image} in {time.monotonic() - started:.1f}s"))
+
+    async def benchmark(self, image, cases, rounds):
+        client = judge.AsyncDockerClient()
+        if not await client.image_exists(image):
+            raise CommandError(f"{image} isn't built yet")
+        test_cases = [
+            type('TestCase', (), {'input_value': f'{{"a": {n}}}', 'expected_output': n,
+                                  'return_type': 'int', 'comparison': 'auto'})
+            for n in range(cases)
+        ]
+        input_vars = [{'name': 'a', 'type': 'int'}]
+        medians = []
+        for label, use_harness in ((judge.JUDGE_IMAGE, False), (image, True)):
+            per_case = []
+            for _ in range(rounds):
+                started = time.monotonic()
+                results = await judge.run_code_async(BENCHMARK_CODE, test_cases, input_vars, use_harness=use_harness)
+                elapsed_ms = (time.monotonic() - started) * 1000
+                if not all(result.get('passed') for result in results):
+                    failed = next(result for result in results if not result.get('passed'))
+                    raise CommandError(f"Benchmark solution failed on {label}: {failed.get('error') or failed}")
+                per_case.append(elapsed_ms / cases)
+            medians.append(statistics.median(per_case))
+            self.stdout.write(f"{label}: {medians[-1]:.1f} ms per case (median of {rounds} runs of {cases} cases)")
+        self.stdout.write(self.style.SUCCESS(f"Per-case overhead {medians[0] / medians[1]:.1f}x lower on {image}"))
@@ -0,0 +1,71 @@
+# problems/management/commands/code_storage.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from problems.models import CodeBlob, Solution
+
+BLOB_TABLE = CodeBlob._meta.db_table
+SOLUTION_TABLE = Solution._meta.db_table
+# intern() marks a blob used just before the solution pointing at it is saved;
+# a blob used this recently may be about to be referenced again
+PRUNE_GRACE = timedelta(hours=1)
+
+
+def human_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def prune(used_before):
+    """Delete the blobs no solution refers to and unused since ``used_before``; returns how many.
+
+    One statement, so the reference check and the delete see the same rows;
+    a blob intern() hands out in the meantime has a fresh last_used_at.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {BLOB_TABLE} WHERE last_used_at < %s AND NOT EXISTS "
+            f"(SELECT 1 FROM {SOLUTION_TABLE} WHERE {SOLUTION_TABLE}.code_blob_id = {BLOB_TABLE}.digest)",
+            [used_before],
+        )
+        return cursor.rowcount
+
+
+class Command(BaseCommand):
+    help = ("Report how much space the content-addressed code store (CodeBlob) saves over storing every "
+            "solution's code as it was submitted, split into deduplication and compression.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true',
+                            help="Delete blobs no solution refers to any more (unless used in the last hour)")
+
+    def handle(self, *args, **options):
+        solutions = Solution.objects.aggregate(count=Count('pk'), logical=Sum('code_blob__size'))
+        referenced = Solution.objects.values('code_blob')
+        stored = (CodeBlob.objects.filter(digest__in=referenced)
+                  .aggregate(count=Count('pk'), size=Sum('size'), stored=Sum(Length('data'))))
+        orphans = CodeBlob.objects.exclude(digest__in=referenced)
+        logical = solutions['logical'] or 0
+        unique = stored['size'] or 0
+        on_disk = stored['stored'] or 0
+
+        self.stdout.write(f"Solutions:         {solutions['count']}")
+        self.stdout.write(f"Distinct code:     {stored['count']}")
+        self.stdout.write(f"Submitted code:    {human_size(logical)}")
+        self.stdout.write(f"After dedup:       {human_size(unique)} (saves {human_size(logical - unique)})")
+        self.stdout.write(f"After compression: {human_size(on_disk)} (saves {human_size(unique - on_disk)})")
+        if logical:
+            self.stdout.write(self.style.SUCCESS(f"Stored code is {100 * on_disk / logical:.1f}% of submitted code"))
+
+        if options['prune']:
+            self.stdout.write(f"Deleted {prune(timezone.now() - PRUNE_GRACE)} unreferenced blobs")
+        else:
+            self.stdout.write(f"Unreferenced blobs: {orphans.count()} (delete with --prune)")
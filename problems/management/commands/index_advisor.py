@@ -0,0 +1,93 @@
+# problems/management/commands/index_advisor.py
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from problems import views
+from problems.models import FavoriteProblem, Problem
+
+
+def view_queries(problem, user):
+    """The querysets problems/views.py runs, built by the views' own helpers, keyed by where they come from."""
+    tag = problem.tags.values_list('name', flat=True).first()
+    return [
+        ('problem_list: every problem',
+         views.problem_list_queryset(user)),
+        ('problem_list: title search',
+         views.problem_list_queryset(user, problem.title[:3])),
+        ('problem_list: tag filter',
+         views.problem_list_queryset(user, selected_tags=[tag] if tag else [])),
+        ('problem_list: liked filter',
+         views.problem_list_queryset(user, liked=True)),
+        ('problem_list: disliked filter',
+         views.problem_list_queryset(user, disliked=True)),
+        ('problem_list: favorited filter',
+         views.problem_list_queryset(user, favorited=True)),
+        ('problem_list: favorites of user',
+         FavoriteProblem.objects.filter(user=user)),
+        ('problem_detail: user rating',
+         problem.ratings.filter(user=user).order_by('pk')[:1]),
+        ('problem_detail: favorited',
+         problem.favorited_by.filter(user=user)[:1]),
+        ('problem_detail: your solutions',
+         views.user_solutions_queryset(problem, user)),
+        ('problem_detail: community solutions page',
+         views.community_solutions_queryset(problem, user)[:views.COMMUNITY_SOLUTIONS_PAGE_SIZE + 1]),
+        ('profile: created problems',
+         views.created_problems_queryset(user)[:views.PROFILE_PAGE_SIZE]),
+        ('profile: submitted solutions',
+         views.submitted_solutions_queryset(user)[:views.PROFILE_PAGE_SIZE]),
+    ]
+
+
+def full_scans(plan, limited=True):
+    """Plan lines that read a whole table instead of seeking an index."""
+    flagged = []
+    for line in plan.splitlines():
+        text = line.strip()
+        if connection.vendor == 'sqlite':
+            # "SCAN t USING [COVERING] INDEX ..." walks an index in order, which
+            # is fine for a page but still reads every row of an unlimited query
+            if 'SCAN ' in text and ('USING' not in text or not limited):
+                flagged.append(text)
+        elif 'Seq Scan' in text:
+            flagged.append(text)
+    return flagged
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN QUERY PLAN over the view queries and flag full table scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--problem', type=int, help="Problem id to plan against (defaults to the busiest)")
+        parser.add_argument('--user', help="Username to plan against (defaults to the most active)")
+        parser.add_argument('--fail-on-scan', action='store_true', help="Exit non-zero if any full scan is found")
+
+    def handle(self, *args, **options):
+        if options['problem']:
+            problem = Problem.objects.filter(pk=options['problem']).first()
+        else:
+            problem = Problem.objects.order_by('-like_count').first()
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+        else:
+            user = User.objects.order_by('-pk').first()
+        if problem is None or user is None:
+            raise CommandError("Need at least one problem and one user (see seed_scale_data).")
+
+        self.stdout.write(f"Planning against problem {problem.pk} and user {user.username} on {connection.vendor}\n")
+        queries = view_queries(problem, user)
+        flagged_queries = 0
+        for name, queryset in queries:
+            plan = queryset.explain()
+            scans = full_scans(plan, limited=queryset.query.high_mark is not None)
+            status = self.style.ERROR('FULL SCAN') if scans else self.style.SUCCESS('ok')
+            self.stdout.write(f"[{status}] {name}")
+            for line in plan.splitlines():
+                self.stdout.write(f"    {line}")
+            flagged_queries += bool(scans)
+
+        summary = f"{flagged_queries} of {len(queries)} queries use a full scan"
+        if flagged_queries and options['fail_on_scan']:
+            raise CommandError(summary)
+        self.stdout.write(summary)
@@ -0,0 +1,39 @@
+# problems/management/commands/process_avatars.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from problems import avatars
+from problems.models import Profile
+
+
+class Command(BaseCommand):
+    help = ("Make the resized WebP/JPEG variants of profile pictures that don't have them yet (uploads from "
+            "before the avatar pipeline, or ones whose background processing was interrupted).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Reprocess every picture, not only pending ones")
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True).order_by('pk')
+        started = time.monotonic()
+        processed = failed = 0
+        original_bytes = variant_bytes = 0
+        for profile in profiles.iterator():
+            if not options['all'] and not profile.avatar_pending:
+                continue
+            try:
+                size = profile.profile_picture.size
+                avatars.process(profile)
+            except (OSError, ValueError) as exc:
+                # A missing file or something Pillow can't read; leave it pending
+                failed += 1
+                self.stderr.write(f"Profile {profile.pk} ({profile.profile_picture.name}): {exc}")
+                continue
+            processed += 1
+            original_bytes += size
+            variant_bytes += avatars.variant_size(profile, 'small', 'webp')
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} profile pictures ({failed} failed) in {time.monotonic() - started:.1f}s: "
+            f"{original_bytes / 1024:.0f} KB of originals, {variant_bytes / 1024:.1f} KB as small WebP avatars"
+        ))
@@ -0,0 +1,58 @@
+# problems/management/commands/rebuild_leaderboards.py
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from problems import leaderboards
+from problems.models import LeaderboardBucket, Problem, Solution
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the leaderboards from solved_by, dating each solve by the user's first accepted solution. "
+            "Run with --windows daily to drop solves that fell out of the rolling windows.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--windows', action='store_true', help="Only rebuild the rolling-window boards")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        now = timezone.now()
+        first_solution = (Solution.objects.filter(problem=OuterRef('problem_id'), created_by=OuterRef('user_id'), verdict='accepted')
+                          .order_by('created_at').values('created_at')[:1])
+        solves = Problem.solved_by.through.objects.annotate(solved_at=Subquery(first_solution))
+        if options['windows']:
+            longest = max(leaderboards.WINDOWS.values())
+            solves = solves.filter(solved_at__gte=now - timedelta(days=longest))
+
+        tags = {}
+        for problem_id, tag_id in Problem.tags.through.objects.values_list('problem_id', 'tag_id'):
+            tags.setdefault(problem_id, []).append(tag_id)
+        difficulties = dict(Problem.objects.values_list('pk', 'difficulty'))
+
+        boards = {board: {} for board in leaderboards.WINDOWS}
+        for user_id, problem_id, solved_at in solves.values_list('user_id', 'problem_id', 'solved_at').iterator():
+            if options['windows']:
+                targets = []
+            else:
+                targets = leaderboards.boards_for(difficulties[problem_id], tags.get(problem_id, []), windows=False)
+            # Undated solves (no accepted solution stored) stay off the rolling windows
+            if solved_at is not None:
+                targets += [board for board in leaderboards.WINDOWS if solved_at >= leaderboards.window_start(board, now)]
+            solved_at = solved_at or now
+            for board in targets:
+                score, reached_at = boards.setdefault(board, {}).get(user_id, (0, solved_at))
+                boards[board][user_id] = (score + 1, max(reached_at, solved_at))
+
+        if not options['windows']:
+            # Boards nobody scores on any more (a tag that lost its problems...)
+            for board in set(LeaderboardBucket.objects.values_list('board', flat=True).distinct()) - set(boards):
+                boards[board] = {}
+        for board, scores in boards.items():
+            leaderboards.replace_board(board, scores)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(boards)} leaderboards in {time.monotonic() - started:.1f}s"
+        ))
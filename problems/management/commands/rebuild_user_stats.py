@@ -0,0 +1,71 @@
+# problems/management/commands/rebuild_user_stats.py
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+from problems.models import Problem, Solution, UserStats
+from problems.stats import SOLVED_FIELDS, advance_streak
+
+CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ("Recompute the materialized UserStats rows from solved_by/attempted_by and stored solutions. "
+            "Failed submissions are not stored anywhere, so the submission counter is never lowered.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', help="Only rebuild these usernames (repeatable)")
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(username__in=options['user'])
+        all_ids = list(users.values_list('pk', flat=True))
+        rebuilt = 0
+        for start in range(0, len(all_ids), CHUNK_SIZE):
+            rebuilt += self.rebuild(all_ids[start:start + CHUNK_SIZE])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {rebuilt} users"))
+
+    def rebuild(self, user_ids):
+        solved = {}
+        for user_id, difficulty, n in (Problem.solved_by.through.objects.filter(user_id__in=user_ids)
+                                       .values_list('user_id', 'problem__difficulty')
+                                       .annotate(n=Count('pk')).order_by()):
+            solved.setdefault(user_id, {})[difficulty] = n
+        attempted = dict(Problem.attempted_by.through.objects.filter(user_id__in=user_ids)
+                         .values_list('user_id').annotate(n=Count('pk')).order_by())
+        # A rejudge can turn a stored solution into a rejected one
+        accepted = dict(Solution.objects.filter(created_by_id__in=user_ids, verdict='accepted')
+                        .values_list('created_by_id').annotate(n=Count('pk')).order_by())
+        solve_days = {}
+        for user_id, day in (Solution.objects.filter(created_by_id__in=user_ids, verdict='accepted')
+                             .annotate(day=TruncDate('created_at')).values_list('created_by_id', 'day')
+                             .distinct().order_by('created_by_id', 'day')):
+            solve_days.setdefault(user_id, []).append(day)
+        existing = {row.pk: row for row in UserStats.objects.filter(pk__in=user_ids)}
+
+        rows = []
+        for user_id in user_ids:
+            row = existing.get(user_id) or UserStats(user_id=user_id)
+            for difficulty, field in SOLVED_FIELDS.items():
+                setattr(row, field, solved.get(user_id, {}).get(difficulty, 0))
+            row.attempted = attempted.get(user_id, 0)
+            row.accepted_submissions = accepted.get(user_id, 0)
+            row.submissions = max(row.submissions, row.accepted_submissions)
+            current = longest = 0
+            last_day = None
+            for day in solve_days.get(user_id, []):
+                current, longest, last_day = advance_streak(current, longest, last_day, day)
+            row.current_streak, row.longest_streak, row.last_solved_on = current, longest, last_day
+            rows.append(row)
+
+        fields = list(SOLVED_FIELDS.values()) + [
+            'attempted', 'submissions', 'accepted_submissions', 'current_streak', 'longest_streak', 'last_solved_on',
+        ]
+        with transaction.atomic():
+            UserStats.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=['user'], update_fields=fields,
+            )
+        return len(rows)
@@ -0,0 +1,214 @@
+# problems/management/commands/rejudge.py
+import asyncio
+import json
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from problems import judge
+from problems.models import Problem, Solution
+from problems.versioning import bump_user, touch_problem
+
+
+def load_test_cases(problem):
+    """Test cases in the shape the judge expects (see views.load_judge_test_cases)."""
+    return [
+        type('TestCase', (), {
+            'input_value': tc.input_value,
+            'expected_output': tc.expected_output,
+            'return_type': problem.return_type,
+            'comparison': problem.comparison,
+        }) for tc in problem.test_cases.all()
+    ]
+
+
+def judge_failure(results):
+    """The error of a result the judge itself failed to produce (no verdict), or None."""
+    for result in results:
+        if 'error' in result and 'verdict' not in result:
+            return result['error']
+    return None
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m" if hours else f"{minutes}m {seconds:02d}s"
+
+
+class Command(BaseCommand):
+    help = ("Re-run stored solutions through the judge (e.g. after a test case was fixed) and update their "
+            "verdicts and solved_by. Solutions are judged in batches with bounded concurrency; each batch is "
+            "committed in one transaction and checkpointed, so an interrupted run can be continued with --resume.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--problem', type=int, action='append', help="Problem id (repeatable)")
+        parser.add_argument('--solution', type=int, action='append', help="Solution id (repeatable)")
+        parser.add_argument('--user', action='append', help="Username (repeatable)")
+        parser.add_argument('--since', help="Only solutions created on or after this date (YYYY-MM-DD)")
+        parser.add_argument('--until', help="Only solutions created on or before this date (YYYY-MM-DD)")
+        parser.add_argument('--concurrency', type=int, default=4, help="Solutions judged at the same time")
+        parser.add_argument('--batch-size', type=int, default=50, help="Solutions committed per transaction")
+        parser.add_argument('--checkpoint', default='rejudge_checkpoint.json', help="Where progress is recorded")
+        parser.add_argument('--resume', action='store_true', help="Continue from the checkpoint of an earlier run")
+        parser.add_argument('--dry-run', action='store_true', help="Judge and report, but write nothing")
+
+    def handle(self, *args, **options):
+        filters = {key: options[key] for key in ('problem', 'solution', 'user', 'since', 'until')}
+        solutions = self.select(filters)
+
+        last_id, done = 0, 0
+        if options['resume']:
+            if not os.path.exists(options['checkpoint']):
+                raise CommandError(f"No checkpoint at {options['checkpoint']}")
+            with open(options['checkpoint']) as f:
+                checkpoint = json.load(f)
+            if checkpoint['filters'] != filters:
+                raise CommandError(f"The checkpoint was written for different filters: {checkpoint['filters']}")
+            last_id, done = checkpoint['last_id'], checkpoint['done']
+            self.stdout.write(f"Resuming after solution {last_id} ({done} already judged)")
+
+        total = done + solutions.filter(id__gt=last_id).count()
+        if not total:
+            self.stdout.write("Nothing to rejudge")
+            return
+        self.stdout.write(f"Rejudging {total - done} of {total} solutions, {options['concurrency']} at a time")
+
+        problems = {}
+        changed = gained = lost = 0
+        skipped = {}
+        started = time.monotonic()
+        judged_this_run = 0
+        while True:
+            batch = list(solutions.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            for solution in batch:
+                if solution.problem_id not in problems:
+                    problem = Problem.objects.get(pk=solution.problem_id)
+                    problems[solution.problem_id] = (problem, load_test_cases(problem))
+
+            verdicts, failures = asyncio.run(self.judge_batch(batch, problems, options['concurrency']))
+            skipped.update(failures)
+            if not options['dry_run']:
+                batch_changed, batch_gained, batch_lost = self.apply(batch, verdicts, problems)
+                changed, gained, lost = changed + batch_changed, gained + batch_gained, lost + batch_lost
+            else:
+                changed += sum(1 for solution in batch if verdicts.get(solution.pk, solution.verdict) != solution.verdict)
+
+            last_id = batch[-1].pk
+            done += len(batch)
+            judged_this_run += len(batch)
+            if not options['dry_run']:
+                with open(options['checkpoint'], 'w') as f:
+                    json.dump({'filters': filters, 'last_id': last_id, 'done': done}, f)
+
+            elapsed = time.monotonic() - started
+            rate = judged_this_run / elapsed if elapsed else 0
+            eta = (total - done) / rate if rate else 0
+            self.stdout.write(
+                f"[{done:>{len(str(total))}}/{total}] {100 * done / total:5.1f}%  "
+                f"{rate * 60:7.1f} solutions/min  ETA {format_duration(eta)}  ({changed} verdicts changed)"
+            )
+
+        if not options['dry_run'] and os.path.exists(options['checkpoint']):
+            os.remove(options['checkpoint'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Rejudged {judged_this_run} solutions in {format_duration(elapsed)} "
+            f"({judged_this_run / elapsed * 60 if elapsed else 0:.1f} solutions/min): "
+            f"{changed} verdicts changed, {gained} solves gained, {lost} solves lost"
+            + (" (dry run, nothing written)" if options['dry_run'] else "")
+        ))
+        if skipped:
+            for pk, error in sorted(skipped.items()):
+                self.stderr.write(f"Solution {pk} was not judged: {error}")
+            self.stderr.write(self.style.WARNING(
+                f"{len(skipped)} solutions kept their verdicts because the judge failed; rejudge them with "
+                + ' '.join(f'--solution {pk}' for pk in sorted(skipped))
+            ))
+
+    def select(self, filters):
+        solutions = Solution.objects.select_related('code_blob').order_by('id')
+        if filters['problem']:
+            solutions = solutions.filter(problem_id__in=filters['problem'])
+        if filters['solution']:
+            solutions = solutions.filter(pk__in=filters['solution'])
+        if filters['user']:
+            user_ids = list(User.objects.filter(username__in=filters['user']).values_list('pk', flat=True))
+            if len(user_ids) != len(set(filters['user'])):
+                raise CommandError("Unknown username in --user")
+            solutions = solutions.filter(created_by_id__in=user_ids)
+        for option, lookup in (('since', 'created_at__date__gte'), ('until', 'created_at__date__lte')):
+            if filters[option]:
+                day = parse_date(filters[option])
+                if day is None:
+                    raise CommandError(f"--{option} must be a date (YYYY-MM-DD)")
+                solutions = solutions.filter(**{lookup: day})
+        return solutions
+
+    async def judge_batch(self, batch, problems, concurrency):
+        """({solution id: verdict}, {solution id: judge error}) for the solutions of one batch.
+
+        Problems without test cases are skipped, and so are solutions the judge
+        failed on (timeouts, API errors): those are not the solution's fault.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def judge_one(solution):
+            problem, test_cases = problems[solution.problem_id]
+            if not test_cases:
+                return solution.pk, None, None
+            async with semaphore:
+                results = await judge.run_code_async(solution.code, test_cases, problem.input_vars,
+                                                     fail_fast=True, **problem.judge_limits)
+            if any(result.get('error') == judge.DOCKER_UNAVAILABLE for result in results):
+                # Not the solution's fault: stop so the run can be resumed later
+                raise CommandError(judge.DOCKER_UNAVAILABLE)
+            failure = judge_failure(results)
+            if failure:
+                return solution.pk, None, failure
+            return solution.pk, judge.verdict_for(results, len(test_cases)), None
+
+        outcomes = await asyncio.gather(*map(judge_one, batch))
+        return ({pk: verdict for pk, verdict, _ in outcomes if verdict},
+                {pk: failure for pk, _, failure in outcomes if failure})
+
+    def apply(self, batch, verdicts, problems):
+        """Write one batch's verdicts and bring solved_by in line with them, atomically."""
+        now = timezone.now()
+        updated = []
+        changed = gained = lost = 0
+        for solution in batch:
+            verdict = verdicts.get(solution.pk)
+            if verdict is None:
+                continue
+            changed += verdict != solution.verdict
+            solution.verdict, solution.judged_at = verdict, now
+            updated.append(solution)
+
+        pairs = {(solution.problem_id, solution.created_by_id) for solution in updated}
+        with transaction.atomic():
+            Solution.objects.bulk_update(updated, ['verdict', 'judged_at'])
+            # bulk_update sends no post_save, so the pages showing these solutions aren't invalidated otherwise
+            bump_user(*{user_id for _, user_id in pairs})
+            touch_problem(*{problem_id for problem_id, _ in pairs})
+            for problem_id in {problem_id for problem_id, _ in pairs}:
+                problem = problems[problem_id][0]
+                user_ids = {user_id for pid, user_id in pairs if pid == problem_id}
+                # A user keeps the solve while any of their solutions for the problem is accepted
+                accepted = set(Solution.objects.filter(problem_id=problem_id, created_by_id__in=user_ids, verdict='accepted')
+                               .values_list('created_by_id', flat=True))
+                solved = set(problem.solved_by.filter(pk__in=user_ids).values_list('pk', flat=True))
+                if accepted - solved:
+                    problem.solved_by.add(*(accepted - solved))
+                if solved - accepted:
+                    problem.solved_by.remove(*(solved - accepted))
+                gained += len(accepted - solved)
+                lost += len(solved - accepted)
+        return changed, gained, lost
@@ -0,0 +1,34 @@
+# problems/management/commands/rollup_events.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from problems import events
+from problems.models import ProblemStats
+
+
+class Command(BaseCommand):
+    help = ("Fold new submission events into the per-problem ProblemStats rollups shown on the problem pages "
+            "(acceptance rate, attempts per solve, runtime distribution). Run one at a time, e.g. from cron "
+            "or with --every.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, help="Keep rolling up, every this many seconds")
+        parser.add_argument('--rebuild', action='store_true', help="Drop the rollups and recompute them from all events")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            deleted, _ = ProblemStats.objects.all().delete()
+            self.stdout.write(f"Dropped {deleted} rollups")
+        while True:
+            started = time.monotonic()
+            folded = 0
+            while True:
+                batch = events.rollup()
+                folded += batch
+                if batch < events.ROLLUP_BATCH:
+                    break
+            self.stdout.write(f"Folded {folded} events in {(time.monotonic() - started) * 1000:.0f} ms")
+            if not options['every']:
+                break
+            time.sleep(options['every'])
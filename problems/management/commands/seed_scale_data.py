@@ -0,0 +1,117 @@
+# problems/management/commands/seed_scale_data.py
+import random
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from problems.models import CodeBlob, FavoriteProblem, Problem, ProblemRating, Solution, Tag, TestCase
+
+USERNAME_PREFIX = 'scale_user_'
+TITLE_PREFIX = 'Scale problem '
+BATCH_SIZE = 2000
+
+SAMPLE_CODE = "def solution(a: int, b: int) -> int:\n    return a + b\n"
+
+
+class Command(BaseCommand):
+    help = ("Generate a synthetic 'scale dataset' (users, problems, solutions, ratings...) for benchmarks "
+            "and query plans. Run it against a scratch copy of the database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--problems', type=int, default=5000)
+        parser.add_argument('--solutions', type=int, default=50000)
+        parser.add_argument('--ratings', type=int, default=50000)
+        parser.add_argument('--favorites', type=int, default=20000)
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        with transaction.atomic():
+            start = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+            User.objects.bulk_create(
+                [User(username=f'{USERNAME_PREFIX}{start + i}') for i in range(options['users'])],
+                batch_size=BATCH_SIZE,
+            )
+            user_ids = list(User.objects.filter(username__startswith=USERNAME_PREFIX).values_list('pk', flat=True))
+
+            Tag.objects.bulk_create(
+                [Tag(name=f'scale-tag-{i}') for i in range(options['tags'])],
+                ignore_conflicts=True,
+            )
+            tag_ids = list(Tag.objects.filter(name__startswith='scale-tag-').values_list('pk', flat=True))
+
+            difficulties = [choice for choice, _ in Problem.DIFFICULTY_CHOICES]
+            first_problem = Problem.objects.filter(title__startswith=TITLE_PREFIX).count()
+            Problem.objects.bulk_create([
+                Problem(
+                    title=f'{TITLE_PREFIX}{first_problem + i}',
+                    description='Add two numbers.',
+                    difficulty=rng.choice(difficulties),
+                    created_by_id=rng.choice(user_ids),
+                    solution_code=SAMPLE_CODE,
+                    function_header="def solution(a: int, b: int) -> int:\n",
+                    input_vars=[{'name': 'a', 'type': 'int'}, {'name': 'b', 'type': 'int'}],
+                    return_type='int',
+                ) for i in range(options['problems'])
+            ], batch_size=BATCH_SIZE)
+            problem_ids = list(Problem.objects.filter(title__startswith=TITLE_PREFIX).values_list('pk', flat=True))
+            self.stdout.write(f"{len(user_ids)} users, {len(problem_ids)} problems")
+
+            Problem.tags.through.objects.bulk_create([
+                Problem.tags.through(problem_id=pid, tag_id=tid)
+                for pid in problem_ids for tid in rng.sample(tag_ids, min(3, len(tag_ids)))
+            ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+            TestCase.objects.bulk_create([
+                TestCase(problem_id=pid, input_value='{"a": 1, "b": 2}', expected_output='3')
+                for pid in problem_ids
+            ], batch_size=BATCH_SIZE)
+
+            # bulk_create skips Solution.save(), which would store the code
+            sample_blob = CodeBlob.objects.intern(SAMPLE_CODE)
+            solutions = []
+            solved = set()
+            for _ in range(options['solutions']):
+                pid, uid = rng.choice(problem_ids), rng.choice(user_ids)
+                solutions.append(Solution(problem_id=pid, created_by_id=uid, code_blob=sample_blob))
+                solved.add((pid, uid))
+            Solution.objects.bulk_create(solutions, batch_size=BATCH_SIZE)
+            Problem.solved_by.through.objects.bulk_create(
+                [Problem.solved_by.through(problem_id=pid, user_id=uid) for pid, uid in solved],
+                batch_size=BATCH_SIZE, ignore_conflicts=True,
+            )
+            Problem.attempted_by.through.objects.bulk_create(
+                [Problem.attempted_by.through(problem_id=pid, user_id=uid) for pid, uid in solved],
+                batch_size=BATCH_SIZE, ignore_conflicts=True,
+            )
+
+            ProblemRating.objects.bulk_create([
+                ProblemRating(problem_id=rng.choice(problem_ids), user_id=rng.choice(user_ids), vote=rng.choice([1, 1, -1]))
+                for _ in range(options['ratings'])
+            ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+            FavoriteProblem.objects.bulk_create([
+                FavoriteProblem(problem_id=rng.choice(problem_ids), user_id=rng.choice(user_ids))
+                for _ in range(options['favorites'])
+            ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+            # bulk_create bypasses the counter bookkeeping, so recount in SQL
+            def counted(model, **filters):
+                return Coalesce(Subquery(
+                    model.objects.filter(problem=OuterRef('pk'), **filters)
+                    .values('problem').annotate(n=Count('pk')).values('n')
+                ), 0)
+            Problem.objects.filter(pk__in=problem_ids).update(
+                like_count=counted(ProblemRating, vote=1),
+                dislike_count=counted(ProblemRating, vote=-1),
+                favorite_count=counted(FavoriteProblem),
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Scale dataset ready: {Solution.objects.count()} solutions, "
+            f"{ProblemRating.objects.count()} ratings, {FavoriteProblem.objects.count()} favorites"
+        ))
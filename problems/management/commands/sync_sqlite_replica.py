@@ -0,0 +1,44 @@
+# problems/management/commands/sync_sqlite_replica.py
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from problems.routers import REPLICA_ALIAS
+
+
+class Command(BaseCommand):
+    help = ("Copy the primary SQLite database over the 'replica' alias (SQLITE_REPLICA_PATH) with SQLite's "
+            "online backup, a stand-in for real replication in development and tests. Readers of the replica "
+            "see the old copy until the backup finishes; writers on the primary are not blocked.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, help="Keep copying, every this many seconds")
+
+    def handle(self, *args, **options):
+        databases = settings.DATABASES
+        if REPLICA_ALIAS not in databases:
+            raise CommandError("No 'replica' database configured (set SQLITE_REPLICA_PATH)")
+        for alias in ('default', REPLICA_ALIAS):
+            if databases[alias]['ENGINE'] != 'django.db.backends.sqlite3':
+                raise CommandError(f"The {alias!r} database isn't SQLite; use the server's own replication")
+
+        while True:
+            started = time.monotonic()
+            self.copy(str(databases['default']['NAME']), str(databases[REPLICA_ALIAS]['NAME']))
+            self.stdout.write(f"Replica synced in {(time.monotonic() - started) * 1000:.0f} ms")
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+
+    def copy(self, source_path, target_path):
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target)
+            # In WAL mode the replica's readers don't block the next copy
+            target.execute('PRAGMA journal_mode=WAL')
+        finally:
+            target.close()
+            source.close()
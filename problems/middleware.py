@@ -0,0 +1,279 @@
+# problems/middleware.py
+import json
+import logging
+import mimetypes
+import os
+import random
+import re
+from logging.handlers import RotatingFileHandler
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.middleware.gzip import GZipMiddleware
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from . import profiling, routers
+from .storage import ENCODINGS
+
+# Hashed names never change content, so they can be cached for good; plain
+# names (logo4.png) may be replaced by the next collectstatic
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+MUTABLE_CACHE_CONTROL = 'public, max-age=60'
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+_ACCEPT_ENCODING = re.compile(r'\s*([\w*]+)\s*(?:;\s*q\s*=\s*([\d.]+))?')
+SLOW_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_LOG_BACKUPS = 5
+
+
+def accepted_encodings(header):
+    """The content codings an Accept-Encoding header allows (q > 0)."""
+    accepted = set()
+    for part in header.split(','):
+        match = _ACCEPT_ENCODING.match(part)
+        if match and float(match.group(2) or 1) > 0:
+            accepted.add(match.group(1).lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """Serve collectstatic's output from STATIC_ROOT, precompressed variants included.
+
+    Requests for STATIC_URL never reach the views: the best .br/.gz sibling
+    the client accepts (see storage.py) is sent with Vary: Accept-Encoding,
+    and hashed names get a far-future immutable Cache-Control. Place it right
+    after SecurityMiddleware. It stays out of the way with DEBUG on.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        if settings.DEBUG or not settings.STATIC_ROOT or '://' in settings.STATIC_URL:
+            # During development runserver serves the apps' own (current)
+            # files, not stale collected copies; or nothing was collected,
+            # or the files live on another host
+            raise MiddlewareNotUsed
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        self.root = str(settings.STATIC_ROOT)
+        self.files = {}
+        self.hashed = None
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.static_response(request)
+        if response is not None:
+            return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        response = self.static_response(request)
+        if response is not None:
+            return response
+        return await self.get_response(request)
+
+    def static_response(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            return self.serve(request, request.path_info[len(self.prefix):])
+        return None
+
+    def hashed_names(self):
+        if self.hashed is None:
+            try:
+                with open(os.path.join(self.root, 'staticfiles.json')) as f:
+                    self.hashed = set(json.load(f).get('paths', {}).values())
+            except (OSError, ValueError):
+                self.hashed = set()
+        return self.hashed
+
+    def find(self, name):
+        """(path, size, mtime, {encoding: (path, size)}) for a collected file, or None."""
+        if name in self.files:
+            return self.files[name]
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        variants = {}
+        for encoding, suffix in ENCODINGS.items():
+            if os.path.isfile(path + suffix):
+                variants[encoding] = (path + suffix, os.path.getsize(path + suffix))
+        found = (path, stat.st_size, stat.st_mtime, variants)
+        # Only hashed files are remembered: their content can't change, while a
+        # plain name can be overwritten by the next collectstatic (and bad URLs
+        # would grow the dict without bound)
+        if name in self.hashed_names():
+            self.files[name] = found
+        return found
+
+    def serve(self, request, name):
+        found = self.find(name)
+        if found is None:
+            return None
+        path, size, mtime, variants = found
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), mtime):
+            response = HttpResponseNotModified()
+        else:
+            accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+            encoding = next((encoding for encoding in ENCODINGS if encoding in accepted and encoding in variants), None)
+            if encoding:
+                path, size = variants[encoding]
+            content_type, _ = mimetypes.guess_type(name)
+            if request.method == 'HEAD':
+                response = HttpResponse(content_type=content_type or 'application/octet-stream')
+            else:
+                response = FileResponse(open(path, 'rb'), content_type=content_type or 'application/octet-stream')
+            response['Content-Length'] = str(size)
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['Last-Modified'] = http_date(mtime)
+        if variants:
+            response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if name in self.hashed_names() else MUTABLE_CACHE_CONTROL
+        return response
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZipMiddleware for page-sized responses only.
+
+    Responses under settings.COMPRESS_MIN_SIZE bytes aren't worth the CPU, and
+    streaming ones (the judge's Server-Sent Events, file downloads) are left
+    alone so events still reach the browser as they happen. The random gzip
+    header padding of GZipMiddleware (against BREACH) is kept.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+        if len(response.content) < getattr(settings, 'COMPRESS_MIN_SIZE', 1024):
+            return response
+        return super().process_response(request, response)
+
+
+class ProfilingMiddleware:
+    """Measure a sample of requests: wall, SQL, template and judge time.
+
+    A sampled request (settings.PROFILE_SAMPLE_RATE of them) gets a
+    Server-Timing header, and when it took PROFILE_SLOW_MS or more its trace
+    (timings, slowest and duplicate queries) goes to the rotating
+    PROFILE_LOG. Requests matching PROFILE_CAPTURE_PATHS, or sending the
+    PROFILE_CAPTURE_HEADER with the PROFILE_CAPTURE_TOKEN value, are always
+    sampled and also run under cProfile; their trace is logged whatever the
+    time. Unsampled requests pay for one random() call; with sampling off and
+    no capture configured the middleware removes itself.
+
+    For streaming responses only the time until the response starts is measured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.sample_rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+        self.slow_seconds = getattr(settings, 'PROFILE_SLOW_MS', 500) / 1000
+        self.capture_header = 'HTTP_' + getattr(settings, 'PROFILE_CAPTURE_HEADER', 'X-Profile').upper().replace('-', '_')
+        self.capture_token = getattr(settings, 'PROFILE_CAPTURE_TOKEN', '')
+        self.capture_paths = [re.compile(pattern) for pattern in getattr(settings, 'PROFILE_CAPTURE_PATHS', [])]
+        if self.sample_rate <= 0 and not self.capture_token and not self.capture_paths:
+            raise MiddlewareNotUsed
+        self.log = logging.getLogger('problems.slow_requests')
+        log_file = getattr(settings, 'PROFILE_LOG', None)
+        if log_file and not self.log.handlers:
+            os.makedirs(os.path.dirname(log_file), exist_ok=True)
+            handler = RotatingFileHandler(log_file, maxBytes=SLOW_LOG_MAX_BYTES, backupCount=SLOW_LOG_BACKUPS)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self.log.addHandler(handler)
+            self.log.setLevel(logging.INFO)
+            self.log.propagate = False
+        profiling.hook_templates()
+        profiling.hook_connections()
+
+    def wants_capture(self, request):
+        if self.capture_token and request.META.get(self.capture_header) == self.capture_token:
+            return True
+        return any(pattern.search(request.path_info) for pattern in self.capture_paths)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        capture = self.wants_capture(request)
+        if not capture and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile, token = profiling.start(capture)
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.finish()
+            profiling.stop(token)
+        return self.report(request, response, profile, capture)
+
+    async def __acall__(self, request):
+        capture = self.wants_capture(request)
+        if not capture and random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        profile, token = profiling.start(capture)
+        try:
+            response = await self.get_response(request)
+        finally:
+            profile.finish()
+            profiling.stop(token)
+        return self.report(request, response, profile, capture)
+
+    def report(self, request, response, profile, capture):
+        response['Server-Timing'] = profile.server_timing()
+        if capture or profile.wall >= self.slow_seconds:
+            self.log.info(profile.trace(request, response))
+        return response
+
+
+class ReplicaPinMiddleware:
+    """Keep a client on the primary database for a moment after it writes.
+
+    Any non-GET/HEAD request sets a short-lived cookie (REPLICA_PIN_SECONDS);
+    while it is present, routers.use_replica views read from 'default', so a
+    vote or submission shows up on the next page even if the replica lags.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not routers.replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.pin(request, await self.get_response(request))
+
+    def pin(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            response.set_cookie(routers.PIN_COOKIE, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.15 on 2026-10-19 08:43
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_counters(apps, schema_editor):
+    Problem = apps.get_model('problems', 'Problem')
+    counts = Problem.objects.annotate(
+        likes=Count('ratings', filter=Q(ratings__vote=1), distinct=True),
+        dislikes=Count('ratings', filter=Q(ratings__vote=-1), distinct=True),
+        favorites=Count('favorited_by', distinct=True),
+    ).values_list('pk', 'likes', 'dislikes', 'favorites')
+    for pk, likes, dislikes, favorites in counts:
+        Problem.objects.filter(pk=pk).update(like_count=likes, dislike_count=dislikes, favorite_count=favorites)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0004_content_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='dislike_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='problem',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='problem',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.15 on 2026-10-19 08:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0005_interaction_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favoriteproblem',
+            index=models.Index(fields=['user', 'problem'], name='favorite_user_problem_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='problem',
+            index=models.Index(fields=['created_at'], name='problem_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='problem',
+            index=models.Index(fields=['difficulty', 'created_at'], name='problem_difficulty_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='problemrating',
+            index=models.Index(fields=['problem', 'vote'], name='rating_problem_vote_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='problemrating',
+            index=models.Index(fields=['user', 'vote', 'problem'], name='rating_user_vote_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solution',
+            index=models.Index(fields=['problem', 'created_by', '-created_at'], name='solution_problem_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solution',
+            index=models.Index(fields=['problem', '-created_at', '-id'], name='solution_problem_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solution',
+            index=models.Index(fields=['created_by', '-created_at'], name='solution_user_recent_idx'),
+        ),
+    ]
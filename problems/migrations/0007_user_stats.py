@@ -0,0 +1,32 @@
+# Generated by Django 5.1.15 on 2026-10-19 08:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('problems', '0006_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('solved_easy', models.PositiveIntegerField(default=0)),
+                ('solved_medium', models.PositiveIntegerField(default=0)),
+                ('solved_hard', models.PositiveIntegerField(default=0)),
+                ('attempted', models.PositiveIntegerField(default=0)),
+                ('submissions', models.PositiveIntegerField(default=0)),
+                ('accepted_submissions', models.PositiveIntegerField(default=0)),
+                ('current_streak', models.PositiveIntegerField(default=0)),
+                ('longest_streak', models.PositiveIntegerField(default=0)),
+                ('last_solved_on', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
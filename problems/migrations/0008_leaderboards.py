@@ -0,0 +1,43 @@
+# Generated by Django 5.1.15 on 2026-10-19 08:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0007_user_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=64)),
+                ('score', models.PositiveIntegerField()),
+                ('users', models.PositiveIntegerField(default=0)),
+                ('rank', models.PositiveIntegerField(default=1)),
+            ],
+            options={
+                'unique_together': {('board', 'score')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=64)),
+                ('score', models.PositiveIntegerField(default=0)),
+                ('reached_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['board', '-score', 'reached_at', 'user'], name='leaderboard_top_idx')],
+                'unique_together': {('board', 'user')},
+            },
+        ),
+    ]
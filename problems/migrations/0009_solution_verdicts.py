@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-19 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0008_leaderboards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solution',
+            name='judged_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='solution',
+            name='verdict',
+            field=models.CharField(choices=[('accepted', 'Accepted'), ('wrong_answer', 'Wrong Answer'), ('error', 'Error')], default='accepted', max_length=20),
+        ),
+    ]
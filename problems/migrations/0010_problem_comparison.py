@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-19 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0009_solution_verdicts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='comparison',
+            field=models.CharField(choices=[('auto', 'Automatic (floats within tolerance, everything else exact)'), ('exact', 'Exact'), ('float', 'Numbers within tolerance'), ('unordered', 'Unordered list (ignores order and duplicates)'), ('multiset', 'Multiset (ignores order, counts duplicates)')], default='auto', max_length=10),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-19 09:02
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0010_problem_comparison'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='memory_limit_mb',
+            field=models.PositiveIntegerField(default=128, help_text='Memory limit, in megabytes', validators=[django.core.validators.MinValueValidator(16), django.core.validators.MaxValueValidator(1024)]),
+        ),
+        migrations.AddField(
+            model_name='problem',
+            name='time_limit_ms',
+            field=models.PositiveIntegerField(default=2000, help_text='Time limit per test case, in milliseconds', validators=[django.core.validators.MinValueValidator(100), django.core.validators.MaxValueValidator(10000)]),
+        ),
+        migrations.AlterField(
+            model_name='solution',
+            name='verdict',
+            field=models.CharField(choices=[('accepted', 'Accepted'), ('wrong_answer', 'Wrong Answer'), ('time_limit', 'Time Limit Exceeded'), ('memory_limit', 'Memory Limit Exceeded'), ('runtime_error', 'Runtime Error'), ('error', 'Error')], default='accepted', max_length=20),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.15 on 2026-10-19 09:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0011_judge_limits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityRefresh',
+            fields=[
+                ('problem', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='problems.problem')),
+                ('queued_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SimilarProblem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('tag_jaccard', models.FloatField(default=0)),
+                ('co_solves', models.PositiveIntegerField(default=0)),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_problems', to='problems.problem')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='problems.problem')),
+            ],
+            options={
+                'unique_together': {('problem', 'rank')},
+            },
+        ),
+    ]
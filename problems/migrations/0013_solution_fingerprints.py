@@ -0,0 +1,42 @@
+# Generated by Django 5.1.15 on 2026-10-19 09:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0012_similar_problems'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolutionFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.BigIntegerField()),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='problems.problem')),
+                ('solution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fingerprints', to='problems.solution')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['problem', 'hash'], name='fingerprint_lookup_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SolutionMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similarity', models.FloatField()),
+                ('shared', models.PositiveIntegerField()),
+                ('detected_at', models.DateTimeField(auto_now=True)),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='problems.solution')),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='solution_matches', to='problems.problem')),
+                ('solution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='problems.solution')),
+            ],
+            options={
+                'verbose_name_plural': 'solution matches',
+                'unique_together': {('solution', 'other')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-19 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0013_solution_fingerprints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_hash',
+            field=models.CharField(blank=True, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_source',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.15 on 2026-10-19 09:40
+
+from django.db import migrations
+
+# Case-insensitive prefix searches on the title (admin '^title' search
+# fields, i.e. istartswith) need an index in the form each database matches
+# against the LIKE: SQLite compares with the NOCASE collation, PostgreSQL
+# against UPPER(title) with pattern operators.
+INDEXES = {
+    'sqlite': 'CREATE INDEX IF NOT EXISTS problem_title_search_idx ON problems_problem (title COLLATE NOCASE)',
+    'postgresql': 'CREATE INDEX IF NOT EXISTS problem_title_search_idx '
+                  'ON problems_problem (UPPER(title::text) text_pattern_ops)',
+}
+
+
+def create_index(apps, schema_editor):
+    sql = INDEXES.get(schema_editor.connection.vendor)
+    if sql:
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in INDEXES:
+        schema_editor.execute('DROP INDEX IF EXISTS problem_title_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0014_profile_avatars'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.15 on 2026-10-19 09:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0015_title_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProblemStats',
+            fields=[
+                ('problem', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='problems.problem')),
+                ('runs', models.PositiveIntegerField(default=0)),
+                ('submissions', models.PositiveIntegerField(default=0)),
+                ('accepted', models.PositiveIntegerField(default=0)),
+                ('attempted_users', models.PositiveIntegerField(default=0)),
+                ('solved_users', models.PositiveIntegerField(default=0)),
+                ('runtime_histogram', models.JSONField(blank=True, default=list)),
+                ('runtime_p50_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('runtime_p90_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('last_event_id', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SubmissionEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Run'), (2, 'Submit')])),
+                ('verdict', models.CharField(choices=[('accepted', 'Accepted'), ('wrong_answer', 'Wrong Answer'), ('time_limit', 'Time Limit Exceeded'), ('memory_limit', 'Memory Limit Exceeded'), ('runtime_error', 'Runtime Error'), ('error', 'Error')], max_length=20)),
+                ('runtime_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('problem', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='problems.problem')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['problem', 'user', 'kind'], name='event_problem_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-19 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0016_submission_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('data', models.BinaryField()),
+                ('compressed', models.BooleanField(default=False)),
+                ('size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='solution',
+            name='code_blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='problems.codeblob'),
+        ),
+    ]
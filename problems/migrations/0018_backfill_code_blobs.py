@@ -0,0 +1,54 @@
+# Generated by Django 5.1.15 on 2026-10-19 10:05
+
+from django.db import migrations
+
+from problems import blobs
+
+CHUNK_SIZE = 500
+
+
+def store_code(apps, schema_editor):
+    """Move every solution's code into the blob store, CHUNK_SIZE solutions per round trip."""
+    Solution = apps.get_model('problems', 'Solution')
+    CodeBlob = apps.get_model('problems', 'CodeBlob')
+    last_id = 0
+    while True:
+        chunk = list(Solution.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'code')[:CHUNK_SIZE])
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        keys = {pk: blobs.digest(code) for pk, code in chunk}
+        new_blobs = {}
+        for pk, code in chunk:
+            if keys[pk] not in new_blobs:
+                data, compressed, size = blobs.encode(code)
+                new_blobs[keys[pk]] = CodeBlob(digest=keys[pk], data=data, compressed=compressed, size=size)
+        # Blobs an earlier chunk already stored are left alone
+        CodeBlob.objects.bulk_create(new_blobs.values(), ignore_conflicts=True)
+        Solution.objects.bulk_update([Solution(pk=pk, code_blob_id=keys[pk]) for pk, _ in chunk], ['code_blob'])
+
+
+def restore_code(apps, schema_editor):
+    Solution = apps.get_model('problems', 'Solution')
+    last_id = 0
+    while True:
+        chunk = list(Solution.objects.filter(pk__gt=last_id).order_by('pk')
+                     .values_list('pk', 'code_blob__data', 'code_blob__compressed')[:CHUNK_SIZE])
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        Solution.objects.bulk_update([
+            Solution(pk=pk, code=blobs.decode(data, compressed) if data is not None else '')
+            for pk, data, compressed in chunk
+        ], ['code'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0017_code_blobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(store_code, restore_code),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.15 on 2026-10-19 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0018_backfill_code_blobs'),
+    ]
+
+    operations = [
+        # Lets the column come back with the table full when this is reversed;
+        # 0018 then fills it in again
+        migrations.AlterField(
+            model_name='solution',
+            name='code',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='solution',
+            name='code',
+        ),
+        migrations.AlterField(
+            model_name='solution',
+            name='code_blob',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='problems.codeblob'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-19 09:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0019_remove_solution_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='codeblob',
+            name='last_used_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,5 +1,10 @@
-from django.db import models
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from . import blobs
 
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -13,28 +18,66 @@ class Problem(models.Model):
         ('medium', 'Medium'),
         ('hard', 'Hard'),
     )
+    COMPARISON_CHOICES = (
+        ('auto', 'Automatic (floats within tolerance, everything else exact)'),
+        ('exact', 'Exact'),
+        ('float', 'Numbers within tolerance'),
+        ('unordered', 'Unordered list (ignores order and duplicates)'),
+        ('multiset', 'Multiset (ignores order, counts duplicates)'),
+    )
     title = models.CharField(max_length=200)
     description = models.TextField()
     difficulty = models.CharField(max_length=6, choices=DIFFICULTY_CHOICES, default='easy')
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='problems')
     tags = models.ManyToManyField(Tag, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever anything rendered on the detail page changes (see versioning.py)
+    updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=1)
     solution_code = models.TextField()
     function_header = models.TextField(blank=True, null=True)
     input_vars = models.JSONField(default=list, blank=True)
     return_type = models.CharField(max_length=50, default='None')
+    # How judge.comparator_for compares results with the expected outputs
+    comparison = models.CharField(max_length=10, choices=COMPARISON_CHOICES, default='auto')
+    # Per test case. The time limit counts the solution's own run time, not
+    # interpreter startup (judge.build_wrapper_code, judge_harness.py); the
+    # memory limit caps the container
+    time_limit_ms = models.PositiveIntegerField(
+        default=2000, validators=[MinValueValidator(100), MaxValueValidator(10000)],
+        help_text="Time limit per test case, in milliseconds",
+    )
+    memory_limit_mb = models.PositiveIntegerField(
+        default=128, validators=[MinValueValidator(16), MaxValueValidator(1024)],
+        help_text="Memory limit, in megabytes",
+    )
     # New fields to track unique users
     attempted_by = models.ManyToManyField(User, related_name='attempted_problems', blank=True)
     solved_by = models.ManyToManyField(User, related_name='solved_problems', blank=True)
+    # Denormalized counters maintained by interactions.py
+    like_count = models.PositiveIntegerField(default=0)
+    dislike_count = models.PositiveIntegerField(default=0)
+    favorite_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='problem_created_idx'),
+            models.Index(fields=['difficulty', 'created_at'], name='problem_difficulty_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
     def get_likes_count(self):
-        return self.ratings.filter(vote=1).count()
+        return self.like_count
 
     def get_dislikes_count(self):
-        return self.ratings.filter(vote=-1).count()
+        return self.dislike_count
+
+    @property
+    def judge_limits(self):
+        """Keyword arguments for judge.run_code_async / iter_code_async."""
+        return {'time_limit': self.time_limit_ms / 1000, 'mem_limit': self.memory_limit_mb * 1024 * 1024}
 
     @property
     def attempt_count(self):
@@ -52,15 +95,98 @@ class TestCase(models.Model):
     def __str__(self):
         return f"TestCase for {self.problem.title}"
 
+class CodeBlobManager(models.Manager):
+    def intern(self, code):
+        """The blob holding ``code``, stored now if no solution had this code before."""
+        key = blobs.digest(code)
+        # Marking the blob used keeps `code_storage --prune` off it until the
+        # solution pointing at it is saved
+        if self.filter(digest=key).update(last_used_at=timezone.now()):
+            blob = self.get(digest=key)
+        else:
+            data, compressed, size = blobs.encode(code)
+            try:
+                with transaction.atomic():
+                    blob = self.create(digest=key, data=data, compressed=compressed, size=size)
+            except IntegrityError:
+                # Someone stored the same code in the meantime
+                blob = self.get(digest=key)
+        return blob
+
+class CodeBlob(models.Model):
+    """Solution code, stored once per distinct content (see blobs.py)."""
+    digest = models.CharField(max_length=64, primary_key=True)
+    data = models.BinaryField()
+    compressed = models.BooleanField(default=False)
+    # Bytes of the UTF-8 code before compression
+    size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Last handed out by intern()
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    objects = CodeBlobManager()
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.size} bytes)"
+
+    @cached_property
+    def text(self):
+        return blobs.decode(self.data, self.compressed)
+
 class Solution(models.Model):
+    VERDICT_CHOICES = (
+        ('accepted', 'Accepted'),
+        ('wrong_answer', 'Wrong Answer'),
+        ('time_limit', 'Time Limit Exceeded'),
+        ('memory_limit', 'Memory Limit Exceeded'),
+        ('runtime_error', 'Runtime Error'),
+        ('error', 'Error'),
+    )
     problem = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name='solutions')
-    code = models.TextField()
+    # Read and written through ``code``; blobs nothing points at are removed by `manage.py code_storage --prune`
+    code_blob = models.ForeignKey(CodeBlob, on_delete=models.PROTECT, related_name='+')
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='solutions')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Only accepted code is stored; a rejudge (manage.py rejudge) can change that
+    verdict = models.CharField(max_length=20, choices=VERDICT_CHOICES, default='accepted')
+    judged_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # "Your solutions": filter by (problem, created_by), newest first
+            models.Index(fields=['problem', 'created_by', '-created_at'], name='solution_problem_user_idx'),
+            # Community solutions keyset pagination on (created_at, id)
+            models.Index(fields=['problem', '-created_at', '-id'], name='solution_problem_recent_idx'),
+            # Profile page
+            models.Index(fields=['created_by', '-created_at'], name='solution_user_recent_idx'),
+        ]
 
     def __str__(self):
         return f"Solution by {self.created_by.username} for {self.problem.title}"
 
+    @property
+    def code(self):
+        """The source code; select_related('code_blob') saves a query per solution."""
+        pending = getattr(self, '_pending_code', None)
+        if pending is not None:
+            return pending
+        return self.code_blob.text if self.code_blob_id else ''
+
+    @code.setter
+    def code(self, value):
+        # Stored on save(), so setting it never touches the database
+        self._pending_code = value
+
+    def save(self, *args, **kwargs):
+        pending = getattr(self, '_pending_code', None)
+        if pending is not None:
+            self.code_blob = CodeBlob.objects.intern(pending)
+            self._pending_code = None
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'code' in update_fields:
+                kwargs['update_fields'] = [field for field in update_fields if field != 'code'] + ['code_blob']
+        super().save(*args, **kwargs)
+
 class ProblemRating(models.Model):
     VOTE_CHOICES = (
         (1, 'Like'),
@@ -70,9 +196,15 @@ class ProblemRating(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='problem_ratings')
     vote = models.SmallIntegerField(choices=VOTE_CHOICES)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('problem', 'user')
+        indexes = [
+            models.Index(fields=['problem', 'vote'], name='rating_problem_vote_idx'),
+            # Covers the liked/disliked filters on the problem list
+            models.Index(fields=['user', 'vote', 'problem'], name='rating_user_vote_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} {'liked' if self.vote == 1 else 'disliked'} {self.problem.title}"
@@ -84,6 +216,10 @@ class FavoriteProblem(models.Model):
 
     class Meta:
         unique_together = ('problem', 'user')
+        indexes = [
+            # Covers the favorited filter on the problem list
+            models.Index(fields=['user', 'problem'], name='favorite_user_problem_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} favorited {self.problem.title}"
@@ -91,6 +227,209 @@ class FavoriteProblem(models.Model):
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    # Resized variants of the picture (see avatars.py): the content hash they
+    # are named after, and which upload they were made from
+    avatar_hash = models.CharField(max_length=16, blank=True)
+    avatar_source = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return f"{self.user.username}'s Profile"
+
+    @property
+    def avatar_pending(self):
+        return bool(self.profile_picture) and self.avatar_source != self.profile_picture.name
+
+class ContentVersion(models.Model):
+    """Monotonic counter used to build HTTP validators.
+
+    ``key`` is either ``'catalogue'`` (anything shown on the problem list) or
+    ``'user:<id>'`` (anything that depends on one user's interactions).
+    """
+    key = models.CharField(max_length=64, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+class UserStats(models.Model):
+    """Per-user aggregates kept up to date incrementally (see stats.py).
+
+    ``manage.py rebuild_user_stats`` recomputes them from history.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    solved_easy = models.PositiveIntegerField(default=0)
+    solved_medium = models.PositiveIntegerField(default=0)
+    solved_hard = models.PositiveIntegerField(default=0)
+    attempted = models.PositiveIntegerField(default=0)
+    submissions = models.PositiveIntegerField(default=0)
+    accepted_submissions = models.PositiveIntegerField(default=0)
+    current_streak = models.PositiveIntegerField(default=0)
+    longest_streak = models.PositiveIntegerField(default=0)
+    last_solved_on = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"{self.user.username}'s Profile"
\ No newline at end of file
+        return f"Stats for {self.user.username}"
+
+    @property
+    def solved_total(self):
+        return self.solved_easy + self.solved_medium + self.solved_hard
+
+    @property
+    def acceptance_rate(self):
+        if not self.submissions:
+            return 0
+        return round(100 * self.accepted_submissions / self.submissions, 1)
+
+class LeaderboardEntry(models.Model):
+    """A user's score on one leaderboard (see leaderboards.py for the board keys)."""
+    board = models.CharField(max_length=64)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    score = models.PositiveIntegerField(default=0)
+    # When the score last went up; earlier wins a tie in the listing
+    reached_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('board', 'user')
+        indexes = [
+            models.Index(fields=['board', '-score', 'reached_at', 'user'], name='leaderboard_top_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.score} on {self.board}"
+
+class LeaderboardBucket(models.Model):
+    """How many users sit at one score on a board, and the rank that score has.
+
+    ``rank`` is 1 + the number of users with a higher score. A user moving from
+    score s to s + 1 only changes the rank of bucket s, so a solve touches a
+    constant number of rows however many users the board has.
+    """
+    board = models.CharField(max_length=64)
+    score = models.PositiveIntegerField()
+    users = models.PositiveIntegerField(default=0)
+    rank = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('board', 'score')
+
+    def __str__(self):
+        return f"{self.board} score {self.score}: rank {self.rank} ({self.users} users)"
+
+class SimilarProblem(models.Model):
+    """One of a problem's top-K neighbours in the precomputed similarity index (see similarity.py)."""
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name='similar_problems')
+    similar = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    tag_jaccard = models.FloatField(default=0)
+    co_solves = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Serving is a range scan over this index
+        unique_together = ('problem', 'rank')
+
+    def __str__(self):
+        return f"{self.problem_id} -> {self.similar_id} ({self.score:.3f})"
+
+class SimilarityRefresh(models.Model):
+    """A problem whose tags or solvers changed since the similarity index was last refreshed."""
+    problem = models.OneToOneField(Problem, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Refresh similar problems of {self.problem_id}"
+
+class SolutionFingerprint(models.Model):
+    """One winnowed fingerprint of a solution (see fingerprints.py).
+
+    The (problem, hash) index is the per-problem inverted index: a lookup
+    touches the solutions sharing fingerprints, not every solution of the problem.
+    """
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name='+')
+    solution = models.ForeignKey(Solution, on_delete=models.CASCADE, related_name='fingerprints')
+    hash = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['problem', 'hash'], name='fingerprint_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.hash:x} in solution {self.solution_id}"
+
+class SolutionMatch(models.Model):
+    """Two solutions by different users whose fingerprints mostly overlap; ``solution`` has the lower id."""
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name='solution_matches')
+    solution = models.ForeignKey(Solution, on_delete=models.CASCADE, related_name='matches')
+    other = models.ForeignKey(Solution, on_delete=models.CASCADE, related_name='+')
+    # Shared fingerprints over the smaller solution's fingerprints
+    similarity = models.FloatField()
+    shared = models.PositiveIntegerField()
+    detected_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('solution', 'other')
+        verbose_name_plural = 'solution matches'
+
+    def __str__(self):
+        return f"Solutions {self.solution_id} and {self.other_id}: {self.similarity:.0%}"
+
+class SubmissionEvent(models.Model):
+    """One press of Run or Submit, as judged; append-only (see events.py)."""
+    RUN = 1
+    SUBMIT = 2
+    KIND_CHOICES = (
+        (RUN, 'Run'),
+        (SUBMIT, 'Submit'),
+    )
+    # The (problem, user, kind) index below serves lookups by problem
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name='+', db_index=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    verdict = models.CharField(max_length=20, choices=Solution.VERDICT_CHOICES)
+    # Slowest test case; empty when the judge produced no timings
+    runtime_ms = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # "Has this user submitted (or solved) this problem before?" during rollups
+            models.Index(fields=['problem', 'user', 'kind'], name='event_problem_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} by {self.user_id} on {self.problem_id}: {self.verdict}"
+
+class ProblemStats(models.Model):
+    """Per-problem rollup of the submission events, brought up to date by ``manage.py rollup_events``."""
+    problem = models.OneToOneField(Problem, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    runs = models.PositiveIntegerField(default=0)
+    submissions = models.PositiveIntegerField(default=0)
+    accepted = models.PositiveIntegerField(default=0)
+    # Distinct users who submitted, and who got accepted
+    attempted_users = models.PositiveIntegerField(default=0)
+    solved_users = models.PositiveIntegerField(default=0)
+    # Accepted submissions per bucket of events.RUNTIME_BUCKETS_MS
+    runtime_histogram = models.JSONField(default=list, blank=True)
+    runtime_p50_ms = models.PositiveIntegerField(null=True, blank=True)
+    runtime_p90_ms = models.PositiveIntegerField(null=True, blank=True)
+    # The newest event folded in by the run that last touched this row
+    last_event_id = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats for problem {self.problem_id}"
+
+    @property
+    def acceptance_rate(self):
+        if not self.submissions:
+            return 0
+        return round(100 * self.accepted / self.submissions, 1)
+
+    @property
+    def attempts_per_solve(self):
+        if not self.solved_users:
+            return None
+        return round(self.submissions / self.solved_users, 1)
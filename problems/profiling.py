@@ -0,0 +1,180 @@
+# problems/profiling.py
+#
+# Per-request measurements for ProfilingMiddleware (middleware.py). A sampled
+# request gets a RequestProfile in a context variable; the SQL execute
+# wrapper, the template render hook and the judge (judge.iter_code_async)
+# add to it while the request runs. Requests that aren't sampled never have
+# one, so all of this reduces to a context variable lookup for them.
+import contextvars
+import cProfile
+import io
+import pstats
+import time
+from collections import Counter, defaultdict
+
+# Slow-request traces list this many queries
+TOP_QUERIES = 5
+# ... and this many functions of a cProfile capture
+TOP_FUNCTIONS = 30
+SQL_PREVIEW = 300
+# The same statement this many times with different parameters looks like a query per row
+REPEATED_STATEMENT = 5
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    def __init__(self, profiler=None):
+        self.started = time.perf_counter()
+        self.wall = 0.0
+        self.timings = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.queries = []
+        self.profiler = profiler
+
+    def finish(self):
+        self.wall = time.perf_counter() - self.started
+        if self.profiler is not None:
+            self.profiler.disable()
+
+    @property
+    def sql_time(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    def duplicates(self):
+        """[(count, sql, params)] for statements run more than once with the same parameters."""
+        counts = Counter((sql, repr(params)) for sql, params, _ in self.queries)
+        return sorted(((count, sql, params) for (sql, params), count in counts.items() if count > 1), reverse=True)
+
+    def similar(self):
+        """[(count, sql)] for statements run more than once with any parameters (the N+1 pattern)."""
+        counts = Counter(sql for sql, _, _ in self.queries)
+        return sorted(((count, sql) for sql, count in counts.items() if count > 1), reverse=True)
+
+    def server_timing(self):
+        """The Server-Timing header value: total, db (with the query count), template, judge."""
+        metrics = [f'total;dur={self.wall * 1000:.1f}',
+                   f'db;dur={self.sql_time * 1000:.1f};desc="{len(self.queries)} queries"']
+        for name in ('template', 'judge'):
+            if name in self.timings:
+                metrics.append(f'{name};dur={self.timings[name] * 1000:.1f}')
+        if self.counters:
+            metrics.append('session;desc="{} writes, {} bytes"'.format(
+                self.counters['session_writes'], self.counters['session_bytes']))
+        return ', '.join(metrics)
+
+    def trace(self, request, response):
+        """A multi-line report of the request for the slow-request log."""
+        lines = [
+            f"{request.method} {request.get_full_path()} -> {response.status_code} in {self.wall * 1000:.0f} ms",
+            f"  db: {len(self.queries)} queries, {self.sql_time * 1000:.1f} ms; "
+            + '; '.join(f"{name}: {seconds * 1000:.1f} ms" for name, seconds in sorted(self.timings.items())),
+        ]
+        if self.counters:
+            lines.append('  ' + ', '.join(f"{name}: {value}" for name, value in sorted(self.counters.items())))
+        for sql, params, duration in sorted(self.queries, key=lambda query: query[2], reverse=True)[:TOP_QUERIES]:
+            lines.append(f"  {duration * 1000:8.1f} ms  {sql[:SQL_PREVIEW]}  {params!r:.{SQL_PREVIEW}}")
+        duplicates = self.duplicates()
+        if duplicates:
+            lines.append(f"  {sum(count - 1 for count, _, _ in duplicates)} duplicate queries:")
+            lines.extend(f"  {count:6d} x  {sql[:SQL_PREVIEW]}  {params:.{SQL_PREVIEW}}"
+                         for count, sql, params in duplicates[:TOP_QUERIES])
+        similar = [(count, sql) for count, sql in self.similar() if count >= REPEATED_STATEMENT]
+        if similar:
+            lines.append("  repeated statements (N+1?):")
+            lines.extend(f"  {count:6d} x  {sql[:SQL_PREVIEW]}" for count, sql in similar[:TOP_QUERIES])
+        if self.profiler is not None:
+            stats = io.StringIO()
+            pstats.Stats(self.profiler, stream=stats).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+            lines.append(stats.getvalue())
+        return '\n'.join(lines)
+
+
+def start(capture=False):
+    profiler = None
+    if capture:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    profile = RequestProfile(profiler)
+    return profile, _current.set(profile)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def record(name, seconds):
+    """Add ``seconds`` to the ``name`` timing of the current request, if it is being profiled."""
+    profile = _current.get()
+    if profile is not None:
+        profile.timings[name] += seconds
+
+
+def active():
+    return _current.get() is not None
+
+
+def count(name, amount=1):
+    """Add ``amount`` to the ``name`` counter of the current request, if it is being profiled."""
+    profile = _current.get()
+    if profile is not None:
+        profile.counters[name] += amount
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    """connection.execute_wrapper() hook timing every query of the profiled request."""
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries.append((sql, params, time.perf_counter() - started))
+
+
+def _wrap_connection(sender, connection, **kwargs):
+    if sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_wrapper)
+
+
+def hook_connections():
+    """Time the queries of profiled requests on every database connection.
+
+    Under ASGI a request's queries run on sync_to_async threads, each with
+    connections of its own, so the wrapper goes on each connection as it is
+    opened rather than around the request; the context variable still tells
+    which request a query belongs to.
+    """
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    connection_created.connect(_wrap_connection, dispatch_uid='problems.profiling')
+    for connection in connections.all(initialized_only=True):
+        _wrap_connection(None, connection)
+
+
+_templates_hooked = False
+
+
+def hook_templates():
+    """Time Django template rendering (render(), TemplateResponse, inclusion tags)."""
+    global _templates_hooked
+    if _templates_hooked:
+        return
+    from django.template.backends.django import Template
+
+    render = Template.render
+
+    def timed_render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return render(self, context, request)
+        started = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            profile.timings['template'] += time.perf_counter() - started
+
+    Template.render = timed_render
+    _templates_hooked = True
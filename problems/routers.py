@@ -0,0 +1,77 @@
+# problems/routers.py
+#
+# Read-replica routing. Writes always go to 'default'. Reads go to the
+# 'replica' alias only inside views marked with @use_replica (read-only pages
+# such as problem_list and profile), only for GET/HEAD, and not for a client
+# that wrote something in the last REPLICA_PIN_SECONDS: ReplicaPinMiddleware
+# marks those with a cookie, so nobody misses their own vote or submission
+# because the replica lags behind. Only the problems app tables those pages
+# list are read there: sessions, users and the ContentVersion validators stay
+# on the primary, or a lagging replica (a SQLite copy is only as fresh as the
+# last `manage.py sync_sqlite_replica`) would log people out and answer
+# conditional GETs with stale validators. Without a 'replica' alias in
+# DATABASES all of this is a no-op.
+import contextvars
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_ALIAS = 'replica'
+PIN_COOKIE = 'db_pin'
+REPLICA_APP = 'problems'
+PRIMARY_ONLY_MODELS = {'contentversion'}
+
+_reading_from = contextvars.ContextVar('reading_from', default=None)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def _alias_for(request):
+    if (replica_configured() and request.method in ('GET', 'HEAD')
+            and PIN_COOKIE not in request.COOKIES):
+        return REPLICA_ALIAS
+    return None
+
+
+def use_replica(view):
+    """Serve the reads of a read-only view (conditional GET checks included) from the replica."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            token = _reading_from.set(_alias_for(request))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _reading_from.reset(token)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            token = _reading_from.set(_alias_for(request))
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                _reading_from.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _reading_from.get()
+        if alias and model._meta.app_label == REPLICA_APP and model._meta.model_name not in PRIMARY_ONLY_MODELS:
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary
+        return db != REPLICA_ALIAS
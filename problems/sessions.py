@@ -0,0 +1,29 @@
+# problems/sessions.py
+#
+# The session engine (SESSION_ENGINE in settings): the store named by
+# SESSION_BACKEND (Django's cached_db with a shared cache, db otherwise), plus
+# per-request metrics for ProfilingMiddleware.
+# Sampled requests report how often the session was written and how big the
+# payload was ("session" in Server-Timing and the slow-request log).
+from importlib import import_module
+
+from django.conf import settings
+
+from . import profiling
+
+_backend = import_module(getattr(settings, 'SESSION_BACKEND', 'django.contrib.sessions.backends.db'))
+
+
+class SessionStore(_backend.SessionStore):
+    def save(self, must_create=False):
+        super().save(must_create)
+        self._measure()
+
+    async def asave(self, must_create=False):
+        await super().asave(must_create)
+        self._measure()
+
+    def _measure(self):
+        if profiling.active():
+            profiling.count('session_writes')
+            profiling.count('session_bytes', len(self.encode(self._session)))
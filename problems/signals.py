@@ -0,0 +1,382 @@
+# problems/signals.py
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import FavoriteProblem, Problem, ProblemRating, Profile, SimilarProblem, Solution, Tag, TestCase
+from . import autocomplete, avatars, fingerprints, leaderboards, similarity, stats
+from .versioning import bump_catalogue, bump_user, touch_problem
+
+
+# --- Validator bookkeeping (see versioning.py) ---
+
+@receiver(post_save, sender=Problem)
+@receiver(post_delete, sender=Problem)
+def problem_changed(sender, instance, **kwargs):
+    # The list and the author's profile show the problem too
+    touch_problem(instance.pk)
+    bump_catalogue()
+    bump_user(instance.created_by_id)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    # pre_delete: once the tag is gone, so are the rows linking it to problems
+    touch_problem(*Problem.objects.filter(tags=instance).values_list('pk', flat=True))
+    bump_catalogue()
+
+
+@receiver(m2m_changed, sender=Problem.tags.through)
+def problem_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action != 'post_clear' and not pk_set:
+        return
+    if reverse:
+        touch_problem(*(pk_set or ()))
+    else:
+        touch_problem(instance.pk)
+    bump_catalogue()
+
+
+@receiver(m2m_changed, sender=Problem.solved_by.through)
+@receiver(m2m_changed, sender=Problem.attempted_by.through)
+def problem_progress_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action != 'post_clear' and not pk_set:
+        # add() of rows that already exist
+        return
+    if reverse:
+        # instance is the user, pk_set holds problem ids
+        touch_problem(*(pk_set or ()))
+        bump_user(instance.pk)
+    else:
+        touch_problem(instance.pk)
+        bump_user(*(pk_set or ()))
+    bump_catalogue()
+
+
+@receiver(post_save, sender=TestCase)
+@receiver(post_delete, sender=TestCase)
+def test_case_changed(sender, instance, **kwargs):
+    touch_problem(instance.problem_id)
+
+
+@receiver(post_save, sender=Solution)
+@receiver(post_delete, sender=Solution)
+def solution_changed(sender, instance, **kwargs):
+    touch_problem(instance.problem_id)
+    bump_user(instance.created_by_id)
+
+
+@receiver(post_save, sender=ProblemRating)
+@receiver(post_delete, sender=ProblemRating)
+def rating_changed(sender, instance, **kwargs):
+    touch_problem(instance.problem_id)
+    bump_user(instance.user_id)
+    bump_catalogue()
+
+
+@receiver(post_save, sender=FavoriteProblem)
+@receiver(post_delete, sender=FavoriteProblem)
+def favorite_changed(sender, instance, **kwargs):
+    bump_user(instance.user_id)
+
+
+@receiver(post_save, sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    # Profile pictures show up next to every problem on the list
+    bump_user(instance.user_id)
+    bump_catalogue()
+
+
+# --- Counters for ORM-level changes (cascades, shell, fixtures) ---
+# interactions.py writes with raw SQL and adjusts the counters itself, so these
+# only fire for rows created or deleted through the ORM.
+
+@receiver(post_save, sender=ProblemRating)
+def rating_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        field = 'like_count' if instance.vote == 1 else 'dislike_count'
+        Problem.objects.filter(pk=instance.problem_id).update(**{field: F(field) + 1})
+
+
+@receiver(post_delete, sender=ProblemRating)
+def rating_deleted(sender, instance, **kwargs):
+    field = 'like_count' if instance.vote == 1 else 'dislike_count'
+    Problem.objects.filter(pk=instance.problem_id, **{f'{field}__gt': 0}).update(**{field: F(field) - 1})
+
+
+@receiver(post_save, sender=FavoriteProblem)
+def favorite_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Problem.objects.filter(pk=instance.problem_id).update(favorite_count=F('favorite_count') + 1)
+
+
+@receiver(post_delete, sender=FavoriteProblem)
+def favorite_deleted(sender, instance, **kwargs):
+    Problem.objects.filter(pk=instance.problem_id, favorite_count__gt=0).update(favorite_count=F('favorite_count') - 1)
+
+
+# --- Materialized user statistics (see stats.py) ---
+
+@receiver(m2m_changed, sender=Problem.solved_by.through)
+@receiver(m2m_changed, sender=Problem.attempted_by.through)
+@receiver(m2m_changed, sender=Problem.tags.through)
+def narrow_removed_progress(sender, instance, action, reverse, pk_set, **kwargs):
+    # remove() reports every id it was given, present or not; keep only the
+    # rows that really go away so the post_remove receivers don't undercount
+    if action != 'pre_remove' or not pk_set:
+        return
+    pk_set.intersection_update(_linked(sender, instance, reverse))
+
+
+def _linked(sender, instance, reverse):
+    """The ids linked to ``instance`` through ``sender``, e.g. the ones clear() is about to unlink."""
+    # The other side of the through table: the user (solved_by, attempted_by) or the tag
+    other = next(field.attname for field in sender._meta.concrete_fields
+                 if field.is_relation and field.name != 'problem')
+    if reverse:
+        return set(sender.objects.filter(**{other: instance.pk}).values_list('problem_id', flat=True))
+    return set(sender.objects.filter(problem_id=instance.pk).values_list(other, flat=True))
+
+
+def _progress_events(instance, reverse, pk_set):
+    """(user_id, [difficulty per problem]) pairs for an m2m change on solved_by/attempted_by."""
+    if reverse:
+        difficulties = list(Problem.objects.filter(pk__in=pk_set).values_list('difficulty', flat=True))
+        return [(instance.pk, difficulties)]
+    return [(user_id, [instance.difficulty]) for user_id in pk_set]
+
+
+@receiver(pre_save, sender=Problem)
+def problem_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    # post_save can't tell what the difficulty was; the solve counts by
+    # difficulty have to follow an edit
+    instance._saved_difficulty = None
+    if raw or instance.pk is None or (update_fields is not None and 'difficulty' not in update_fields):
+        return
+    instance._saved_difficulty = Problem.objects.filter(pk=instance.pk).values_list('difficulty', flat=True).first()
+
+
+def _difficulty_change(instance):
+    """(old, new) difficulty when this save changed it, else None."""
+    old = getattr(instance, '_saved_difficulty', None)
+    if old is None or old == instance.difficulty:
+        return None
+    return old, instance.difficulty
+
+
+@receiver(post_save, sender=Problem)
+def problem_difficulty_stats(sender, instance, created, raw=False, **kwargs):
+    change = _difficulty_change(instance)
+    if change and not created and not raw:
+        stats.move_solves(list(instance.solved_by.values_list('pk', flat=True)), *change)
+
+
+@receiver(m2m_changed, sender=Problem.solved_by.through)
+def solved_by_stats(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        action, pk_set = 'post_remove', _linked(sender, instance, reverse)
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    for user_id, difficulties in _progress_events(instance, reverse, pk_set):
+        if action == 'post_add':
+            stats.record_solve(user_id, difficulties)
+        else:
+            stats.record_unsolve(user_id, difficulties)
+
+
+@receiver(m2m_changed, sender=Problem.attempted_by.through)
+def attempted_by_stats(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        action, pk_set = 'post_remove', _linked(sender, instance, reverse)
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    delta = 1 if action == 'post_add' else -1
+    if reverse:
+        stats.record_attempt([instance.pk], delta * len(pk_set))
+    else:
+        stats.record_attempt(pk_set, delta)
+
+
+# --- Leaderboards (see leaderboards.py) ---
+
+@receiver(m2m_changed, sender=Problem.solved_by.through)
+def solved_by_leaderboards(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        action, pk_set = 'post_remove', _linked(sender, instance, reverse)
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    record = leaderboards.record_solves if action == 'post_add' else leaderboards.record_unsolves
+    if reverse:
+        record(instance.pk, pk_set)
+    else:
+        for user_id in pk_set:
+            record(user_id, [instance.pk])
+
+
+@receiver(post_save, sender=Problem)
+def problem_difficulty_leaderboards(sender, instance, created, raw=False, **kwargs):
+    change = _difficulty_change(instance)
+    if change and not created and not raw:
+        old, new = change
+        leaderboards.change_boards(instance.pk, [leaderboards.difficulty_board(old)],
+                                   [leaderboards.difficulty_board(new)])
+
+
+@receiver(m2m_changed, sender=Problem.tags.through)
+def problem_tags_leaderboards(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        action, pk_set = 'post_remove', _linked(sender, instance, reverse)
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    problem_ids, tag_ids = (pk_set, [instance.pk]) if reverse else ([instance.pk], pk_set)
+    boards = [leaderboards.tag_board(tag_id) for tag_id in tag_ids]
+    for problem_id in problem_ids:
+        if action == 'post_add':
+            leaderboards.change_boards(problem_id, added=boards)
+        else:
+            leaderboards.change_boards(problem_id, removed=boards)
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_board_deleting(sender, instance, **kwargs):
+    # The cascade drops the tag's links without m2m signals; the board goes with the tag
+    leaderboards.replace_board(leaderboards.tag_board(instance.pk), {})
+
+
+@receiver(pre_delete, sender=Problem)
+def problem_deleting(sender, instance, **kwargs):
+    # The cascade drops the solved_by and attempted_by rows without m2m signals
+    for user_id in instance.solved_by.values_list('pk', flat=True):
+        leaderboards.record_unsolves(user_id, [instance.pk])
+        stats.record_unsolve(user_id, [instance.difficulty])
+    stats.record_attempt(instance.attempted_by.values_list('pk', flat=True), -1)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    leaderboards.remove_user(instance.pk)
+    # Their solves go with the cascade; the co-solve counts of those problems change
+    similarity.queue(instance.solved_problems.values_list('pk', flat=True))
+
+
+# --- Similar problems (see similarity.py) ---
+
+@receiver(m2m_changed, sender=Problem.tags.through)
+@receiver(m2m_changed, sender=Problem.solved_by.through)
+def similarity_inputs_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # post_clear doesn't say which problems lost the tag/solver
+        if sender is Problem.tags.through:
+            similarity.queue(instance.problem_set.values_list('pk', flat=True))
+        else:
+            similarity.queue(instance.solved_problems.values_list('pk', flat=True))
+    elif action == 'post_clear' and not reverse:
+        similarity.queue([instance.pk])
+    elif action in ('post_add', 'post_remove') and pk_set:
+        similarity.queue(pk_set if reverse else [instance.pk])
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleting(sender, instance, **kwargs):
+    similarity.queue(instance.problem_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Problem)
+def problem_leaving_index(sender, instance, **kwargs):
+    # The cascade takes the problem out of its neighbours' lists, which may
+    # then miss whatever ranked just below it
+    similarity.queue(SimilarProblem.objects.filter(similar=instance)
+                     .exclude(problem=instance).values_list('problem_id', flat=True))
+
+
+# --- Copy detection (see fingerprints.py) ---
+
+@receiver(post_save, sender=Solution)
+def solution_fingerprints(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'code_blob' not in update_fields):
+        return
+    fingerprints.schedule(instance)
+
+
+# --- Profile pictures (see avatars.py) ---
+
+@receiver(post_save, sender=Profile)
+def profile_picture_uploaded(sender, instance, raw=False, **kwargs):
+    if not raw and instance.avatar_pending:
+        avatars.schedule(instance)
+
+
+# --- Search box type-ahead (see autocomplete.py) ---
+
+AUTOCOMPLETE_LABELS = {Problem: 'title', Tag: 'name'}
+
+
+@receiver(pre_save, sender=Problem)
+@receiver(pre_save, sender=Tag)
+def autocomplete_label_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    # A process without an index tells a rename by the stored label
+    field = AUTOCOMPLETE_LABELS[sender]
+    instance._saved_label = None
+    if (raw or instance.pk is None or autocomplete.has_index()
+            or (update_fields is not None and field not in update_fields)):
+        return
+    instance._saved_label = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+def _label_changed(instance, label, created):
+    saved = getattr(instance, '_saved_label', None)
+    return created or (saved is not None and saved != label)
+
+
+@receiver(post_save, sender=Problem)
+def problem_autocomplete(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        autocomplete.item_saved(autocomplete.PROBLEM, instance.pk, instance.title,
+                                _label_changed(instance, instance.title, created))
+
+
+@receiver(post_save, sender=Tag)
+def tag_autocomplete(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        autocomplete.item_saved(autocomplete.TAG, instance.pk, instance.name,
+                                _label_changed(instance, instance.name, created))
+
+
+@receiver(post_delete, sender=Problem)
+def problem_left_autocomplete(sender, instance, **kwargs):
+    autocomplete.item_deleted(autocomplete.PROBLEM, instance.pk)
+
+
+@receiver(post_delete, sender=Tag)
+def tag_left_autocomplete(sender, instance, **kwargs):
+    autocomplete.item_deleted(autocomplete.TAG, instance.pk)
+
+
+@receiver(m2m_changed, sender=Problem.solved_by.through)
+def solves_autocomplete(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    delta = 1 if action == 'post_add' else -1
+    if reverse:
+        for problem_id in pk_set:
+            autocomplete.adjust_score(autocomplete.PROBLEM, problem_id, delta)
+    else:
+        autocomplete.adjust_score(autocomplete.PROBLEM, instance.pk, delta * len(pk_set))
+
+
+@receiver(m2m_changed, sender=Problem.tags.through)
+def tag_uses_autocomplete(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    delta = 1 if action == 'post_add' else -1
+    if reverse:
+        autocomplete.adjust_score(autocomplete.TAG, instance.pk, delta * len(pk_set))
+    else:
+        for tag_id in pk_set:
+            autocomplete.adjust_score(autocomplete.TAG, tag_id, delta)
@@ -0,0 +1,251 @@
+# problems/similarity.py
+#
+# "Similar problems" from a precomputed index. Two problems are similar when
+# they share tags (Jaccard index of the tag sets) and when the same people
+# solved both (co-solves, normalised by the two solver counts). The TOP_K best
+# neighbours of every problem are stored as SimilarProblem rows, so the detail
+# page reads them with one range scan over (problem, rank).
+#
+# The score of a pair only depends on the two problems' tags and solvers, so a
+# change to problem p only moves the pairs (p, q). Changes are queued as
+# SimilarityRefresh rows by the signals (signals.py) and applied by
+# ``manage.py rebuild_similar --queued``, which recomputes p's list and merges
+# the new (p, q) scores into the lists of its neighbours. The whole index is
+# built in memory by ``manage.py rebuild_similar``.
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Problem, SimilarityRefresh, SimilarProblem
+from .versioning import touch_problem
+
+TOP_K = 6
+TAG_WEIGHT = 0.6
+CO_SOLVE_WEIGHT = 0.4
+CHUNK_SIZE = 500
+# Past this many queued problems one in-memory rebuild is cheaper than the
+# per-problem refresh (roughly 5k problems: 6s rebuilt vs 70ms per problem)
+FULL_REBUILD_AFTER = 100
+
+ProblemTags = Problem.tags.through
+ProblemSolves = Problem.solved_by.through
+
+
+def pair_score(shared_tags, tags_a, tags_b, co_solves, solvers_a, solvers_b):
+    """(score, tag Jaccard) of a pair of problems, from counts."""
+    union = tags_a + tags_b - shared_tags
+    jaccard = shared_tags / union if union else 0.0
+    co_solve = co_solves / math.sqrt(solvers_a * solvers_b) if co_solves else 0.0
+    return TAG_WEIGHT * jaccard + CO_SOLVE_WEIGHT * co_solve, jaccard
+
+
+def _key(entry):
+    # Best first; ties go to the older problem so both build paths agree
+    score, _, _, neighbour_id = entry
+    return (score, -neighbour_id)
+
+
+def _top(entries):
+    return heapq.nlargest(TOP_K, (entry for entry in entries if entry[0] > 0), key=_key)
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def _counts(through, problem_ids):
+    counts = {}
+    for chunk in _chunks(problem_ids):
+        counts.update(through.objects.filter(problem_id__in=chunk).values_list('problem_id').annotate(n=Count('pk')).order_by())
+    return counts
+
+
+def score_neighbours(problem_id):
+    """{neighbour id: (score, jaccard, co_solves, neighbour id)} for every problem related to one problem."""
+    shared = dict(
+        ProblemTags.objects.filter(tag_id__in=ProblemTags.objects.filter(problem_id=problem_id).values('tag_id'))
+        .exclude(problem_id=problem_id).values_list('problem_id').annotate(n=Count('pk')).order_by()
+    )
+    co_solves = dict(
+        ProblemSolves.objects.filter(user_id__in=ProblemSolves.objects.filter(problem_id=problem_id).values('user_id'))
+        .exclude(problem_id=problem_id).values_list('problem_id').annotate(n=Count('pk')).order_by()
+    )
+    related = set(shared) | set(co_solves)
+    tag_counts = _counts(ProblemTags, related | {problem_id})
+    solver_counts = _counts(ProblemSolves, related | {problem_id})
+    scores = {}
+    for other in related:
+        score, jaccard = pair_score(
+            shared.get(other, 0), tag_counts.get(problem_id, 0), tag_counts.get(other, 0),
+            co_solves.get(other, 0), solver_counts.get(problem_id, 0), solver_counts.get(other, 0),
+        )
+        scores[other] = (score, jaccard, co_solves.get(other, 0), other)
+    return scores
+
+
+def build_index():
+    """Top-K neighbours of every problem ({problem id: [entry, ...]}), computed in memory."""
+    tags_of, problems_with_tag = defaultdict(list), defaultdict(list)
+    for problem_id, tag_id in ProblemTags.objects.values_list('problem_id', 'tag_id').iterator():
+        tags_of[problem_id].append(tag_id)
+        problems_with_tag[tag_id].append(problem_id)
+    solvers_of, solved_by_user = defaultdict(list), defaultdict(list)
+    for problem_id, user_id in ProblemSolves.objects.values_list('problem_id', 'user_id').iterator():
+        solvers_of[problem_id].append(user_id)
+        solved_by_user[user_id].append(problem_id)
+    tag_counts = {problem_id: len(tags) for problem_id, tags in tags_of.items()}
+    solver_counts = {problem_id: len(solvers) for problem_id, solvers in solvers_of.items()}
+
+    index = {}
+    for problem_id in Problem.objects.values_list('pk', flat=True).iterator():
+        shared = Counter()
+        for tag_id in tags_of.get(problem_id, ()):
+            shared.update(problems_with_tag[tag_id])
+        co_solves = Counter()
+        for user_id in solvers_of.get(problem_id, ()):
+            co_solves.update(solved_by_user[user_id])
+        shared.pop(problem_id, None)
+        co_solves.pop(problem_id, None)
+
+        # The hot loop: pair_score inlined, only (score, -id) kept for the heap
+        tags_a, solvers_a = tag_counts.get(problem_id, 0), solver_counts.get(problem_id, 0)
+        best = []
+        for other in shared.keys() | co_solves.keys():
+            shared_tags, co = shared[other], co_solves[other]
+            score = TAG_WEIGHT * (shared_tags / (tags_a + tag_counts[other] - shared_tags) if shared_tags else 0.0)
+            score += CO_SOLVE_WEIGHT * (co / math.sqrt(solvers_a * solver_counts[other]) if co else 0.0)
+            if len(best) < TOP_K:
+                heapq.heappush(best, (score, -other))
+            elif (score, -other) > best[0]:
+                heapq.heapreplace(best, (score, -other))
+
+        entries = []
+        for _, other in sorted(best, reverse=True):
+            other = -other
+            score, jaccard = pair_score(shared[other], tags_a, tag_counts.get(other, 0),
+                                        co_solves[other], solvers_a, solver_counts.get(other, 0))
+            entries.append((score, jaccard, co_solves[other], other))
+        index[problem_id] = entries
+    return index
+
+
+def _stored(problem_ids):
+    lists = {problem_id: [] for problem_id in problem_ids}
+    for chunk in _chunks(problem_ids):
+        rows = (SimilarProblem.objects.filter(problem_id__in=chunk).order_by('problem_id', 'rank')
+                .values_list('problem_id', 'score', 'tag_jaccard', 'co_solves', 'similar_id'))
+        for problem_id, *entry in rows:
+            lists[problem_id].append(tuple(entry))
+    return lists
+
+
+def write(lists):
+    """Store the given neighbour lists ({problem id: [entry, ...]}), touching only the lists that changed.
+
+    Returns how many lists changed.
+    """
+    old = _stored(lists)
+    changed = [problem_id for problem_id, entries in lists.items() if entries != old[problem_id]]
+    with transaction.atomic():
+        for chunk in _chunks(changed):
+            SimilarProblem.objects.filter(problem_id__in=chunk).delete()
+        SimilarProblem.objects.bulk_create([
+            SimilarProblem(problem_id=problem_id, similar_id=neighbour_id, rank=rank, score=score,
+                           tag_jaccard=jaccard, co_solves=co_solves)
+            for problem_id in changed
+            for rank, (score, jaccard, co_solves, neighbour_id) in enumerate(lists[problem_id], start=1)
+        ], batch_size=2000)
+        # The detail page shows the list, so its validators have to move
+        for chunk in _chunks(changed):
+            touch_problem(*chunk)
+    return len(changed)
+
+
+def queue(problem_ids):
+    """Mark problems whose tags or solvers changed; a re-queued problem keeps its place at the back."""
+    SimilarityRefresh.objects.bulk_create(
+        [SimilarityRefresh(problem_id=problem_id) for problem_id in problem_ids],
+        update_conflicts=True, unique_fields=['problem'], update_fields=['queued_at'],
+    )
+
+
+def _merge(entries, changed_id, entry):
+    """Put ``changed_id``'s fresh score into one exact top-K list.
+
+    Returns the new list, or None when it can't be known without a full
+    recompute (the changed problem fell out of a full list, so whatever ranks
+    K + 1 would move up).
+    """
+    was_full = len(entries) == TOP_K
+    had_it = any(neighbour_id == changed_id for *_, neighbour_id in entries)
+    rest = [current for current in entries if current[3] != changed_id]
+    if entry[0] > 0 and (len(rest) < TOP_K or _key(entry) > _key(rest[-1])):
+        if had_it and was_full and rest and _key(entry) < _key(rest[-1]):
+            return None
+        return sorted(rest + [entry], key=_key, reverse=True)[:TOP_K]
+    if had_it and was_full:
+        return None
+    return rest
+
+
+def refresh(problem_ids):
+    """Bring the index up to date after the tags or solvers of ``problem_ids`` changed.
+
+    Returns how many lists changed.
+    """
+    problem_ids = set(Problem.objects.filter(pk__in=problem_ids).values_list('pk', flat=True))
+    scores = {problem_id: score_neighbours(problem_id) for problem_id in problem_ids}
+    listers = defaultdict(set)
+    for chunk in _chunks(problem_ids):
+        for problem_id, similar_id in SimilarProblem.objects.filter(similar_id__in=chunk).values_list('problem_id', 'similar_id'):
+            listers[similar_id].add(problem_id)
+
+    neighbours = set()
+    for problem_id in problem_ids:
+        neighbours |= set(scores[problem_id]) | listers[problem_id]
+    neighbours -= problem_ids
+    lists = _stored(neighbours)
+    recompute = set(problem_ids)
+    for problem_id in problem_ids:
+        for other in set(scores[problem_id]) | listers[problem_id]:
+            if other in recompute:
+                continue
+            score, jaccard, co_solves, _ = scores[problem_id].get(other, (0.0, 0.0, 0, problem_id))
+            merged = _merge(lists[other], problem_id, (score, jaccard, co_solves, problem_id))
+            if merged is None:
+                recompute.add(other)
+                del lists[other]
+            else:
+                lists[other] = merged
+
+    for problem_id in recompute:
+        lists[problem_id] = _top((scores.get(problem_id) or score_neighbours(problem_id)).values())
+    return write(lists)
+
+
+def refresh_queued():
+    """Apply every queued change; returns (problems refreshed, lists changed)."""
+    taken_at = timezone.now()
+    problem_ids = list(SimilarityRefresh.objects.filter(queued_at__lte=taken_at).values_list('problem_id', flat=True))
+    if not problem_ids:
+        return 0, 0
+    if len(problem_ids) > FULL_REBUILD_AFTER:
+        changed = write(build_index())
+    else:
+        changed = refresh(problem_ids)
+    # Problems queued again while this ran stay in the queue
+    SimilarityRefresh.objects.filter(queued_at__lte=taken_at).delete()
+    return len(problem_ids), changed
+
+
+def similar_to(problem):
+    """The stored neighbours of one problem, best first."""
+    return problem.similar_problems.select_related('similar').only(
+        'problem_id', 'rank', 'score', 'similar__id', 'similar__title', 'similar__difficulty',
+    ).order_by('rank')
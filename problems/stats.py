@@ -0,0 +1,106 @@
+# problems/stats.py
+#
+# Incremental maintenance of the materialized UserStats rows. Solve and attempt
+# events arrive through the solved_by/attempted_by signals (signals.py), as
+# do difficulty edits of solved problems; submissions are recorded by the
+# views that run the judge.
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import UserStats
+from .versioning import bump_user
+
+SOLVED_FIELDS = {
+    'easy': 'solved_easy',
+    'medium': 'solved_medium',
+    'hard': 'solved_hard',
+}
+
+
+def _ensure(user_id):
+    UserStats.objects.get_or_create(user_id=user_id)
+
+
+def record_submission(user_id, accepted):
+    """One press of Submit, passing or not."""
+    _ensure(user_id)
+    UserStats.objects.filter(pk=user_id).update(
+        submissions=F('submissions') + 1,
+        accepted_submissions=F('accepted_submissions') + (1 if accepted else 0),
+    )
+    bump_user(user_id)
+
+
+def record_attempt(user_ids, delta=1):
+    for user_id in user_ids:
+        _ensure(user_id)
+        UserStats.objects.filter(pk=user_id).update(attempted=Greatest(F('attempted') + delta, 0))
+
+
+def advance_streak(current, longest, last_day, day):
+    """Streak counters after a solve on ``day``; returns (current, longest, last_day)."""
+    if last_day == day:
+        return current, longest, last_day
+    if last_day is not None and day - last_day == timedelta(days=1):
+        current += 1
+    elif last_day is None or day > last_day:
+        current = 1
+    else:
+        # Out-of-order event (e.g. a rejudge of old history) doesn't move the streak
+        return current, longest, last_day
+    return current, max(longest, current), day
+
+
+def record_solve(user_id, difficulties, when=None):
+    """First solves of problems with the given difficulties (one entry per problem)."""
+    day = timezone.localdate(when or timezone.now())
+    with transaction.atomic():
+        _ensure(user_id)
+        stats = UserStats.objects.select_for_update().get(pk=user_id)
+        for difficulty in difficulties:
+            field = SOLVED_FIELDS.get(difficulty)
+            if field:
+                setattr(stats, field, getattr(stats, field) + 1)
+        stats.current_streak, stats.longest_streak, stats.last_solved_on = advance_streak(
+            stats.current_streak, stats.longest_streak, stats.last_solved_on, day
+        )
+        stats.save()
+
+
+def record_unsolve(user_id, difficulties):
+    """Solves taken back (e.g. by a rejudge or the problem being deleted)."""
+    with transaction.atomic():
+        # No _ensure(): this also runs while the user is being deleted
+        stats = UserStats.objects.select_for_update().filter(pk=user_id).first()
+        if stats is None:
+            return
+        for difficulty in difficulties:
+            field = SOLVED_FIELDS.get(difficulty)
+            if field:
+                setattr(stats, field, max(getattr(stats, field) - 1, 0))
+        stats.save()
+
+
+def move_solves(user_ids, old_difficulty, new_difficulty):
+    """A solved problem changed difficulty: move its solvers' count from one column to the other."""
+    old_field, new_field = SOLVED_FIELDS.get(old_difficulty), SOLVED_FIELDS.get(new_difficulty)
+    changes = {}
+    if old_field:
+        changes[old_field] = Greatest(F(old_field) - 1, 0)
+    if new_field:
+        changes[new_field] = F(new_field) + 1
+    if changes and user_ids:
+        UserStats.objects.filter(pk__in=user_ids).update(**changes)
+        bump_user(*user_ids)
+
+
+def current_streak(stats, today=None):
+    """The streak as of today: it lapses once a whole day passes without a solve."""
+    today = today or timezone.localdate()
+    if stats.last_solved_on is None or today - stats.last_solved_on > timedelta(days=1):
+        return 0
+    return stats.current_streak
@@ -0,0 +1,61 @@
+# problems/storage.py
+#
+# Static files storage for production: ManifestStaticFilesStorage already
+# writes content-hashed copies (logo4.3f2a...png) and rewrites the references
+# inside CSS; this also writes .gz and, when the brotli package is installed,
+# .br siblings of every compressible file at collectstatic time, so
+# middleware.StaticFilesMiddleware can serve them without compressing per request.
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip variants are written
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.ttf', '.otf', '.eot', '.wasm',
+}
+# Smaller files fit in a packet either way
+MIN_COMPRESS_SIZE = 256
+# Keep a variant only when it saves at least this much
+MAX_COMPRESSED_RATIO = 0.95
+
+ENCODINGS = {
+    'br': '.br',
+    'gzip': '.gz',
+}
+
+
+def compress(data):
+    """{encoding: compressed bytes} for the variants worth keeping."""
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in variants.items() if len(body) <= len(data) * MAX_COMPRESSED_RATIO}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        written = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            yield name, hashed_name, processed
+            if not dry_run and not isinstance(processed, Exception):
+                written.update(filter(None, (name, hashed_name)))
+        for name in sorted(written):
+            self.write_compressed(name)
+
+    def write_compressed(self, name):
+        if not any(name.endswith(extension) for extension in COMPRESSIBLE_EXTENSIONS):
+            return
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        for encoding, body in compress(data).items():
+            variant = name + ENCODINGS[encoding]
+            if self.exists(variant):
+                self.delete(variant)
+            self._save(variant, ContentFile(body))
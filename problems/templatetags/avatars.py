@@ -0,0 +1,26 @@
+# problems/templatetags/avatars.py
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from problems import avatars
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar(user, size='small', **attrs):
+    """A user's profile picture at one of avatars.SIZES, as WebP with a JPEG fallback.
+
+    Usage: {% avatar user 'small' class='profile-pic' %}. Until the upload has
+    been processed the original is shown; users without a picture get the default.
+    """
+    px = avatars.SIZES[size]
+    attrs = {'alt': f"{user.username}'s Profile Picture", 'width': px, 'height': px, **attrs}
+    sources = avatars.sources(user, size)
+    if sources['srcset'] is None:
+        return format_html('<img src="{}"{}>', sources['src'], flatatt(attrs))
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}"><img src="{}" srcset="{}" loading="lazy"{}></picture>',
+        sources['webp_srcset'], sources['src'], sources['srcset'], flatatt(attrs),
+    )
@@ -1,3 +1,2369 @@
-from django.test import TestCase
+import asyncio
+import base64
+import contextlib
+import gzip
+import io
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, router
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import (admin, admission, autocomplete, avatars, blobs, events, fingerprints, interactions, judge, judge_harness,
+               leaderboards, profiling, routers, similarity, stats, versioning)
+from .management.commands import benchmark_startup, index_advisor
+from .middleware import CompressionMiddleware, StaticFilesMiddleware
+from .models import (CodeBlob, ContentVersion, FavoriteProblem, LeaderboardBucket, LeaderboardEntry, Problem, ProblemRating,
+                     ProblemStats, Profile, SimilarityRefresh, Solution, SolutionFingerprint, SolutionMatch,
+                     SubmissionEvent, Tag, TestCase as ProblemTestCase, UserStats)
+
+
+def make_user(username):
+    return User.objects.create_user(username, password='pw')
+
+
+def make_problem(user, title='Two Sum', **fields):
+    return Problem.objects.create(title=title, description='Add two numbers.', created_by=user,
+                                  solution_code='def solution(a, b):\n    return a + b\n', **fields)
+
+
+# Pages render {% static %}; the hashed names only exist after collectstatic
+plain_static = override_settings(STORAGES={
+    **settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+
+
+# --- Conditional GETs (see versioning.py) ---
+
+@plain_static
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.problem = make_problem(self.alice)
+
+    def assertRevalidates(self, url, **headers):
+        """The page answers 304 to its own validators; returns its ETag."""
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag, **headers).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+                                         **headers).status_code, 304)
+        return etag
+
+    def test_problem_list(self):
+        etag = self.assertRevalidates(reverse('problem_list'))
+        make_problem(self.bob, title='Three Sum')
+        self.assertNotEqual(self.assertRevalidates(reverse('problem_list')), etag)
+
+    def test_problem_list_is_per_viewer(self):
+        anonymous = self.assertRevalidates(reverse('problem_list'))
+        self.client.force_login(self.bob)
+        etag = self.assertRevalidates(reverse('problem_list'))
+        self.assertNotEqual(etag, anonymous)
+        self.assertIn('private', self.client.get(reverse('problem_list'))['Cache-Control'])
+        interactions.toggle_favorite(self.problem.pk, self.bob.pk)
+        self.assertNotEqual(self.assertRevalidates(reverse('problem_list')), etag)
+
+    def test_problem_detail(self):
+        url = reverse('problem_detail', args=[self.problem.pk])
+        etag = self.assertRevalidates(url)
+        ProblemTestCase.objects.create(problem=self.problem, input_value={'a': 1, 'b': 2}, expected_output=3)
+        self.assertNotEqual(self.assertRevalidates(url), etag)
+        self.assertEqual(self.client.get(reverse('problem_detail', args=[self.problem.pk + 100])).status_code, 404)
+
+    def test_deleting_a_tag_moves_its_problems(self):
+        tag = Tag.objects.create(name='arrays')
+        self.problem.tags.add(tag)
+        url = reverse('problem_detail', args=[self.problem.pk])
+        etag = self.assertRevalidates(url)
+        tag.delete()
+        self.assertNotEqual(self.assertRevalidates(url), etag)
+
+    def test_viewing_a_profile_changes_nothing(self):
+        list_etag = self.assertRevalidates(reverse('problem_list'))
+        self.assertRevalidates(reverse('profile') + '?user=alice')
+        self.assertFalse(Profile.objects.filter(user=self.alice).exists())
+        self.assertEqual(self.client.get(reverse('problem_list'), HTTP_IF_NONE_MATCH=list_etag).status_code, 304)
+
+    def test_profile_revalidates_when_the_day_changes(self):
+        url = reverse('profile') + '?user=alice'
+        etag = self.assertRevalidates(url)
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        with mock.patch.object(versioning.timezone, 'localdate', return_value=tomorrow):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_profile_of_unknown_user(self):
+        self.assertEqual(self.client.get(reverse('profile') + '?user=nobody').status_code, 404)
+
+    def test_logging_in_again_invalidates_cached_pages(self):
+        client = Client(enforce_csrf_checks=True)
+        client.get(reverse('login'))
+
+        def log_in():
+            response = client.post(reverse('login'), {'username': 'bob', 'password': 'pw',
+                                                      'csrfmiddlewaretoken': client.cookies['csrftoken'].value})
+            self.assertEqual(response.status_code, 302)
+
+        log_in()
+        urls = [reverse('problem_list'), reverse('problem_detail', args=[self.problem.pk]), reverse('profile')]
+        etags = [client.get(url)['ETag'] for url in urls]
+        token = client.cookies['csrftoken'].value
+        client.post(reverse('logout'), {'csrfmiddlewaretoken': token})
+        log_in()
+        self.assertNotEqual(client.cookies['csrftoken'].value, token)
+        for url, etag in zip(urls, etags):
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        favorite = client.post(reverse('toggle_favorite', args=[self.problem.pk]),
+                               {'csrfmiddlewaretoken': client.cookies['csrftoken'].value})
+        self.assertNotEqual(favorite.status_code, 403)
+
+
+# --- Community solutions (see views.community_solutions_page) ---
+
+@plain_static
+class CommunitySolutionsTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.problem = make_problem(self.alice)
+        self.url = reverse('community_solutions', args=[self.problem.pk])
+        moment = timezone.now() - timedelta(hours=1)
+        for i in range(11):
+            solution = Solution.objects.create(problem=self.problem, created_by=self.bob, code=f'# {i}\n')
+            # Pairs of solutions saved in the same instant
+            Solution.objects.filter(pk=solution.pk).update(created_at=moment + timedelta(seconds=i // 2))
+        Solution.objects.create(problem=self.problem, created_by=self.alice, code='# mine\n')
+
+    def walk(self, limit):
+        ids, cursor = [], None
+        while True:
+            params = {'limit': limit, **({'cursor': cursor} if cursor else {})}
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            self.assertLessEqual(len(page['solutions']), limit)
+            ids += [solution['id'] for solution in page['solutions']]
+            cursor = page['next_cursor']
+            if not cursor:
+                return ids
+
+    def test_pages_cover_every_solution_once(self):
+        self.client.force_login(self.alice)
+        expected = list(Solution.objects.filter(problem=self.problem, created_by=self.bob)
+                        .order_by('-created_at', '-id').values_list('pk', flat=True))
+        for limit in (1, 2, 3, 4, 50):
+            self.assertEqual(self.walk(limit), expected)
+
+    def test_anonymous_visitors_see_everyone(self):
+        self.assertEqual(len(self.walk(5)), 12)
+
+    def test_bad_cursor_or_limit(self):
+        for params in ({'cursor': 'garbage'}, {'cursor': 'yesterday~3'}, {'cursor': '2024-01-01T00:00:00~x'},
+                       {'cursor': '2024-13-45T00:00:00~3'}, {'limit': 'ten'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400)
+        self.assertEqual(self.client.get(reverse('community_solutions', args=[self.problem.pk + 100])).status_code, 404)
+
+    def test_previews_and_full_code(self):
+        code = 'x = 1\n' * 100
+        solution = Solution.objects.create(problem=self.problem, created_by=self.bob, code=code)
+        first = self.client.get(self.url, {'limit': 1}).json()['solutions'][0]
+        self.assertEqual((first['id'], first['author'], first['truncated']), (solution.pk, 'bob', True))
+        self.assertEqual(first['preview'], code[:300])
+        self.assertEqual(self.client.get(reverse('solution_code', args=[solution.pk])).json()['code'], code)
+
+    def test_avatars_match_the_rendered_ones(self):
+        name = 'profile_pics/bob.jpg'
+        Profile.objects.create(user=self.bob)
+        # As left by avatars.process, without running it
+        Profile.objects.filter(user=self.bob).update(profile_picture=name, avatar_source=name, avatar_hash='ab' * 8)
+        solutions = self.client.get(self.url, {'limit': 50}).json()['solutions']
+        by_author = {solution['author']: solution['avatar'] for solution in solutions}
+        profile = Profile.objects.get(user=self.bob)
+        self.assertEqual(by_author['bob'], {
+            'src': avatars.variant_url(profile, 'small', 'jpg'),
+            'srcset': f"{avatars.variant_url(profile, 'small', 'jpg')} 1x, {avatars.variant_url(profile, 'small', 'jpg', 2)} 2x",
+            'webp_srcset': f"{avatars.variant_url(profile, 'small', 'webp')} 1x, "
+                           f"{avatars.variant_url(profile, 'small', 'webp', 2)} 2x",
+        })
+        self.assertEqual(by_author['alice'], {'src': settings.STATIC_URL + 'problems/default_profile.png',
+                                              'srcset': None, 'webp_srcset': None})
+
+
+# --- Votes and favorites (see interactions.py) ---
+
+class InteractionsTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.problem = make_problem(self.alice)
+
+    def counters(self):
+        self.problem.refresh_from_db()
+        return self.problem.like_count, self.problem.dislike_count, self.problem.favorite_count
+
+    def test_vote_is_counted_once(self):
+        self.assertEqual(interactions.set_vote(self.problem.pk, self.bob.pk, 1), (1, 0))
+        self.assertEqual(interactions.set_vote(self.problem.pk, self.bob.pk, 1), (1, 0))
+        self.assertEqual(interactions.set_vote(self.problem.pk, self.alice.pk, 1), (2, 0))
+        self.assertEqual(self.counters(), (2, 0, 0))
+        self.assertEqual(ProblemRating.objects.filter(problem=self.problem).count(), 2)
+
+    def test_flipping_and_clearing_a_vote(self):
+        interactions.set_vote(self.problem.pk, self.bob.pk, 1)
+        self.assertEqual(interactions.set_vote(self.problem.pk, self.bob.pk, -1), (0, 1))
+        self.assertEqual(ProblemRating.objects.get(problem=self.problem, user=self.bob).vote, -1)
+        self.assertEqual(interactions.set_vote(self.problem.pk, self.bob.pk, 0), (0, 0))
+        self.assertFalse(ProblemRating.objects.filter(problem=self.problem).exists())
+        # Clearing a vote that isn't there changes nothing
+        self.assertEqual(interactions.set_vote(self.problem.pk, self.bob.pk, 0), (0, 0))
+        self.assertEqual(self.counters(), (0, 0, 0))
+
+    def test_vote_moves_the_detail_page_version(self):
+        version = Problem.objects.get(pk=self.problem.pk).version
+        interactions.set_vote(self.problem.pk, self.bob.pk, 1)
+        self.assertGreater(Problem.objects.get(pk=self.problem.pk).version, version)
+
+    def test_toggle_favorite(self):
+        self.assertEqual(interactions.toggle_favorite(self.problem.pk, self.bob.pk), (True, 1))
+        self.assertEqual(interactions.toggle_favorite(self.problem.pk, self.alice.pk), (True, 2))
+        self.assertEqual(interactions.toggle_favorite(self.problem.pk, self.bob.pk), (False, 1))
+        self.assertEqual(self.counters(), (0, 0, 1))
+        self.assertEqual(list(FavoriteProblem.objects.values_list('user_id', flat=True)), [self.alice.pk])
+
+    def test_batch_sets_favorites_idempotently(self):
+        other = make_problem(self.alice, title='Three Sum')
+        results = interactions.apply_batch(self.bob.pk, votes=[(self.problem.pk, -1)],
+                                           favorites=[(self.problem.pk, True), (other.pk, True)])
+        self.assertEqual(results[self.problem.pk],
+                         {'likes': 0, 'dislikes': 1, 'user_vote': -1, 'is_favorited': True, 'favorites': 1})
+        self.assertEqual(results[other.pk], {'is_favorited': True, 'favorites': 1})
+        # Setting what is already set, or removing what isn't there, is a no-op
+        results = interactions.apply_batch(self.bob.pk, favorites=[(self.problem.pk, True), (other.pk, False),
+                                                                   (other.pk, False)])
+        self.assertEqual(results[self.problem.pk]['favorites'], 1)
+        self.assertEqual(results[other.pk], {'is_favorited': False, 'favorites': 0})
+
+    def test_batch_with_a_missing_problem_changes_nothing(self):
+        with self.assertRaises(interactions.ProblemNotFound):
+            interactions.apply_batch(self.bob.pk, votes=[(self.problem.pk, 1), (self.problem.pk + 1000, 1)])
+        self.assertEqual(self.counters(), (0, 0, 0))
+        self.assertFalse(ProblemRating.objects.exists())
+
+    def test_batch_endpoint_rejects_out_of_range_numbers(self):
+        self.client.force_login(self.bob)
+        for body in ({'votes': [{'problem': 1e400, 'vote': 1}]}, {'votes': [{'problem': self.problem.pk, 'vote': 1e400}]},
+                     {'favorites': [{'problem': 2 ** 63, 'favorited': True}]}, {'votes': [{'problem': 0, 'vote': 1}]},
+                     {'votes': [{'problem': -1, 'vote': 1}]}):
+            response = self.client.post(reverse('batch_interactions'), json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertEqual(self.counters(), (0, 0, 0))
+        response = self.client.post(reverse('batch_interactions'), json.dumps({'votes': [{'problem': 2 ** 63 - 1, 'vote': 1}]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_orm_deletes_keep_the_counters(self):
+        interactions.set_vote(self.problem.pk, self.bob.pk, 1)
+        interactions.set_vote(self.problem.pk, self.alice.pk, -1)
+        interactions.toggle_favorite(self.problem.pk, self.bob.pk)
+        # A user deleted in the admin takes their rows along through the cascade
+        self.bob.delete()
+        self.assertEqual(self.counters(), (0, 1, 0))
+
+
+# --- Query indexes (see index_advisor) ---
+
+class IndexAdvisorTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.problem = make_problem(self.alice)
+        self.problem.tags.add(Tag.objects.create(name='arrays'))
+        interactions.set_vote(self.problem.pk, self.alice.pk, 1)
+        interactions.toggle_favorite(self.problem.pk, self.alice.pk)
+        Solution.objects.create(problem=self.problem, created_by=self.alice, code='pass\n')
+
+    def test_view_queries_use_indexes(self):
+        out = io.StringIO()
+        call_command('index_advisor', stdout=out)
+        flagged = [line for line in out.getvalue().splitlines() if line.startswith('[FULL SCAN]')]
+        # The list shows every problem, and a substring search can't seek an index
+        self.assertEqual(flagged, ['[FULL SCAN] problem_list: every problem', '[FULL SCAN] problem_list: title search'])
+        self.assertIn('2 of 13 queries use a full scan', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('index_advisor', fail_on_scan=True, stdout=io.StringIO())
+
+    @plain_static
+    def test_covers_the_problem_list_queries(self):
+        planned = dict(index_advisor.view_queries(self.problem, self.alice))
+        self.client.force_login(self.alice)
+        for name, params in (('every problem', {}), ('title search', {'q': 'Two'}), ('tag filter', {'tags': 'arrays'}),
+                             ('liked filter', {'liked': 'true'}), ('favorited filter', {'favorited': 'true'})):
+            with CaptureQueriesContext(connection) as planned_queries:
+                list(planned[f'problem_list: {name}'])
+            with CaptureQueriesContext(connection) as view_queries:
+                self.assertEqual(self.client.get(reverse('problem_list'), params).status_code, 200)
+            self.assertIn(planned_queries[0]['sql'], [query['sql'] for query in view_queries], name)
+
+    def test_full_scans(self):
+        with mock.patch.object(index_advisor.connection, 'vendor', 'sqlite'):
+            self.assertEqual(index_advisor.full_scans(
+                'SCAN problems_problem\nSEARCH problems_solution USING INDEX solution_problem_user_idx (problem_id=?)\n'
+                'SCAN problems_solution USING INDEX solution_problem_recent_idx'
+            ), ['SCAN problems_problem'])
+        with mock.patch.object(index_advisor.connection, 'vendor', 'postgresql'):
+            self.assertEqual(index_advisor.full_scans('Limit\n  ->  Seq Scan on problems_problem\n  ->  Index Scan'),
+                             ['->  Seq Scan on problems_problem'])
+
+    def test_needs_data(self):
+        Problem.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command('index_advisor', stdout=io.StringIO())
+
+
+# --- Judge-bound async views (see views.submit_solution, views.create_problem) ---
+
+def fake_judge(answer):
+    """Patch the judge to answer ``answer`` for every case, without Docker."""
+    async def iter_code_async(code, test_cases, input_vars, language='python', **limits):
+        for test_case in test_cases:
+            result = judge.evaluate_test_case(test_case, f'RESULT_SEPARATOR:{json.dumps(answer)}\n')
+            result['time_ms'] = 5
+            yield result
+    return mock.patch.object(judge, 'iter_code_async', iter_code_async)
+
+
+def add_cases(problem, *cases):
+    for (a, b), expected in cases:
+        ProblemTestCase.objects.create(problem=problem, input_value={'a': a, 'b': b}, expected_output=expected)
+
+
+@plain_static
+@mock.patch.object(events, 'record_results')
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        caches['judge'].clear()
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.problem = make_problem(self.alice, input_vars=[{'name': 'a', 'type': 'int'}, {'name': 'b', 'type': 'int'}],
+                                    return_type='int')
+        add_cases(self.problem, ((1, 2), 3), ((2, 1), 3))
+        self.url = reverse('problem_detail', args=[self.problem.pk])
+
+    async def post(self, action, code='def solution(a, b):\n    return 3\n'):
+        await self.async_client.aforce_login(self.bob)
+        return await self.async_client.post(self.url, {'code': code, action: '1'})
+
+    async def test_page_view_stays_conditional(self, record_results):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('ETag'))
+
+    async def test_run(self, record_results):
+        with fake_judge(3):
+            response = await self.post('run')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['verdict'] for result in response.context['results']], ['accepted', 'accepted'])
+        self.assertTrue(response.context['all_tests_passed'])
+        self.assertTrue(await self.problem.attempted_by.filter(pk=self.bob.pk).aexists())
+        self.assertFalse(await Solution.objects.filter(created_by=self.bob).aexists())
+        self.assertEqual(record_results.call_args.args[2], events.RUN)
+
+    async def test_accepted_submit(self, record_results):
+        with fake_judge(3):
+            response = await self.post('submit')
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+        solution = await Solution.objects.select_related('code_blob').aget(created_by=self.bob)
+        self.assertEqual((solution.verdict, solution.code), ('accepted', 'def solution(a, b):\n    return 3'))
+        self.assertTrue(await self.problem.solved_by.filter(pk=self.bob.pk).aexists())
+        self.assertEqual(record_results.call_args.args[2], events.SUBMIT)
+        user_stats = await UserStats.objects.aget(pk=self.bob.pk)
+        self.assertEqual((user_stats.submissions, user_stats.accepted_submissions), (1, 1))
+
+    async def test_failed_submit(self, record_results):
+        with fake_judge(4):
+            response = await self.post('submit')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['error'], 'Solution failed some test cases.')
+        self.assertFalse(await Solution.objects.filter(created_by=self.bob).aexists())
+        self.assertFalse(await self.problem.solved_by.filter(pk=self.bob.pk).aexists())
+
+    async def test_problem_limits_reach_the_judge(self, record_results):
+        await Problem.objects.filter(pk=self.problem.pk).aupdate(time_limit_ms=1500, memory_limit_mb=64)
+        limits = []
+
+        async def iter_code_async(code, test_cases, input_vars, language='python', **kwargs):
+            limits.append((kwargs['time_limit'], kwargs['mem_limit']))
+            for test_case in test_cases:
+                yield {**judge.evaluate_test_case(test_case, 'RESULT_SEPARATOR:3\n'), 'time_ms': 5}
+
+        with mock.patch.object(judge, 'iter_code_async', iter_code_async):
+            await self.post('run')
+            await self.post('submit')
+        self.assertEqual(limits, [(1.5, 64 * 1024 * 1024)] * 2)
+
+    async def test_empty_code(self, record_results):
+        response = await self.post('run', code='  ')
+        self.assertEqual(response.context['error'], 'Please enter code to run or submit.')
+        record_results.assert_not_called()
+
+    async def test_throttled(self, record_results):
+        busy = admission.Throttled("The judge is busy, retry in 4 s.", 4, 503)
+        with mock.patch.object(admission, 'acquire', side_effect=busy):
+            response = await self.post('run')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '4')
+        self.assertEqual(response.context['error'], str(busy))
+
+    async def test_anonymous_submit_goes_to_login(self, record_results):
+        response = await self.async_client.post(reverse('submit_solution', args=[self.problem.pk]),
+                                                {'code': 'pass', 'submit': '1'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(settings.LOGIN_URL, response['Location'])
+
+    def create_post(self, action):
+        return {
+            'title': 'Add', 'description': 'Add them.', 'difficulty': 'easy', 'comparison': 'auto',
+            'time_limit_ms': 2000, 'memory_limit_mb': 128,
+            'solution_code': 'def solution(a: int, b: int) -> int:\n    return a + b\n',
+            'input_vars': json.dumps([{'name': 'a', 'type': 'int'}, {'name': 'b', 'type': 'int'}]),
+            'return_type': 'int', 'new_tags': 'math, easy-wins', 'form-TOTAL_FORMS': '2',
+            'form-0-param_a': '1', 'form-0-param_b': '2', 'form-0-expected_output': '3',
+            'form-1-param_a': '2', 'form-1-param_b': '1', 'form-1-expected_output': '3',
+            action: '1',
+        }
+
+    async def test_create_problem(self, record_results):
+        await self.async_client.aforce_login(self.bob)
+        with fake_judge(3):
+            response = await self.async_client.post(reverse('create_problem'), self.create_post('save'))
+        problem = await Problem.objects.aget(title='Add')
+        self.assertRedirects(response, reverse('problem_detail', args=[problem.pk]), fetch_redirect_response=False)
+        self.assertEqual(problem.created_by_id, self.bob.pk)
+        self.assertEqual(await problem.test_cases.acount(), 2)
+        self.assertEqual(sorted([tag.name async for tag in problem.tags.all()]), ['easy-wins', 'math'])
+
+    async def test_create_problem_run_leaves_the_session_alone(self, record_results):
+        await self.async_client.aforce_login(self.bob)
+        with fake_judge(3):
+            response = await self.async_client.post(reverse('create_problem'), self.create_post('run'))
+        self.assertEqual([result['verdict'] for result in response.context['results']], ['accepted', 'accepted'])
+        # The results are only rendered; nothing is written to the session
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    async def test_create_problem_needs_a_passing_reference(self, record_results):
+        await self.async_client.aforce_login(self.bob)
+        with fake_judge(4):
+            response = await self.async_client.post(reverse('create_problem'), self.create_post('save'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('must pass', response.context['error'])
+        self.assertFalse(await Problem.objects.filter(title='Add').aexists())
+
+
+# --- Streamed results (see views.stream_solution) ---
+
+def parse_events(body):
+    """[(event, data)] of a text/event-stream body."""
+    parsed = []
+    for block in body.decode().split('\n\n'):
+        if block:
+            event, data = block.split('\n')
+            parsed.append((event.removeprefix('event: '), json.loads(data.removeprefix('data: '))))
+    return parsed
+
+
+@mock.patch.object(events, 'record_results')
+class StreamSolutionTests(TestCase):
+    def setUp(self):
+        caches['judge'].clear()
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.problem = make_problem(self.alice, input_vars=[{'name': 'a', 'type': 'int'}, {'name': 'b', 'type': 'int'}],
+                                    return_type='int')
+        add_cases(self.problem, ((1, 2), 3), ((2, 1), 3), ((0, 0), 0))
+        self.url = reverse('stream_solution', args=[self.problem.pk])
+
+    async def stream(self, action='run', code='def solution(a, b):\n    return 3\n'):
+        await self.async_client.aforce_login(self.bob)
+        return await self.async_client.post(self.url, {'code': code, 'action': action})
+
+    async def read(self, response):
+        return parse_events(b''.join([chunk async for chunk in response.streaming_content]))
+
+    async def held_slots(self):
+        return [index for index in range(admission.MAX_CONCURRENT)
+                if await caches['judge'].aget(f'judge:slot:{index}') is not None]
+
+    async def test_event_sequence(self, record_results):
+        with fake_judge(3):
+            response = await self.stream()
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            self.assertEqual(response['Cache-Control'], 'no-cache')
+            self.assertEqual(await self.held_slots(), [0])
+            sent = await self.read(response)
+        self.assertEqual([event for event, _ in sent], ['case', 'case', 'case', 'summary'])
+        self.assertEqual([data['index'] for _, data in sent[:3]], [0, 1, 2])
+        self.assertEqual([data['verdict'] for _, data in sent[:3]], ['accepted', 'accepted', 'wrong_answer'])
+        summary = sent[-1][1]
+        self.assertEqual((summary['total'], summary['passed'], summary['all_passed'], summary['accepted']),
+                         (3, 2, False, False))
+        self.assertEqual(await self.held_slots(), [])
+        self.assertTrue(await self.problem.attempted_by.filter(pk=self.bob.pk).aexists())
+
+    async def test_accepted_submit(self, record_results):
+        await ProblemTestCase.objects.filter(expected_output=0).adelete()
+        with fake_judge(3):
+            sent = await self.read(await self.stream('submit'))
+        self.assertTrue(sent[-1][1]['accepted'])
+        self.assertTrue(await self.problem.solved_by.filter(pk=self.bob.pk).aexists())
+        self.assertEqual(record_results.call_args.args[2], events.SUBMIT)
+
+    async def test_client_gone_before_the_stream_started(self, record_results):
+        with fake_judge(3):
+            response = await self.stream()
+            # What the ASGI handler does when the client disconnects
+            await sync_to_async(response.close)()
+        self.assertEqual(await self.held_slots(), [])
+
+    async def test_client_gone_mid_stream(self, record_results):
+        with fake_judge(3):
+            response = await self.stream()
+            content = response.streaming_content
+            self.assertEqual(parse_events(await anext(content))[0][0], 'case')
+            await sync_to_async(response.close)()
+        self.assertEqual(await self.held_slots(), [])
+        record_results.assert_not_called()
+
+    async def test_docker_unavailable(self, record_results):
+        with mock.patch.dict(os.environ, {'DOCKER_HOST': 'unix:///nonexistent/docker.sock'}):
+            sent = await self.read(await self.stream())
+        self.assertEqual(sent[0], ('case', {'error': judge.DOCKER_UNAVAILABLE, 'index': 0}))
+        self.assertEqual((sent[-1][0], sent[-1][1]['passed'], sent[-1][1]['all_passed']), ('summary', 0, False))
+        self.assertEqual(await self.held_slots(), [])
+
+    async def test_throttled(self, record_results):
+        with mock.patch.object(admission, 'acquire', side_effect=admission.Throttled("Slow down", 7, 429)):
+            response = await self.stream()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '7')
+        self.assertEqual(response.json(), {'error': 'Slow down', 'retry_after': 7})
+
+    async def test_slot_released_when_setup_fails(self, record_results):
+        with mock.patch('problems.views.mark_attempted', side_effect=RuntimeError("database went away")):
+            with self.assertRaises(RuntimeError):
+                await self.stream()
+        self.assertEqual(await self.held_slots(), [])
+
+    async def test_bad_requests(self, record_results):
+        await self.async_client.aforce_login(self.bob)
+        self.assertEqual((await self.async_client.get(self.url)).status_code, 400)
+        self.assertEqual((await self.stream(code='')).status_code, 400)
+        await ProblemTestCase.objects.all().adelete()
+        self.assertEqual((await self.stream()).json(), {'error': 'No test cases defined for this problem.'})
+        self.assertEqual(await self.held_slots(), [])
+
+
+# --- User statistics (see stats.py) ---
+
+class UserStatsTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.easy = make_problem(self.alice, title='Easy one')
+        self.medium = make_problem(self.alice, title='Medium one', difficulty='medium')
+        self.hard = make_problem(self.alice, title='Hard one', difficulty='hard')
+
+    def counts(self, user):
+        row = UserStats.objects.filter(pk=user.pk).first()
+        return (row.solved_easy, row.solved_medium, row.solved_hard, row.attempted) if row else None
+
+    def test_record_solve_and_unsolve(self):
+        day = timezone.now()
+        stats.record_solve(self.bob.pk, ['easy', 'hard', 'bogus'], when=day - timedelta(days=2))
+        stats.record_solve(self.bob.pk, ['easy'], when=day - timedelta(days=1))
+        stats.record_solve(self.bob.pk, ['medium'], when=day - timedelta(days=1))
+        row = UserStats.objects.get(pk=self.bob.pk)
+        self.assertEqual((row.solved_easy, row.solved_medium, row.solved_hard), (2, 1, 1))
+        self.assertEqual((row.current_streak, row.longest_streak), (2, 2))
+        self.assertEqual(stats.current_streak(row, timezone.localdate(day)), 2)
+        self.assertEqual(stats.current_streak(row, timezone.localdate(day + timedelta(days=1))), 0)
+
+        stats.record_unsolve(self.bob.pk, ['hard', 'hard', 'easy'])
+        self.assertEqual(self.counts(self.bob)[:3], (1, 1, 0))
+        # Nothing to take back from a user without stats
+        stats.record_unsolve(self.alice.pk, ['easy'])
+        self.assertIsNone(self.counts(self.alice))
+
+    def test_advance_streak(self):
+        day = timezone.localdate()
+        self.assertEqual(stats.advance_streak(0, 0, None, day), (1, 1, day))
+        self.assertEqual(stats.advance_streak(3, 5, day, day), (3, 5, day))
+        self.assertEqual(stats.advance_streak(3, 3, day - timedelta(days=1), day), (4, 4, day))
+        self.assertEqual(stats.advance_streak(3, 5, day - timedelta(days=2), day), (1, 5, day))
+        # An older solve (a rejudge of history) leaves the streak alone
+        self.assertEqual(stats.advance_streak(3, 5, day, day - timedelta(days=4)), (3, 5, day))
+
+    def test_solved_by_in_both_directions(self):
+        self.easy.solved_by.add(self.bob)
+        self.bob.solved_problems.add(self.medium, self.hard)
+        self.easy.attempted_by.add(self.bob, self.alice)
+        self.assertEqual(self.counts(self.bob), (1, 1, 1, 1))
+        self.assertEqual(self.counts(self.alice), (0, 0, 0, 1))
+        self.bob.solved_problems.remove(self.hard)
+        self.medium.solved_by.remove(self.bob)
+        self.assertEqual(self.counts(self.bob), (1, 0, 0, 1))
+
+    def test_removing_what_is_not_there(self):
+        self.easy.solved_by.add(self.bob)
+        self.easy.attempted_by.add(self.bob)
+        self.medium.solved_by.remove(self.bob)
+        self.bob.solved_problems.remove(self.hard, self.easy, self.medium)
+        self.easy.attempted_by.remove(self.alice)
+        self.assertEqual(self.counts(self.bob), (0, 0, 0, 1))
+        self.bob.attempted_problems.remove(self.easy, self.hard)
+        self.assertEqual(self.counts(self.bob), (0, 0, 0, 0))
+
+    def test_clear_in_both_directions(self):
+        self.easy.solved_by.add(self.bob, self.alice)
+        self.bob.solved_problems.add(self.hard)
+        self.easy.attempted_by.add(self.bob)
+        self.hard.attempted_by.add(self.bob)
+        self.easy.solved_by.clear()
+        self.assertEqual(self.counts(self.bob), (0, 0, 1, 2))
+        self.assertEqual(self.counts(self.alice), (0, 0, 0, 0))
+        self.bob.solved_problems.clear()
+        self.bob.attempted_problems.clear()
+        self.assertEqual(self.counts(self.bob), (0, 0, 0, 0))
+
+    def test_difficulty_edit_moves_the_counts(self):
+        self.easy.solved_by.add(self.bob, self.alice)
+        self.easy.difficulty = 'hard'
+        self.easy.save()
+        self.assertEqual(self.counts(self.bob)[:3], (0, 0, 1))
+        self.assertEqual(self.counts(self.alice)[:3], (0, 0, 1))
+        # Saves that don't touch the difficulty don't move anything
+        self.easy.title = 'Renamed'
+        self.easy.save()
+        self.easy.save(update_fields=['title'])
+        self.assertEqual(self.counts(self.bob)[:3], (0, 0, 1))
+
+    def test_rebuild_matches_the_incremental_counts(self):
+        for user, problems in ((self.bob, [self.easy, self.hard]), (self.alice, [self.medium])):
+            for problem in problems:
+                problem.attempted_by.add(user)
+                Solution.objects.create(problem=problem, created_by=user, code='pass\n')
+                stats.record_submission(user.pk, True)
+                problem.solved_by.add(user)
+            stats.record_submission(user.pk, False)
+        self.hard.attempted_by.add(self.alice)
+        self.medium.difficulty = 'easy'
+        self.medium.save()
+        # A rejudge turned this one down
+        rejected = Solution.objects.create(problem=self.medium, created_by=self.bob, code='pass\n', verdict='wrong_answer')
+        self.medium.attempted_by.add(rejected.created_by)
+        stats.record_submission(self.bob.pk, False)
+
+        fields = ['solved_easy', 'solved_medium', 'solved_hard', 'attempted', 'submissions', 'accepted_submissions',
+                  'current_streak', 'longest_streak', 'last_solved_on']
+        incremental = list(UserStats.objects.order_by('pk').values_list(*fields))
+        call_command('rebuild_user_stats', stdout=io.StringIO())
+        self.assertEqual(list(UserStats.objects.order_by('pk').values_list(*fields)), incremental)
+
+
+# --- Leaderboards (see leaderboards.py) ---
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.users = [make_user(f'user{i}') for i in range(5)]
+        self.problems = [make_problem(self.users[0], title=f'Problem {i}', difficulty=difficulty)
+                         for i, difficulty in enumerate(['easy', 'easy', 'medium', 'hard'])]
+
+    def solve(self, user, *indexes):
+        for index in indexes:
+            self.problems[index].solved_by.add(user)
+
+    def assertConsistent(self, board):
+        """Bucket ranks agree with the entries, and with a board built from scratch."""
+        entries = list(LeaderboardEntry.objects.filter(board=board).values_list('user_id', 'score', 'reached_at'))
+        scores = [score for _, score, _ in entries]
+        for user_id, score, _ in entries:
+            self.assertEqual(leaderboards.rank(board, user_id),
+                             (1 + sum(other > score for other in scores), score))
+        buckets = sorted(LeaderboardBucket.objects.filter(board=board).values_list('score', 'users', 'rank'))
+        self.assertEqual(leaderboards.board_size(board), len(entries))
+
+        leaderboards.replace_board(board, {user_id: (score, when) for user_id, score, when in entries})
+        self.assertEqual(sorted(LeaderboardBucket.objects.filter(board=board).values_list('score', 'users', 'rank')),
+                         buckets)
+
+    def test_ranks_with_ties(self):
+        alice, bob, carol, dave, _ = self.users
+        self.solve(alice, 0, 1, 2)
+        self.solve(bob, 0, 1)
+        self.solve(carol, 0, 1)
+        self.solve(dave, 3)
+        self.assertEqual(leaderboards.rank(leaderboards.OVERALL, alice.pk), (1, 3))
+        self.assertEqual(leaderboards.rank(leaderboards.OVERALL, bob.pk), (2, 2))
+        self.assertEqual(leaderboards.rank(leaderboards.OVERALL, carol.pk), (2, 2))
+        self.assertEqual(leaderboards.rank(leaderboards.OVERALL, dave.pk), (4, 1))
+        self.assertIsNone(leaderboards.rank(leaderboards.OVERALL, self.users[4].pk))
+        self.assertEqual(leaderboards.rank(leaderboards.difficulty_board('easy'), dave.pk), None)
+        self.assertEqual(leaderboards.rank(leaderboards.difficulty_board('hard'), dave.pk), (1, 1))
+        # Ties are listed by who got there first
+        self.assertEqual([(entry.user, entry.rank) for entry in leaderboards.top(leaderboards.OVERALL)],
+                         [(alice, 1), (bob, 2), (carol, 2), (dave, 4)])
+        for board in (leaderboards.OVERALL, leaderboards.difficulty_board('easy'), '7d'):
+            self.assertConsistent(board)
+
+    def test_unsolves(self):
+        alice, bob, carol, _, _ = self.users
+        self.solve(alice, 0, 1, 2)
+        self.solve(bob, 0, 1)
+        self.solve(carol, 0)
+        self.problems[1].solved_by.remove(alice)
+        self.assertEqual(leaderboards.rank(leaderboards.OVERALL, alice.pk), (1, 2))
+        self.assertEqual(leaderboards.rank(leaderboards.OVERALL, bob.pk), (1, 2))
+        self.problems[0].solved_by.clear()
+        self.assertEqual(leaderboards.rank(leaderboards.OVERALL, alice.pk), (1, 1))
+        self.assertIsNone(leaderboards.rank(leaderboards.OVERALL, carol.pk))
+        bob.solved_problems.remove(self.problems[1])
+        self.assertIsNone(leaderboards.rank(leaderboards.OVERALL, bob.pk))
+        self.assertEqual(leaderboards.board_size(leaderboards.OVERALL), 1)
+        for board in (leaderboards.OVERALL, leaderboards.difficulty_board('easy'), '30d'):
+            self.assertConsistent(board)
+
+    def test_deleting_a_problem_or_user(self):
+        alice, bob, carol, _, _ = self.users
+        self.solve(alice, 0, 2)
+        self.solve(bob, 0, 1, 2)
+        self.solve(carol, 2)
+        self.problems[2].attempted_by.add(alice, carol)
+        self.problems[0].attempted_by.add(alice)
+        self.problems[2].delete()
+        self.assertEqual(leaderboards.rank(leaderboards.OVERALL, bob.pk), (1, 2))
+        # The materialized stats lose the cascaded solves and attempts too
+        self.assertEqual(UserStats.objects.filter(pk=alice.pk).values_list('solved_easy', 'solved_medium', 'attempted')
+                         .get(), (1, 0, 1))
+        self.assertEqual(UserStats.objects.filter(pk=carol.pk).values_list('solved_medium', 'attempted').get(), (0, 0))
+        self.assertIsNone(leaderboards.rank(leaderboards.OVERALL, carol.pk))
+        leaderboards.remove_user(bob.pk)
+        self.assertFalse(LeaderboardEntry.objects.filter(user=bob).exists())
+        self.assertEqual(leaderboards.rank(leaderboards.OVERALL, alice.pk), (1, 1))
+        self.assertConsistent(leaderboards.OVERALL)
+
+    def test_difficulty_and_tag_edits(self):
+        alice, bob, _, _, _ = self.users
+        arrays, graphs = Tag.objects.create(name='arrays'), Tag.objects.create(name='graphs')
+        self.problems[0].tags.add(arrays)
+        self.solve(alice, 0, 1)
+        self.solve(bob, 0)
+        easy, hard = leaderboards.difficulty_board('easy'), leaderboards.difficulty_board('hard')
+
+        self.problems[0].difficulty = 'hard'
+        self.problems[0].save()
+        self.assertEqual(leaderboards.rank(easy, alice.pk), (1, 1))
+        self.assertIsNone(leaderboards.rank(easy, bob.pk))
+        self.assertEqual(leaderboards.rank(hard, bob.pk), (1, 1))
+        self.assertEqual(leaderboards.rank(leaderboards.OVERALL, alice.pk), (1, 2))
+
+        self.problems[0].tags.remove(arrays, graphs)
+        self.assertEqual(leaderboards.board_size(leaderboards.tag_board(arrays.pk)), 0)
+        self.problems[1].tags.add(graphs)
+        self.assertEqual(leaderboards.rank(leaderboards.tag_board(graphs.pk), alice.pk), (1, 1))
+        graphs.problem_set.add(self.problems[0])
+        self.assertEqual(leaderboards.rank(leaderboards.tag_board(graphs.pk), alice.pk), (1, 2))
+        self.problems[1].tags.clear()
+        self.assertEqual(leaderboards.rank(leaderboards.tag_board(graphs.pk), alice.pk), (1, 1))
+        graphs_board = leaderboards.tag_board(graphs.pk)
+        graphs.delete()
+        self.assertEqual(leaderboards.board_size(graphs_board), 0)
+        for board in (leaderboards.OVERALL, easy, hard, leaderboards.tag_board(arrays.pk)):
+            self.assertConsistent(board)
+
+    @plain_static
+    def test_page_rejects_unknown_boards(self):
+        arrays = Tag.objects.create(name='arrays')
+        for board in ('overall', '7d', 'difficulty:easy', leaderboards.tag_board(arrays.pk)):
+            self.assertEqual(self.client.get(reverse('leaderboard'), {'board': board}).status_code, 200)
+        for board in ('tag:abc', 'tag:-1', 'tag:99999999999999999999', leaderboards.tag_board(arrays.pk + 1),
+                      'difficulty:impossible', 'weekly'):
+            self.assertEqual(self.client.get(reverse('leaderboard'), {'board': board}).status_code, 404)
+
+    @plain_static
+    def test_page_number_is_clamped(self):
+        self.solve(self.users[0], 0)
+        for page, expected in (('99999999999999999999', 1), ('-3', 1), ('two', 1), ('1', 1)):
+            response = self.client.get(reverse('leaderboard'), {'page': page})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual((response.context['page'], len(response.context['entries'])), (expected, 1))
+        with mock.patch.object(leaderboards, 'PAGE_SIZE', 1):
+            self.solve(self.users[1], 0)
+            response = self.client.get(reverse('leaderboard'), {'page': '99999999999999999999'})
+            self.assertEqual(response.context['page'], 2)
+            self.assertEqual([entry.user for entry in response.context['entries']], [self.users[1]])
+            self.assertFalse(response.context['has_next'])
+
+
+# --- Judging output (see judge.py) ---
+
+def make_case(expected, return_type='str', comparison='auto'):
+    return SimpleNamespace(input_value='{"a": 1}', expected_output=expected, return_type=return_type,
+                           comparison=comparison)
+
+
+def make_output(text, exit_code=0, **status):
+    output = judge.OutputCollector()
+    output.feed(text)
+    output.exit_code = exit_code
+    for name, value in status.items():
+        setattr(output, name, value)
+    return output
+
+
+class ComparatorTests(TestCase):
+    def test_normalizes_declared_types(self):
+        self.assertTrue(judge.comparator_for('int')('3', 3))
+        self.assertTrue(judge.comparator_for('int')(3.0, '3'))
+        self.assertFalse(judge.comparator_for('int')(3, 4))
+        self.assertTrue(judge.comparator_for('bool')('True', True))
+        self.assertTrue(judge.comparator_for('str')([1, 2], '[1, 2]'))
+
+    def test_auto_picks_float_for_floats(self):
+        self.assertTrue(judge.comparator_for('float')(0.1 + 0.2, 0.3))
+        self.assertTrue(judge.comparator_for('float')('2', 2))
+        self.assertFalse(judge.comparator_for('float')(0.3001, 0.3))
+        self.assertFalse(judge.comparator_for('list')([0.1 + 0.2], [0.3]))
+        self.assertTrue(judge.comparator_for('list', 'float')([0.1 + 0.2, {'x': 1}], [0.3, {'x': 1.0}]))
+
+    def test_unordered_and_multiset(self):
+        unordered = judge.comparator_for('list', 'unordered')
+        multiset = judge.comparator_for('list', 'multiset')
+        self.assertTrue(unordered([[2, 1], {'a': 1}], [{'a': 1}, [2, 1]]))
+        self.assertTrue(unordered([1, 1, 2], [2, 1]))
+        self.assertFalse(multiset([1, 1, 2], [2, 1]))
+        self.assertTrue(multiset([1, 2, 1], [1, 1, 2]))
+        self.assertFalse(unordered([[1, 2]], [[2, 1]]))
+        self.assertFalse(multiset('12', [1, 2]))
+
+    def test_unknown_mode_falls_back_to_exact(self):
+        self.assertTrue(judge.comparator_for('list', 'bogus')([1, 2], [1, 2]))
+        self.assertFalse(judge.comparator_for('list', 'bogus')([1, 2], [2, 1]))
+
+    def test_parse_expected(self):
+        self.assertEqual(judge.parse_expected('[1, 2]'), [1, 2])
+        self.assertEqual(judge.parse_expected([1, 2]), [1, 2])
+        self.assertEqual(judge.parse_expected('hello'), 'hello')
+        self.assertIsNone(judge.parse_expected(None))
+
+
+class OutputCollectorTests(TestCase):
+    def test_result_split_across_chunks(self):
+        output = judge.OutputCollector()
+        for chunk in ('debug li', 'ne\nRESULT_SEP', 'ARATOR:[1, ', '2]\n', 'after'):
+            output.feed(chunk)
+        output.close()
+        self.assertEqual(output.result, b'[1, 2]')
+        self.assertEqual(output.console, ['debug line', 'after'])
+
+    def test_marker_after_unterminated_print(self):
+        # print(..., end="") in the solution, then the wrapper's result line
+        code = judge.build_wrapper_code('def solution(a):\n    print("no newline", end="")\n    return a\n',
+                                        make_case(1), [{'name': 'a', 'type': 'int'}])
+        self.assertIn('print("\\nRESULT_SEPARATOR:"', code)
+        output = judge.OutputCollector()
+        output.feed('no newline\nRESULT_SEPARATOR:1\n')
+        output.close()
+        self.assertEqual(output.result, b'1')
+        self.assertEqual(output.console_text, 'no newline')
+
+    def test_console_is_capped(self):
+        output = judge.OutputCollector(console_limit=20)
+        output.feed('x' * 15 + '\n' + 'y' * 15 + '\n' + 'z\n')
+        output.close()
+        self.assertTrue(output.console_truncated)
+        self.assertLessEqual(sum(len(line) for line in output.console), 20)
+        self.assertIn('truncated at 20 bytes', output.console_text)
+
+    def test_overlong_console_line_is_dropped_not_buffered(self):
+        output = judge.OutputCollector(console_limit=100, result_limit=10)
+        output.feed('a' * 50)
+        output.feed('a' * 50 + '\nRESULT_SEPARATOR:"ok"\n')
+        output.close()
+        self.assertEqual(output.result, b'"ok"')
+        self.assertFalse(output.full)
+
+    def test_overlong_result_fills_the_collector(self):
+        output = judge.OutputCollector(result_limit=10)
+        output.feed('RESULT_SEPARATOR:' + '1' * 20)
+        output.feed('\nignored\n')
+        self.assertTrue(output.full)
+        self.assertIsNone(output.result)
+        result = judge.evaluate_test_case(make_case('1'), output)
+        self.assertEqual(result['verdict'], 'wrong_answer')
+        self.assertIn('larger than 10 bytes', result['actual'])
+
+
+class VerdictTests(TestCase):
+    def test_accepted_and_wrong_answer(self):
+        accepted = judge.evaluate_test_case(make_case(3, 'int'), make_output('RESULT_SEPARATOR:3\n'))
+        self.assertEqual((accepted['verdict'], accepted['passed'], accepted['status']), ('accepted', True, 'Passed'))
+        wrong = judge.evaluate_test_case(make_case('[1, 2]', 'list'), 'RESULT_SEPARATOR:[2, 1]\n')
+        self.assertEqual((wrong['verdict'], wrong['actual']), ('wrong_answer', '[2, 1]'))
+
+    def test_how_the_run_ended_comes_first(self):
+        result = 'RESULT_SEPARATOR:3\n'
+        cases = [
+            (make_output(result, timed_out=True), 'time_limit'),
+            (make_output(result, exit_code=137, oom_killed=True), 'memory_limit'),
+            (make_output('Traceback\nMemoryError\n', exit_code=1), 'memory_limit'),
+            (make_output('Traceback\nZeroDivisionError\n', exit_code=1), 'runtime_error'),
+            (make_output('no result line\n'), 'runtime_error'),
+        ]
+        for output, verdict in cases:
+            self.assertEqual(judge.evaluate_test_case(make_case(3, 'int'), output)['verdict'], verdict)
+
+    def test_verdict_for(self):
+        passed = {'passed': True, 'verdict': 'accepted'}
+        self.assertEqual(judge.verdict_for([passed, passed], 2), 'accepted')
+        self.assertEqual(judge.verdict_for([passed, {'passed': False, 'verdict': 'time_limit'},
+                                            {'passed': False, 'verdict': 'wrong_answer'}], 3), 'time_limit')
+        # A run that stopped before every case reported
+        self.assertEqual(judge.verdict_for([passed], 2), 'wrong_answer')
+        self.assertEqual(judge.verdict_for([{'passed': False}], 1), 'error')
+
+
+class FakeDocker(judge.AsyncDockerClient):
+    """The Engine API calls of run_container, answered in memory: the container exits with ``status``, None for never."""
+
+    def __init__(self, status, state=None, logs=''):
+        super().__init__()
+        self.status, self.state, self.logs = status, state or {}, logs
+        self.calls = []
+        self.created = None
+
+    async def request(self, method, path, params=None, body=None, timeout=None):
+        self.calls.append((method, path, timeout))
+        if path == '/containers/create':
+            self.created = body
+            return 201, b'{"Id": "c1"}'
+        if path.endswith('/wait'):
+            if self.status is None:
+                raise asyncio.TimeoutError
+            return 200, json.dumps({'StatusCode': self.status}).encode()
+        if path.endswith('/json'):
+            return 200, json.dumps({'State': self.state}).encode()
+        return 204, b''
+
+    async def stream_logs(self, container_id, output, timeout=None):
+        output.feed(self.logs)
+        return output
+
+
+class JudgeLimitsTests(TestCase):
+    def test_problem_limits(self):
+        problem = make_problem(make_user('alice'), time_limit_ms=1500, memory_limit_mb=64)
+        self.assertEqual(problem.judge_limits, {'time_limit': 1.5, 'mem_limit': 64 * 1024 * 1024})
+        problem.time_limit_ms = 50
+        with self.assertRaises(ValidationError) as caught:
+            problem.full_clean()
+        self.assertIn('time_limit_ms', caught.exception.message_dict)
+
+    def test_wrapper_stops_itself_at_the_time_limit(self):
+        code = judge.build_wrapper_code('def solution(a):\n    print("started")\n    while True:\n        pass\n',
+                                        make_case(1), [{'name': 'a', 'type': 'int'}], time_limit=0.2)
+        run = subprocess.run([sys.executable, '-c', code], capture_output=True, timeout=10)
+        self.assertEqual(run.returncode, judge.TIME_LIMIT_EXIT)
+        result = judge.evaluate_test_case(make_case(1, 'int'), make_output(run.stdout, exit_code=run.returncode))
+        self.assertEqual(result['verdict'], 'time_limit')
+        self.assertIn('started', result['console_logs'])
+
+    async def test_oom_kill_is_memory_limit(self):
+        client = FakeDocker(137, state={'OOMKilled': True})
+        output = await client.run_container(['python'], mem_limit=64 * 1024 * 1024, time_limit=1)
+        self.assertEqual(client.created['HostConfig']['Memory'], 64 * 1024 * 1024)
+        self.assertTrue(output.oom_killed)
+        self.assertEqual(judge.evaluate_test_case(make_case(3, 'int'), output)['verdict'], 'memory_limit')
+
+    async def test_startup_does_not_count_against_the_limit(self):
+        client = FakeDocker(None)
+        output = await client.run_container(['python'], time_limit=1)
+        self.assertIn(('POST', '/containers/c1/wait', 1 + judge.JUDGE_START_TIMEOUT), client.calls)
+        self.assertIn(('POST', '/containers/c1/kill', None), client.calls)
+        self.assertTrue(output.timed_out)
+        self.assertEqual(judge.evaluate_test_case(make_case(3, 'int'), output)['verdict'], 'time_limit')
+
+
+def run_harness(argv):
+    """judge_harness.main in-process, printing to fd 1 as in the container; returns its output lines."""
+    sys.stdout.flush()
+    with tempfile.TemporaryFile() as captured:
+        saved = os.dup(1)
+        os.dup2(captured.fileno(), 1)
+        try:
+            # The forked cases write through sys.stdout/sys.stderr onto fds 1 and 2
+            with open(1, 'w', closefd=False) as stdout, open(2, 'w', closefd=False) as stderr, \
+                    contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                judge_harness.main(argv)
+        finally:
+            os.dup2(saved, 1)
+            os.close(saved)
+        captured.seek(0)
+        return captured.read().splitlines(keepends=True)
+
+
+class HarnessDocker(FakeDocker):
+    """Runs each judge image container in-process: its logs are what judge_harness.main prints.
+
+    ``lines`` replaces the logs of every container; ``cut_after`` ends them
+    after that many lines, like a harness that died.
+    """
+
+    def __init__(self, lines=None, cut_after=None):
+        super().__init__(0)
+        self.lines, self.cut_after = lines, cut_after
+        self.commands = []
+
+    async def follow_logs(self, container_id):
+        command = self.created['Cmd']
+        self.commands.append(command)
+        lines = run_harness(command[2:]) if self.lines is None else self.lines
+        for line in lines[:self.cut_after]:
+            yield line
+
+
+HARNESS_CODE = '''\
+def solution(a):
+    if a == 2:
+        raise ValueError("bad input")
+    if a == 3:
+        while True:
+            pass
+    if a == 4:
+        return len(bytearray(10 ** 9))
+    return a
+'''
+
+
+def harness_case(a, expected=None):
+    return SimpleNamespace(input_value=json.dumps({'a': a}), expected_output=expected if expected is not None else a,
+                           return_type='int', comparison='auto')
+
+
+class HarnessTests(TestCase):
+    input_vars = [{'name': 'a', 'type': 'int'}]
+
+    def judge(self, client, cases, **options):
+        async def run():
+            return [result async for result in judge.iter_harness_async(
+                client, HARNESS_CODE, cases, self.input_vars, options.pop('time_limit', 0.3), 16 * 1024 * 1024, **options)]
+        return asyncio.run(run())
+
+    def test_case_records(self):
+        options = json.dumps({'time_limit': 0.3, 'mem_limit': 16 * 1024 * 1024})
+        lines = run_harness(['judge_harness', options, HARNESS_CODE, '{"a": 1}', '{"a": 2}', '{"a": 3}'])
+        marker = judge_harness.CASE_MARKER.encode()
+        self.assertTrue(all(line.startswith(marker) for line in lines))
+        records = [json.loads(line[len(marker):]) for line in lines]
+        self.assertEqual([record['case'] for record in records], [0, 1, 2])
+        passed, failed, looped = records
+        self.assertEqual((passed['exit_code'], passed['timed_out']), (0, False))
+        self.assertIn(b'RESULT_SEPARATOR:1', base64.b64decode(passed['output']))
+        self.assertEqual(failed['exit_code'], 1)
+        self.assertIn(b'ValueError: bad input', base64.b64decode(failed['output']))
+        self.assertEqual((looped['timed_out'], looped['oom_killed']), (True, False))
+        self.assertGreaterEqual(looped['time_ms'], 300)
+
+    def test_verdicts(self):
+        results = self.judge(HarnessDocker(), [harness_case(1), harness_case(1, 5), harness_case(2), harness_case(3),
+                                               harness_case(4)])
+        self.assertEqual([result['verdict'] for result in results],
+                         ['accepted', 'wrong_answer', 'runtime_error', 'time_limit', 'memory_limit'])
+        # RLIMIT_AS turns the allocation into a MemoryError in the child
+        self.assertIn('MemoryError', results[-1]['console_logs'])
+
+    def test_judge_image_and_memory_headroom(self):
+        client = HarnessDocker()
+        self.judge(client, [harness_case(1)])
+        self.assertEqual(client.created['Image'], judge.harness_image())
+        self.assertEqual(client.created['HostConfig']['Memory'], 16 * 1024 * 1024 + judge.HARNESS_MEMORY_HEADROOM)
+        self.assertIn(('DELETE', '/containers/c1', None), client.calls)
+
+    def test_batches_stay_under_the_arguments_budget(self):
+        cases = [harness_case(1), harness_case(10), harness_case(100), harness_case(1000), harness_case(10000)]
+        budget = len(HARNESS_CODE.encode()) + len('{"a": 100}') * 2
+        with mock.patch.object(judge, 'HARNESS_ARGS_BUDGET', budget):
+            batches = judge.harness_batches(HARNESS_CODE, cases, self.input_vars)
+            self.assertEqual([len(batch) for batch, _ in batches], [2, 1, 1, 1])
+            for _, arguments in batches:
+                self.assertLessEqual(len(HARNESS_CODE.encode()) + sum(len(a.encode()) for a in arguments), budget)
+            client = HarnessDocker()
+            results = self.judge(client, cases)
+        self.assertEqual(len(client.commands), 4)
+        self.assertEqual([result['actual'] for result in results], ['1', '10', '100', '1000', '10000'])
+
+    def test_judge_stopped_fills_in_the_rest(self):
+        results = self.judge(HarnessDocker(cut_after=1), [harness_case(1), harness_case(1), harness_case(1)])
+        self.assertTrue(results[0]['passed'])
+        self.assertEqual(results[1:], [{'error': "The judge stopped before running this case", 'time_ms': 0}] * 2)
+
+    def test_harness_failure_is_reported(self):
+        client = HarnessDocker(lines=[b'Traceback (most recent call last):\n', b'ImportError: no judge_harness\n'])
+        results = self.judge(client, [harness_case(1)])
+        self.assertEqual(results, [{'error': "The judge failed: ImportError: no judge_harness", 'time_ms': 0}])
+
+    def test_fail_fast(self):
+        client = HarnessDocker()
+        results = self.judge(client, [harness_case(1), harness_case(2), harness_case(1)], fail_fast=True)
+        self.assertEqual([result['verdict'] for result in results], ['accepted', 'runtime_error'])
+
+    def test_harness_result(self):
+        record = {'case': 0, 'exit_code': 137, 'timed_out': False, 'oom_killed': True, 'time_ms': 12,
+                  'output': base64.b64encode(b'RESULT_SEPARATOR:1\n').decode()}
+        result = judge.harness_result(harness_case(1), record)
+        self.assertEqual((result['verdict'], result['time_ms']), ('memory_limit', 12))
+
+
+# --- Rejudging (see management/commands/rejudge.py) ---
+
+def local_judge(calls, fail_after=None):
+    """Patch the judge to run solutions in-process; after ``fail_after`` solutions Docker goes away."""
+    async def iter_code_async(code, test_cases, input_vars, language='python', **limits):
+        calls.append(code)
+        if fail_after is not None and len(calls) > fail_after:
+            yield {'error': judge.DOCKER_UNAVAILABLE}
+            return
+        namespace = {}
+        exec(code, namespace)
+        for test_case in test_cases:
+            inputs = test_case.input_value
+            answer = namespace['solution'](**(json.loads(inputs) if isinstance(inputs, str) else inputs))
+            yield {**judge.evaluate_test_case(test_case, f'RESULT_SEPARATOR:{json.dumps(answer)}\n'), 'time_ms': 5}
+    return mock.patch.object(judge, 'iter_code_async', iter_code_async)
+
+
+class RejudgeTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = make_user('alice'), make_user('bob'), make_user('carol')
+        self.problem = make_problem(self.alice, input_vars=[{'name': 'a', 'type': 'int'}, {'name': 'b', 'type': 'int'}],
+                                    return_type='int')
+        add_cases(self.problem, ((1, 2), 3), ((2, 1), 3))
+        self.fixed = Solution.objects.create(problem=self.problem, created_by=self.bob, verdict='wrong_answer',
+                                             code='def solution(a, b):\n    return a + b\n')
+        self.broken = Solution.objects.create(problem=self.problem, created_by=self.carol,
+                                              code='def solution(a, b):\n    return a * 2\n')
+        self.problem.solved_by.add(self.carol)
+        self.other = make_problem(self.bob, title='Echo', input_vars=[{'name': 'a', 'type': 'int'}, {'name': 'b', 'type': 'int'}],
+                                  return_type='int')
+        add_cases(self.other, ((1, 1), 1))
+        self.unchanged = Solution.objects.create(problem=self.other, created_by=self.alice,
+                                                 code='def solution(a, b):\n    return a\n')
+        self.other.solved_by.add(self.alice)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.checkpoint = os.path.join(directory, 'checkpoint.json')
+
+    def rejudge(self, *args, **options):
+        call_command('rejudge', *args, checkpoint=self.checkpoint, stdout=io.StringIO(), **options)
+
+    def version(self, problem):
+        return Problem.objects.get(pk=problem.pk).version
+
+    def user_version(self, user):
+        return ContentVersion.objects.filter(key=versioning.user_key(user.pk)).values_list('version', flat=True).first() or 0
+
+    def test_verdicts_and_solves(self):
+        before = self.version(self.other), self.user_version(self.alice)
+        calls = []
+        with local_judge(calls):
+            self.rejudge()
+        self.assertEqual(len(calls), 3)
+        verdicts = dict(Solution.objects.values_list('pk', 'verdict'))
+        self.assertEqual([verdicts[s.pk] for s in (self.fixed, self.broken, self.unchanged)],
+                         ['accepted', 'wrong_answer', 'accepted'])
+        self.assertEqual(set(self.problem.solved_by.all()), {self.bob})
+        # Only judged_at changed for alice's solution, but its pages show that too
+        after = self.version(self.other), self.user_version(self.alice)
+        self.assertGreater(after[0], before[0])
+        self.assertGreater(after[1], before[1])
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_dry_run_writes_nothing(self):
+        with local_judge([]):
+            self.rejudge(dry_run=True)
+        self.assertEqual(Solution.objects.get(pk=self.fixed.pk).verdict, 'wrong_answer')
+        self.assertEqual(set(self.problem.solved_by.all()), {self.carol})
+
+    def test_resume_after_docker_went_away(self):
+        calls = []
+        with local_judge(calls, fail_after=1), self.assertRaisesMessage(CommandError, judge.DOCKER_UNAVAILABLE):
+            self.rejudge(batch_size=1)
+        with open(self.checkpoint) as f:
+            checkpoint = json.load(f)
+        self.assertEqual((checkpoint['last_id'], checkpoint['done']), (self.fixed.pk, 1))
+        # The first batch is committed
+        self.assertEqual(set(self.problem.solved_by.all()), {self.bob, self.carol})
+
+        with self.assertRaisesMessage(CommandError, 'different filters'):
+            self.rejudge(resume=True, problem=[self.problem.pk])
+        calls = []
+        with local_judge(calls):
+            self.rejudge(resume=True, batch_size=1)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(set(self.problem.solved_by.all()), {self.bob})
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    @mock.patch.dict(os.environ, {'JUDGE_HARNESS': '0'})
+    def test_judge_failures_keep_the_verdict(self):
+        class HangingDocker(FakeDocker):
+            # The daemon stops answering while carol's solution is being judged
+            async def request(self, method, path, params=None, body=None, timeout=None):
+                if path == '/containers/create' and 'a * 2' in body['Cmd'][-1]:
+                    raise asyncio.TimeoutError
+                return await super().request(method, path, params, body, timeout)
+
+        # Stored the way create_problem stores them
+        for test_case in ProblemTestCase.objects.filter(problem=self.problem):
+            test_case.input_value = json.dumps(test_case.input_value)
+            test_case.save()
+        stderr = io.StringIO()
+        with mock.patch.object(judge, 'AsyncDockerClient', lambda: HangingDocker(0, logs='RESULT_SEPARATOR:3\n')):
+            call_command('rejudge', problem=[self.problem.pk], checkpoint=self.checkpoint, stdout=io.StringIO(),
+                         stderr=stderr)
+        self.assertEqual(Solution.objects.get(pk=self.broken.pk).verdict, 'accepted')
+        self.assertEqual(Solution.objects.get(pk=self.fixed.pk).verdict, 'accepted')
+        self.assertEqual(set(self.problem.solved_by.all()), {self.bob, self.carol})
+        self.assertIn(f'Solution {self.broken.pk} was not judged: The judge did not answer in time', stderr.getvalue())
+        self.assertIn(f'--solution {self.broken.pk}', stderr.getvalue())
+
+
+# --- Similar problems (see similarity.py) ---
+
+class SimilarityTests(TestCase):
+    def setUp(self):
+        self.random = random.Random(7)
+        self.users = [make_user(f'solver{i}') for i in range(8)]
+        self.tags = [Tag.objects.create(name=f'tag{i}') for i in range(5)]
+        self.problems = [make_problem(self.users[0], title=f'Problem {i}') for i in range(12)]
+        for problem in self.problems:
+            problem.tags.add(*self.random.sample(self.tags, self.random.randint(0, 3)))
+            problem.solved_by.add(*self.random.sample(self.users, self.random.randint(0, 5)))
+        similarity.write(similarity.build_index())
+
+    def assertIndexIsExact(self):
+        index = similarity.build_index()
+        self.assertEqual(similarity._stored(list(index)), index)
+
+    def test_refresh_matches_a_rebuild(self):
+        self.assertIndexIsExact()
+        for _ in range(15):
+            problem = self.random.choice(self.problems)
+            if self.random.random() < 0.5:
+                tag = self.random.choice(self.tags)
+                change = problem.tags.remove if problem.tags.filter(pk=tag.pk).exists() else problem.tags.add
+                change(tag)
+            else:
+                user = self.random.choice(self.users)
+                change = problem.solved_by.remove if problem.solved_by.filter(pk=user.pk).exists() else problem.solved_by.add
+                change(user)
+            similarity.refresh([problem.pk])
+            self.assertIndexIsExact()
+
+    def test_refresh_of_several_problems_at_once(self):
+        self.problems[0].tags.set(self.tags)
+        self.problems[1].tags.clear()
+        self.problems[2].solved_by.set(self.users)
+        similarity.refresh([problem.pk for problem in self.problems[:3]])
+        self.assertIndexIsExact()
+
+    def test_queued_changes(self):
+        SimilarityRefresh.objects.all().delete()
+        self.problems[3].tags.set(self.tags[:2])
+        self.users[1].solved_problems.add(self.problems[4])
+        self.assertTrue(SimilarityRefresh.objects.filter(problem=self.problems[3]).exists())
+        similarity.refresh_queued()
+        self.assertFalse(SimilarityRefresh.objects.exists())
+        self.assertIndexIsExact()
+
+
+class SimilarityMergeTests(TestCase):
+    def entries(self, *scores):
+        # Neighbour ids 10, 11, ... in rank order
+        return [(score, 0.0, 0, 10 + i) for i, score in enumerate(scores)]
+
+    def test_new_neighbour_enters_a_full_list(self):
+        merged = similarity._merge(self.entries(6, 5, 4, 3, 2, 1), 99, (3.5, 0.0, 0, 99))
+        self.assertEqual([entry[3] for entry in merged], [10, 11, 12, 99, 13, 14])
+
+    def test_new_neighbour_below_a_full_list(self):
+        entries = self.entries(6, 5, 4, 3, 2, 1)
+        self.assertEqual(similarity._merge(entries, 99, (0.5, 0.0, 0, 99)), entries)
+
+    def test_neighbour_moves_within_a_full_list(self):
+        merged = similarity._merge(self.entries(6, 5, 4, 3, 2, 1), 14, (5.5, 0.0, 0, 14))
+        self.assertEqual([entry[3] for entry in merged], [10, 14, 11, 12, 13, 15])
+
+    def test_neighbour_dropping_off_a_full_list_needs_a_recompute(self):
+        entries = self.entries(6, 5, 4, 3, 2, 1)
+        # What ranks seventh isn't stored
+        self.assertIsNone(similarity._merge(entries, 12, (0.5, 0.0, 0, 12)))
+        self.assertIsNone(similarity._merge(entries, 12, (0.0, 0.0, 0, 12)))
+
+    def test_short_list(self):
+        entries = self.entries(3, 2)
+        self.assertEqual(similarity._merge(entries, 10, (0.0, 0.0, 0, 10)), entries[1:])
+        self.assertEqual([entry[3] for entry in similarity._merge(entries, 99, (0.1, 0.0, 0, 99))], [10, 11, 99])
+
+    def test_ties_go_to_the_older_problem(self):
+        merged = similarity._merge(self.entries(2, 1), 5, (2, 0.0, 0, 5))
+        self.assertEqual([entry[3] for entry in merged], [5, 10, 11])
+
+
+# --- Copy detection (see fingerprints.py) ---
+
+ORIGINAL = '''
+def solution(nums, target):
+    seen = {}
+    for index, value in enumerate(nums):
+        wanted = target - value
+        if wanted in seen:
+            return [seen[wanted], index]
+        seen[value] = index
+    # Nothing adds up
+    return []
+'''
+# The same code with other names, numbers, strings and comments
+RENAMED = '''
+def solution(nums, target):
+    lookup = {}
+    for i, n in enumerate(nums):
+        need = target - n  # what's left
+        if need in lookup:
+            return [lookup[need], i]
+        lookup[n] = i
+    return []
+'''
+UNRELATED = '''
+def solution(nums, target):
+    nums = sorted(range(len(nums)), key=lambda i: nums[i])
+    low, high = 0, len(nums) - 1
+    while low < high:
+        total = nums[low] + nums[high]
+        if total == target:
+            break
+        low, high = (low + 1, high) if total < target else (low, high - 1)
+    return sorted([low, high]) if low < high else []
+'''
+
+
+class FingerprintTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.carol = make_user('carol')
+        self.problem = make_problem(self.alice)
+
+    def submit(self, user, code):
+        solution = Solution.objects.create(problem=self.problem, created_by=user, code=code)
+        return solution, fingerprints.index_solution(solution)
+
+    def test_renaming_does_not_hide_a_copy(self):
+        self.assertEqual(fingerprints.normalized_tokens('total = count + 1'),
+                         fingerprints.normalized_tokens('s = n + 42  # comment'))
+        original = fingerprints.fingerprint(ORIGINAL)
+        self.assertGreaterEqual(len(original), fingerprints.MIN_FINGERPRINTS)
+        self.assertEqual(fingerprints.fingerprint(RENAMED), original)
+        self.assertLess(len(original & fingerprints.fingerprint(UNRELATED)), len(original) / 2)
+
+    def test_thresholds(self):
+        small = fingerprints.MIN_FINGERPRINTS - 1
+        self.assertEqual(fingerprints.similarity(small, small, 100), 0.0)
+        self.assertEqual(fingerprints.similarity(8, 10, 20), 0.8)
+        self.assertIsNone(fingerprints.make_match(1, 2, 3, 7, 10, 10))
+        match = fingerprints.make_match(1, 5, 3, 8, 10, 10)
+        self.assertEqual((match.solution_id, match.other_id, match.similarity, match.shared), (3, 5, 0.8, 8))
+
+    def test_copies_by_other_users_are_matched(self):
+        first, matches = self.submit(self.alice, ORIGINAL)
+        self.assertEqual(matches, 0)
+        self.assertEqual(self.submit(self.carol, UNRELATED)[1], 0)
+        copy, matches = self.submit(self.bob, RENAMED)
+        self.assertEqual(matches, 1)
+        match = SolutionMatch.objects.get()
+        self.assertEqual((match.solution_id, match.other_id, match.similarity), (first.pk, copy.pk, 1.0))
+        self.assertEqual([cluster['solution_ids'] for cluster in fingerprints.clusters(self.problem.pk)],
+                         [{first.pk, copy.pk}])
+
+    def test_resubmitting_your_own_code_is_not_copying(self):
+        self.submit(self.alice, ORIGINAL)
+        self.assertEqual(self.submit(self.alice, RENAMED)[1], 0)
+        self.assertFalse(SolutionMatch.objects.exists())
+
+    def test_reindexing_replaces_old_matches(self):
+        self.submit(self.alice, ORIGINAL)
+        copy, _ = self.submit(self.bob, RENAMED)
+        copy.code = UNRELATED
+        copy.save()
+        self.assertEqual(fingerprints.index_solution(copy), 0)
+        self.assertFalse(SolutionMatch.objects.exists())
+
+    def test_indexing_agrees_with_the_backfill(self):
+        for user, code in ((self.alice, ORIGINAL), (self.bob, RENAMED), (self.carol, UNRELATED),
+                           (self.carol, ORIGINAL), (self.alice, RENAMED)):
+            self.submit(user, code)
+
+        def snapshot():
+            return (sorted(SolutionFingerprint.objects.values_list('solution_id', 'hash')),
+                    sorted(SolutionMatch.objects.values_list('solution_id', 'other_id', 'shared')))
+        indexed = snapshot()
+        call_command('backfill_fingerprints', rebuild=True, stdout=io.StringIO())
+        self.assertEqual(snapshot(), indexed)
+        # Every pair of the four copies except alice's two
+        self.assertEqual(len(indexed[1]), 5)
+
+    def test_saving_schedules_indexing_after_commit(self):
+        with mock.patch.object(fingerprints, '_executor') as executor:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                solution = Solution.objects.create(problem=self.problem, created_by=self.bob, code=ORIGINAL)
+            executor.submit.assert_not_called()
+            for callback in callbacks:
+                callback()
+        executor.submit.assert_called_once_with(fingerprints._index_in_background, solution.pk)
+
+
+# --- Admission control (see admission.py) ---
+
+class AdmissionTests(TestCase):
+    def setUp(self):
+        caches['judge'].clear()
+        admission._local.clear()
+
+    async def fill_slots(self):
+        return [await admission.acquire(f'user:{i}') for i in range(admission.MAX_CONCURRENT)]
+
+    async def test_token_bucket(self):
+        for _ in range(admission.BUCKET_SIZE):
+            await admission.release(await admission.acquire('user:1'))
+        with self.assertRaises(admission.Throttled) as caught:
+            await admission.acquire('user:1')
+        self.assertEqual(caught.exception.status, 429)
+        self.assertEqual(caught.exception.retry_after, math.ceil(1 / admission.REFILL_PER_SECOND))
+        # Other clients have their own bucket
+        await admission.release(await admission.acquire('user:2'))
+
+    @mock.patch.object(admission, 'MAX_WAIT', 0.3)
+    async def test_busy_judge_sheds_runs(self):
+        slots = await self.fill_slots()
+        self.assertEqual(len({key for key, _ in slots}), admission.MAX_CONCURRENT)
+        with self.assertRaises(admission.Throttled) as caught:
+            await admission.acquire('user:extra')
+        self.assertEqual(caught.exception.status, 503)
+        self.assertGreaterEqual(caught.exception.retry_after, 1)
+
+        await admission.release(slots.pop())
+        slots.append(await admission.acquire('user:extra'))
+        for slot in slots:
+            await admission.release(slot)
+
+    @mock.patch.object(admission, 'MAX_WAIT', 2)
+    async def test_waiting_run_gets_a_released_slot(self):
+        slots = await self.fill_slots()
+        waiting = asyncio.ensure_future(admission.acquire('user:extra'))
+        await asyncio.sleep(0.2)
+        self.assertEqual(await caches['judge'].aget('judge:waiting'), 1)
+        await admission.release(slots[3])
+        self.assertEqual((await waiting)[0], slots[3][0])
+        self.assertEqual(await caches['judge'].aget('judge:waiting'), 0)
+
+    @mock.patch.object(admission, 'MAX_WAITING', 0)
+    async def test_shed_runs_keep_their_token(self):
+        slots = await self.fill_slots()
+        for _ in range(admission.BUCKET_SIZE * 2):
+            with self.assertRaises(admission.Throttled) as caught:
+                await admission.acquire('user:extra')
+            self.assertEqual(caught.exception.status, 503)
+        await admission.release(slots.pop())
+        for _ in range(admission.BUCKET_SIZE):
+            await admission.release(await admission.acquire('user:extra'))
+        with self.assertRaises(admission.Throttled) as caught:
+            await admission.acquire('user:extra')
+        self.assertEqual(caught.exception.status, 429)
+
+    @mock.patch.object(admission, 'MAX_WAITING', 0)
+    async def test_full_queue_sheds_at_once(self):
+        await self.fill_slots()
+        with self.assertRaises(admission.Throttled) as caught:
+            await admission.acquire('user:extra')
+        self.assertEqual(caught.exception.status, 503)
+        self.assertEqual(await caches['judge'].aget('judge:waiting'), 0)
+
+    async def test_stale_lease_does_not_release_another_run(self):
+        first = await admission.acquire('user:1')
+        # The first run's lease expired and another run took the slot
+        await caches['judge'].adelete(first[0])
+        second = await admission.acquire('user:2')
+        self.assertEqual(second[0], first[0])
+        await admission.release(first)
+        self.assertEqual(await caches['judge'].aget(second[0]), second[1])
+        await admission.release(second)
+        self.assertIsNone(await caches['judge'].aget(second[0]))
+
+    @mock.patch.object(admission, 'SLOT_LEASE', 0.4)
+    @mock.patch.object(admission, 'SLOT_RENEW_EVERY', 0.1)
+    async def test_long_run_keeps_its_slot(self):
+        key, lease = await admission.acquire('user:1')
+        await asyncio.sleep(1)
+        self.assertEqual(await caches['judge'].aget(key), lease)
+        await admission.release((key, lease))
+
+    async def test_queue_depth_is_never_negative(self):
+        self.assertEqual(await admission._queue_depth(1), 1)
+        # The count expired while a run was waiting
+        await caches['judge'].adelete('judge:waiting')
+        self.assertEqual(await admission._queue_depth(-1), 0)
+        self.assertEqual(await admission._queue_depth(1), 1)
+        self.assertEqual(await admission._queue_depth(-1), 0)
+
+    async def test_slot_stream_releases_its_slot(self):
+        async def events():
+            yield b'one'
+            yield b'two'
+
+        slot = await admission.acquire('user:1')
+        self.assertEqual([item async for item in admission.SlotStream(events(), slot)], [b'one', b'two'])
+        self.assertIsNone(await caches['judge'].aget(slot[0]))
+
+        # A response closed before it was ever iterated
+        slot = await admission.acquire('user:1')
+        await sync_to_async(admission.SlotStream(events(), slot).close)()
+        self.assertIsNone(await caches['judge'].aget(slot[0]))
+
+
+# --- Read replica (see routers.py) ---
+
+@plain_static
+class ReplicaRouterTests(TransactionTestCase):
+    """A second in-memory SQLite database stands in for the replica; sync_replica() plays sync_sqlite_replica.
+
+    The alias only exists while these tests run, so nothing else is routed to it.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # connections.settings is settings.DATABASES
+        connections.settings[routers.REPLICA_ALIAS] = {
+            **connections.settings['default'], 'NAME': 'file:memorydb_replica?mode=memory&cache=shared',
+        }
+        # The test case only lets 'default' ensure_connection(); open the replica directly
+        connections[routers.REPLICA_ALIAS].connect()
+
+    @classmethod
+    def tearDownClass(cls):
+        # close() keeps in-memory databases open; close the sqlite3 connection itself
+        connections[routers.REPLICA_ALIAS].connection.close()
+        del connections[routers.REPLICA_ALIAS]
+        del connections.settings[routers.REPLICA_ALIAS]
+        super().tearDownClass()
+
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.problem = make_problem(self.alice, title='Copied Problem')
+        self.sync_replica()
+
+    def sync_replica(self):
+        connections['default'].ensure_connection()
+        connections['default'].connection.backup(connections[routers.REPLICA_ALIAS].connection)
+
+    def reads_from(self, request, model=Problem):
+        return routers.use_replica(lambda request: router.db_for_read(model))(request)
+
+    def test_use_replica_views_read_from_the_replica(self):
+        fresh = make_problem(self.alice, title='Fresh Problem')
+        page = self.client.get(reverse('problem_list')).content.decode()
+        self.assertIn('Copied Problem', page)
+        self.assertNotIn('Fresh Problem', page)
+        # Views without @use_replica read the primary
+        self.assertContains(self.client.get(reverse('problem_detail', args=[fresh.pk])), 'Fresh Problem')
+        self.sync_replica()
+        self.assertIn('Fresh Problem', self.client.get(reverse('problem_list')).content.decode())
+
+    def test_pin_cookie_and_writes_force_the_primary(self):
+        factory = RequestFactory()
+        self.assertEqual(self.reads_from(factory.get('/')), routers.REPLICA_ALIAS)
+        self.assertEqual(self.reads_from(factory.head('/')), routers.REPLICA_ALIAS)
+        self.assertEqual(self.reads_from(factory.post('/')), 'default')
+        pinned = factory.get('/')
+        pinned.COOKIES[routers.PIN_COOKIE] = '1'
+        self.assertEqual(self.reads_from(pinned), 'default')
+        # Outside a use_replica view everything reads the primary
+        self.assertEqual(router.db_for_read(Problem), 'default')
+
+        response = self.client.post(reverse('login'), {'username': 'alice', 'password': 'pw'})
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        make_problem(self.alice, title='Fresh Problem')
+        self.assertIn('Fresh Problem', self.client.get(reverse('problem_list')).content.decode())
+
+    def test_sessions_users_and_validators_stay_on_the_primary(self):
+        request = RequestFactory().get('/')
+        for model in (Session, User, ContentVersion):
+            self.assertEqual(self.reads_from(request, model), 'default')
+        self.assertEqual(self.reads_from(request, Tag), routers.REPLICA_ALIAS)
+
+    def test_writes_never_reach_the_replica(self):
+        routers.use_replica(lambda request: Tag.objects.create(name='arrays'))(RequestFactory().get('/'))
+        self.assertTrue(Tag.objects.filter(name='arrays').exists())
+        self.assertFalse(Tag.objects.using(routers.REPLICA_ALIAS).filter(name='arrays').exists())
+        self.assertEqual(router.db_for_write(Problem), 'default')
+        self.assertFalse(router.allow_migrate(routers.REPLICA_ALIAS, 'problems'))
+
+    def test_stale_replica_keeps_a_new_user_logged_in(self):
+        bob = make_user('bob')
+        self.client.force_login(bob)
+        self.client.cookies.pop(routers.PIN_COOKIE, None)
+        self.assertFalse(User.objects.using(routers.REPLICA_ALIAS).filter(username='bob').exists())
+        self.assertContains(self.client.get(reverse('problem_list')), 'Welcome, bob')
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'bob')
+
+
+# --- Sessions (see sessions.py) ---
+
+@override_settings(PROFILE_SAMPLE_RATE=1, PROFILE_LOG=None)
+class SessionMetricsTests(TestCase):
+    def test_session_writes_show_in_server_timing(self):
+        make_user('alice')
+        response = self.client.post(reverse('login'), {'username': 'alice', 'password': 'pw'})
+        self.assertRegex(response['Server-Timing'], r'session;desc="[1-9]\d* writes, [1-9]\d* bytes"')
+        # A request that doesn't change the session writes nothing
+        response = self.client.get(reverse('search_suggestions'), {'q': 'tw'})
+        self.assertNotIn('session', response['Server-Timing'])
+
+
+# --- Search box type-ahead (see autocomplete.py) ---
+
+def suggest(index, query, limit=autocomplete.DEFAULT_LIMIT):
+    return [label for _, _, label, _ in index.search(query, limit)]
+
+
+class PrefixIndexTests(TestCase):
+    def setUp(self):
+        self.index = autocomplete.PrefixIndex([
+            (autocomplete.PROBLEM, 1, 'Two Sum', 50),
+            (autocomplete.PROBLEM, 2, 'Three Sum Closest', 20),
+            (autocomplete.PROBLEM, 3, 'Summary Ranges', 20),
+            (autocomplete.PROBLEM, 4, 'Café Orders', 5),
+            (autocomplete.PROBLEM, 5, 'Two-Pointer Tricks', 1),
+            (autocomplete.TAG, 1, 'two-pointers', 7),
+            (autocomplete.TAG, 2, 'Dynamic Programming', 30),
+        ])
+
+    def test_prefix_matching(self):
+        # Case, accents and punctuation don't matter
+        self.assertEqual(suggest(self.index, 'TWO SU'), ['Two Sum'])
+        self.assertEqual(suggest(self.index, 'cafe'), ['Café Orders'])
+        self.assertEqual(suggest(self.index, 'two pointer'), ['two-pointers', 'Two-Pointer Tricks'])
+        # Any word start matches, the middle of a word doesn't
+        self.assertEqual(suggest(self.index, 'closest'), ['Three Sum Closest'])
+        self.assertEqual(suggest(self.index, 'um'), [])
+        self.assertEqual(suggest(self.index, 'sum closest'), ['Three Sum Closest'])
+        self.assertEqual(suggest(self.index, '  '), [])
+        # Tags come back as tags
+        self.assertEqual(self.index.search('dyn'), [(autocomplete.TAG, 2, 'Dynamic Programming', 30)])
+
+    def test_ranking_and_limit(self):
+        # Most popular first, ties by label
+        self.assertEqual(suggest(self.index, 'sum'), ['Two Sum', 'Summary Ranges', 'Three Sum Closest'])
+        self.assertEqual(suggest(self.index, 'sum', limit=2), ['Two Sum', 'Summary Ranges'])
+        self.index.adjust(autocomplete.PROBLEM, 2, 40)
+        self.assertEqual(suggest(self.index, 'sum', limit=1), ['Three Sum Closest'])
+        # Common prefixes walk the items by popularity instead
+        with mock.patch.object(autocomplete, 'SCAN_LIMIT', 1):
+            self.assertEqual(suggest(self.index, 's'), ['Three Sum Closest', 'Two Sum', 'Summary Ranges'])
+
+    def test_put_and_remove(self):
+        self.assertFalse(self.index.put(autocomplete.PROBLEM, 1, 'Two Sum'))
+        self.assertTrue(self.index.put(autocomplete.PROBLEM, 1, 'Pair Sum'))
+        self.assertEqual(suggest(self.index, 'two'), ['two-pointers', 'Two-Pointer Tricks'])
+        self.assertEqual(suggest(self.index, 'pair'), ['Pair Sum'])
+        self.assertTrue(self.index.put(autocomplete.PROBLEM, 9, 'Two Pair Sum', 3))
+        self.assertEqual(suggest(self.index, 'two p'), ['two-pointers', 'Two Pair Sum', 'Two-Pointer Tricks'])
+        self.assertTrue(self.index.remove(autocomplete.TAG, 1))
+        self.assertFalse(self.index.remove(autocomplete.TAG, 1))
+        self.assertEqual(suggest(self.index, 'two p'), ['Two Pair Sum', 'Two-Pointer Tricks'])
+        self.assertEqual(len(self.index), 7)
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        autocomplete._index = autocomplete._version = None
+        self.addCleanup(setattr, autocomplete, '_index', None)
+        self.alice = make_user('alice')
+        self.problem = make_problem(self.alice, title='Two Sum')
+
+    def version(self):
+        return autocomplete.current_version()
+
+    def test_endpoint(self):
+        make_problem(self.alice, title='Two Pointers')
+        self.problem.solved_by.add(self.alice)
+        tag = Tag.objects.create(name='two-pass')
+        self.problem.tags.add(tag)
+        response = self.client.get(reverse('search_suggestions'), {'q': 'two'})
+        self.assertIn('max-age', response['Cache-Control'])
+        self.assertEqual([(result['type'], result['label']) for result in response.json()['results']],
+                         [('problem', 'Two Sum'), ('tag', 'two-pass'), ('problem', 'Two Pointers')])
+        self.assertEqual(response.json()['results'][0]['url'], reverse('problem_detail', args=[self.problem.pk]))
+        results = self.client.get(reverse('search_suggestions'), {'q': 'two', 'limit': '0'}).json()['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(len(self.client.get(reverse('search_suggestions'), {'q': 'two', 'limit': 'x'}).json()['results']), 3)
+
+    def test_rename_updates_results(self):
+        self.assertEqual(suggest(autocomplete.get_index(), 'two'), ['Two Sum'])
+        self.problem.title = 'Pair Sum'
+        self.problem.save()
+        self.assertEqual(suggest(autocomplete.get_index(), 'two'), [])
+        self.assertEqual(suggest(autocomplete.get_index(), 'pair'), ['Pair Sum'])
+        self.problem.delete()
+        self.assertEqual(suggest(autocomplete.get_index(), 'pair'), [])
+
+    def test_only_label_changes_are_announced(self):
+        # A process without an index compares with the stored label
+        version = self.version()
+        self.problem.description = 'Add them.'
+        self.problem.save()
+        self.problem.difficulty = 'hard'
+        self.problem.save(update_fields=['difficulty'])
+        Tag.objects.create(name='arrays')
+        self.assertEqual(self.version(), version + 1)
+        self.problem.title = 'Pair Sum'
+        self.problem.save()
+        self.assertEqual(self.version(), version + 2)
+        self.assertIsNone(autocomplete._index)
+
+        # ... and one with an index compares with the index
+        autocomplete.get_index()
+        self.problem.save()
+        self.assertEqual(self.version(), version + 2)
+        self.problem.title = 'Two Sum'
+        self.problem.save()
+        self.assertEqual(self.version(), version + 3)
+
+    def test_other_processes_changes_rebuild_the_index(self):
+        index = autocomplete.get_index()
+        # Another process renames the problem: a bare UPDATE plus its announcement
+        Problem.objects.filter(pk=self.problem.pk).update(title='Pair Sum')
+        versioning.bump(autocomplete.INDEX_KEY)
+        self.assertIs(autocomplete.get_index(), index)
+
+        class Inline:
+            def __init__(self, target, **kwargs):
+                self.target = target
+
+            def start(self):
+                self.target()
+
+        with mock.patch.object(autocomplete.threading, 'Thread', Inline):
+            autocomplete._checked_at = 0
+            autocomplete.get_index()
+        self.assertIsNot(autocomplete.get_index(), index)
+        self.assertEqual(suggest(autocomplete.get_index(), 'pair'), ['Pair Sum'])
+
+
+# --- Submission events and rollups (see events.py) ---
+
+class EventRollupTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.problem = make_problem(self.alice)
+        self.other = make_problem(self.alice, title='Three Sum')
+
+    def log(self, problem, user, kind=events.SUBMIT, verdict='accepted', runtime_ms=10, age=60):
+        """An event as the writer thread would have stored it ``age`` seconds ago."""
+        return SubmissionEvent.objects.create(problem=problem, user=user, kind=kind, verdict=verdict,
+                                              runtime_ms=runtime_ms, created_at=timezone.now() - timedelta(seconds=age))
+
+    def fold_all(self, batch_size=events.ROLLUP_BATCH):
+        folded = 0
+        while batch := events.rollup(batch_size):
+            folded += batch
+        return folded
+
+    def snapshot(self):
+        return {stats.problem_id: (stats.runs, stats.submissions, stats.accepted, stats.attempted_users,
+                                   stats.solved_users, stats.runtime_histogram, stats.runtime_p50_ms,
+                                   stats.runtime_p90_ms)
+                for stats in ProblemStats.objects.all()}
+
+    def test_fold_counts(self):
+        self.log(self.problem, self.alice, kind=events.RUN, verdict='wrong_answer', runtime_ms=3)
+        self.log(self.problem, self.alice, verdict='wrong_answer')
+        self.log(self.problem, self.alice, runtime_ms=8)
+        self.log(self.problem, self.bob, runtime_ms=90)
+        self.log(self.problem, self.bob, verdict='runtime_error', runtime_ms=None)
+        self.assertEqual(events.rollup(), 5)
+        stats = ProblemStats.objects.get(problem=self.problem)
+        self.assertEqual((stats.runs, stats.submissions, stats.accepted, stats.attempted_users, stats.solved_users),
+                         (1, 4, 2, 2, 2))
+        self.assertEqual((stats.acceptance_rate, stats.attempts_per_solve), (50.0, 2.0))
+        # Only accepted submissions with a runtime go into the histogram
+        self.assertEqual(sum(stats.runtime_histogram), 2)
+        self.assertEqual(stats.runtime_p50_ms, events.RUNTIME_BUCKETS_MS[events.bucket_of(8)])
+        self.assertEqual(stats.runtime_p90_ms, events.RUNTIME_BUCKETS_MS[events.bucket_of(90)])
+        self.assertFalse(ProblemStats.objects.filter(problem=self.other).exists())
+        self.assertEqual(events.rollup(), 0)
+
+    def test_percentiles(self):
+        self.assertIsNone(events.percentile([0] * 5, 0.5))
+        histogram = [0] * (len(events.RUNTIME_BUCKETS_MS) + 1)
+        for runtime_ms, count in ((1, 5), (10, 4), (100, 1)):
+            histogram[events.bucket_of(runtime_ms)] += count
+        self.assertEqual(events.percentile(histogram, 0.5), 1)
+        self.assertEqual(events.percentile(histogram, 0.9), 10)
+        self.assertEqual(events.percentile(histogram, 1), 100)
+        # Slower than the last bound: reported as the last bound
+        self.assertEqual(events.bucket_of(60000), len(events.RUNTIME_BUCKETS_MS))
+        histogram[-1] = 100
+        self.assertEqual(events.percentile(histogram, 0.9), events.RUNTIME_BUCKETS_MS[-1])
+
+    def test_users_are_counted_once_across_batches(self):
+        self.log(self.problem, self.alice, verdict='wrong_answer')
+        self.log(self.problem, self.alice)
+        self.log(self.problem, self.alice)
+        self.log(self.problem, self.bob, verdict='wrong_answer')
+        self.log(self.problem, self.bob, kind=events.RUN)
+        self.assertEqual(self.fold_all(batch_size=1), 5)
+        stats = ProblemStats.objects.get(problem=self.problem)
+        self.assertEqual((stats.submissions, stats.attempted_users, stats.solved_users), (4, 2, 1))
+
+    def test_recent_events_wait_to_settle(self):
+        self.log(self.problem, self.alice)
+        self.log(self.problem, self.bob, age=0)
+        self.log(self.problem, self.bob, age=60)
+        self.assertEqual(events.rollup(), 1)
+        self.assertEqual(events.rollup(), 0)
+        with mock.patch.object(events, 'SETTLE_SECONDS', -1):
+            self.assertEqual(events.rollup(), 2)
+        self.assertEqual(ProblemStats.objects.get(problem=self.problem).submissions, 3)
+
+    def test_rebuild_matches_the_incremental_rollup(self):
+        rng = random.Random(7)
+        for _ in range(60):
+            self.log(rng.choice([self.problem, self.other]), rng.choice([self.alice, self.bob]),
+                     kind=rng.choice([events.RUN, events.SUBMIT]), verdict=rng.choice(['accepted', 'wrong_answer']),
+                     runtime_ms=rng.randrange(1, 3000))
+        self.assertEqual(self.fold_all(batch_size=7), 60)
+        incremental = self.snapshot()
+        call_command('rollup_events', '--rebuild', stdout=io.StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_cursor_survives_deleting_the_last_problems_folded(self):
+        self.log(self.problem, self.alice)
+        self.log(self.other, self.alice)
+        events.rollup()
+        # Only self.problem's row carries the newest folded id
+        self.log(self.problem, self.bob)
+        events.rollup()
+        self.problem.delete()
+        self.log(self.other, self.alice)
+        self.log(self.other, self.bob)
+        self.assertEqual(events.rollup(), 2)
+        stats = ProblemStats.objects.get(problem=self.other)
+        self.assertEqual((stats.submissions, stats.attempted_users, stats.solved_users), (3, 2, 2))
+        self.assertEqual(events.rollup(), 0)
+
+
+class EventWriterTests(TransactionTestCase):
+    """The writer thread needs its own connection, so these run outside a test transaction."""
+
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.problem = make_problem(self.alice)
+
+    def tearDown(self):
+        with events._lock:
+            events._buffer.clear()
+
+    def wait_for_events(self, count):
+        for _ in range(100):
+            if SubmissionEvent.objects.count() >= count:
+                return
+            time.sleep(0.05)
+        self.fail(f"{count} events never reached the database")
+
+    @mock.patch.object(events, 'FLUSH_SECONDS', 0.05)
+    def test_writer_thread_flushes(self):
+        results = [{'passed': True, 'verdict': 'accepted', 'time_ms': 7},
+                   {'passed': False, 'verdict': 'wrong_answer', 'time_ms': 12}]
+        events.record_results(self.problem.pk, self.alice.pk, events.SUBMIT, results, 2)
+        events.record_results(self.problem.pk, self.alice.pk, events.RUN, results[:1], 1)
+        self.wait_for_events(2)
+        self.assertEqual(list(SubmissionEvent.objects.order_by('pk').values_list('kind', 'verdict', 'runtime_ms')),
+                         [(events.SUBMIT, 'wrong_answer', 12), (events.RUN, 'accepted', 7)])
+        self.assertTrue(events._writer.is_alive())
+
+    def test_failed_flush_keeps_the_events(self):
+        events.record(self.problem.pk, self.alice.pk, events.SUBMIT, 'accepted', 5)
+        with mock.patch.object(SubmissionEvent.objects, 'bulk_create', side_effect=RuntimeError('database is down')):
+            with self.assertRaises(RuntimeError):
+                events.flush()
+        self.assertEqual(events.flush(), 1)
+        self.assertEqual(SubmissionEvent.objects.count(), 1)
+
+    def test_events_of_deleted_problems_are_dropped(self):
+        other = make_problem(self.alice, title='Three Sum')
+        events.record(self.problem.pk, self.alice.pk, events.RUN, 'accepted')
+        events.record(other.pk, self.alice.pk, events.RUN, 'accepted')
+        other.delete()
+        events.flush()
+        self.assertEqual(list(SubmissionEvent.objects.values_list('problem_id', flat=True)), [self.problem.pk])
+        with events._lock:
+            self.assertEqual(events._buffer, [])
+
+
+# --- Code storage (see blobs.py, models.CodeBlob) ---
+
+class CodeBlobTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.problem = make_problem(self.alice)
+
+    def test_encode_round_trip(self):
+        short = 'def solution(a, b):\n    return a + b\n'
+        data, compressed, size = blobs.encode(short)
+        self.assertEqual((data, compressed, size), (short.encode(), False, len(short)))
+        self.assertEqual(blobs.decode(data, compressed), short)
+
+        long = 'def solution(nums):\n' + '    total = sum(nums)  # \u00e9\n' * 50
+        data, compressed, size = blobs.encode(long)
+        self.assertTrue(compressed)
+        self.assertLess(len(data), size)
+        self.assertEqual(size, len(long.encode()))
+        # PostgreSQL returns bytea as a memoryview
+        self.assertEqual(blobs.decode(memoryview(data), compressed), long)
+
+    def test_identical_solutions_share_a_blob(self):
+        code = 'def solution(a, b):\n    return a + b\n' * 20
+        first = Solution.objects.create(problem=self.problem, created_by=self.alice, code=code)
+        second = Solution.objects.create(problem=self.problem, created_by=self.bob, code=code)
+        self.assertEqual(first.code_blob_id, second.code_blob_id)
+        self.assertEqual(CodeBlob.objects.count(), 1)
+        blob = CodeBlob.objects.get()
+        self.assertTrue(blob.compressed)
+        self.assertEqual(Solution.objects.select_related('code_blob').get(pk=second.pk).code, code)
+
+    def test_editing_code_repoints_the_blob(self):
+        first = Solution.objects.create(problem=self.problem, created_by=self.alice, code='# one\n')
+        second = Solution.objects.create(problem=self.problem, created_by=self.bob, code='# one\n')
+        old_blob = first.code_blob_id
+
+        first.code = '# two\n'
+        # Setting the code is free; it is stored on save()
+        self.assertEqual(first.code_blob_id, old_blob)
+        self.assertEqual(first.code, '# two\n')
+        first.save(update_fields=['code'])
+        self.assertNotEqual(first.code_blob_id, old_blob)
+        self.assertEqual(Solution.objects.get(pk=first.pk).code, '# two\n')
+        self.assertEqual(Solution.objects.get(pk=second.pk).code, '# one\n')
+        self.assertTrue(CodeBlob.objects.filter(pk=old_blob).exists())
+
+    def test_prune_keeps_referenced_and_recent_blobs(self):
+        kept = Solution.objects.create(problem=self.problem, created_by=self.alice, code='# kept\n').code_blob_id
+        recent = CodeBlob.objects.intern('# just handed out\n').pk
+        stale = CodeBlob.objects.intern('# forgotten\n').pk
+        long_ago = timezone.now() - timedelta(days=1)
+        CodeBlob.objects.filter(pk__in=[kept, stale]).update(last_used_at=long_ago)
+
+        out = io.StringIO()
+        call_command('code_storage', stdout=out)
+        self.assertIn('Unreferenced blobs: 2', out.getvalue())
+        call_command('code_storage', '--prune', stdout=out)
+        self.assertIn('Deleted 1 unreferenced blobs', out.getvalue())
+        self.assertEqual(set(CodeBlob.objects.values_list('pk', flat=True)), {kept, recent})
+
+
+class CodeBlobMigrationTests(TransactionTestCase):
+    before = [('problems', '0017_code_blobs')]
+    after = [('problems', '0019_remove_solution_code')]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.addCleanup(self.migrate_to_latest)
+        self.migrate(self.before)
+
+    def migrate(self, targets):
+        self.executor.loader.build_graph()
+        self.executor.migrate(targets)
+        return self.executor.loader.project_state(targets).apps
+
+    def migrate_to_latest(self):
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.executor.loader.graph.leaf_nodes())
+
+    def test_code_survives_migrating_forwards_and_back(self):
+        apps = self.executor.loader.project_state(self.before).apps
+        user = apps.get_model('auth', 'User').objects.create(username='alice')
+        problem = apps.get_model('problems', 'Problem').objects.create(
+            title='Two Sum', description='Add two numbers.', created_by=user, solution_code='pass')
+        codes = ['# same\n', '# same\n', 'x = 1\n' * 100, '']
+        Solution = apps.get_model('problems', 'Solution')
+        ids = [Solution.objects.create(problem=problem, created_by=user, code=code).pk for code in codes]
+
+        apps = self.migrate(self.after)
+        Solution = apps.get_model('problems', 'Solution')
+        stored = dict(Solution.objects.values_list('pk', 'code_blob__digest'))
+        self.assertEqual([stored[pk] for pk in ids], [blobs.digest(code) for code in codes])
+        self.assertEqual(apps.get_model('problems', 'CodeBlob').objects.count(), 3)
+        for pk, code in zip(ids, codes):
+            blob = Solution.objects.select_related('code_blob').get(pk=pk).code_blob
+            self.assertEqual(blobs.decode(blob.data, blob.compressed), code)
+
+        apps = self.migrate(self.before)
+        Solution = apps.get_model('problems', 'Solution')
+        self.assertEqual([Solution.objects.get(pk=pk).code for pk in ids], codes)
+
+
+# --- Profile pictures (see avatars.py) ---
+
+def picture(size=(400, 300), mode='RGB', orientation=None, format='JPEG'):
+    image = Image.new(mode, size, (200, 30, 30, 128) if mode == 'RGBA' else (200, 30, 30))
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format, exif=exif)
+    return buffer.getvalue()
+
+
+class AvatarTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.profile = Profile.objects.create(user=make_user('alice'))
+
+    def upload(self, data):
+        self.profile.profile_picture = SimpleUploadedFile('me.jpg', data, content_type='image/jpeg')
+        self.profile.save()
+
+    def test_variants_are_square_and_stripped(self):
+        # Orientation 6: stored landscape, shown portrait
+        variants = avatars.render_variants(picture(orientation=6))
+        self.assertEqual(set(variants), {(px, extension) for px in avatars.pixel_sizes() for extension in avatars.FORMATS})
+        for (px, extension), content in variants.items():
+            with Image.open(io.BytesIO(content)) as image:
+                self.assertEqual((image.size, image.format), ((px, px), avatars.FORMATS[extension]['format']))
+                self.assertFalse(image.getexif())
+
+    def test_transparency_is_flattened_for_jpeg(self):
+        variants = avatars.render_variants(picture(mode='RGBA', format='PNG'))
+        with Image.open(io.BytesIO(variants[(32, 'jpg')])) as image:
+            self.assertEqual(image.mode, 'RGB')
+        with Image.open(io.BytesIO(variants[(32, 'webp')])) as image:
+            self.assertEqual(image.mode, 'RGBA')
+
+    def test_process_and_serve(self):
+        self.upload(picture())
+        self.assertTrue(self.profile.avatar_pending)
+        self.assertGreater(avatars.process(self.profile), 0)
+        profile = Profile.objects.get(pk=self.profile.pk)
+        self.assertFalse(profile.avatar_pending)
+        self.assertEqual(len(profile.avatar_hash), 16)
+        # Same picture again: the variants are already there
+        self.assertEqual(avatars.process(profile), 0)
+
+        response = self.client.get(avatars.variant_url(profile, 'small', 'webp', scale=2))
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'image/webp'))
+        self.assertEqual(response['Cache-Control'], f'public, max-age={avatars.CACHE_MAX_AGE}, immutable')
+        self.assertEqual(len(b''.join(response.streaming_content)),
+                         default_storage.size(avatars.variant_name(profile.avatar_hash, 64, 'webp')))
+        missing = avatars.variant_url(profile, 'small', 'webp').replace(profile.avatar_hash, '0' * 16)
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_replaced_picture_stays_pending(self):
+        self.upload(picture())
+        stale = Profile.objects.get(pk=self.profile.pk)
+        self.upload(picture(size=(50, 50)))
+        avatars.process(stale)
+        self.assertTrue(Profile.objects.get(pk=self.profile.pk).avatar_pending)
+
+
+# --- Static files and compression (see storage.py, middleware.py) ---
+
+class StaticFilesTests(TestCase):
+    def setUp(self):
+        source, root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source)
+        self.addCleanup(shutil.rmtree, root)
+        self.root = root
+        self.style = 'body { color: red; }\n' * 100
+        with open(os.path.join(source, 'style.css'), 'w') as f:
+            f.write(self.style)
+        with open(os.path.join(source, 'tiny.css'), 'w') as f:
+            f.write('p {}\n')
+        self.enterContext(override_settings(
+            STATIC_URL='/static/', STATIC_ROOT=root, STATICFILES_DIRS=[source],
+            STORAGES={**settings.STORAGES,
+                      'staticfiles': {'BACKEND': 'problems.storage.CompressedManifestStaticFilesStorage'}},
+        ))
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(root, 'staticfiles.json')) as f:
+            self.hashed = json.load(f)['paths']['style.css']
+        self.middleware = StaticFilesMiddleware(lambda request: HttpResponse('from the views', status=404))
+
+    def get(self, name, **headers):
+        response = self.middleware(RequestFactory().get(f'/static/{name}', **headers))
+        self.addCleanup(response.close)
+        return response
+
+    def test_collectstatic_writes_compressed_variants(self):
+        for name in ('style.css', self.hashed):
+            with open(os.path.join(self.root, name + '.gz'), 'rb') as f:
+                self.assertEqual(gzip.decompress(f.read()).decode(), self.style)
+        # Too small to be worth it
+        self.assertFalse(any(name.startswith('tiny') and name.endswith('.gz') for name in os.listdir(self.root)))
+
+    def test_serves_the_variant_the_client_accepts(self):
+        response = self.get(self.hashed, HTTP_ACCEPT_ENCODING='deflate, gzip;q=0.5')
+        self.assertEqual((response['Content-Encoding'], response['Vary']), ('gzip', 'Accept-Encoding'))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).decode(), self.style)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+        plain = self.get(self.hashed, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(plain.streaming_content).decode(), self.style)
+
+    def test_plain_names_and_revalidation(self):
+        response = self.get('style.css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(self.get('style.css', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.get('missing.css').content, b'from the views')
+        self.assertEqual(self.get('../settings.py').content, b'from the views')
+
+    def test_development_serves_the_app_files(self):
+        with override_settings(DEBUG=True), self.assertRaises(MiddlewareNotUsed):
+            StaticFilesMiddleware(lambda request: HttpResponse())
+
+    def test_page_compression(self):
+        middleware = CompressionMiddleware(lambda request: HttpResponse(request.body_text, content_type='text/html'))
+
+        def get(text):
+            request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+            request.body_text = text
+            return middleware(request)
+
+        page = get('<p>row</p>' * 500)
+        self.assertEqual(page['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(page.content).decode(), '<p>row</p>' * 500)
+        self.assertFalse(get('<p>short</p>').has_header('Content-Encoding'))
+
+        # Server-Sent Events have to reach the browser as they happen
+        middleware = CompressionMiddleware(
+            lambda request: StreamingHttpResponse(iter(['data: 1\n\n'] * 500), content_type='text/event-stream'))
+        streamed = middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertFalse(streamed.has_header('Content-Encoding'))
+
+
+# --- Request profiling (see profiling.py) ---
+
+@plain_static
+@override_settings(PROFILE_SAMPLE_RATE=1, PROFILE_SLOW_MS=60000, PROFILE_LOG=None)
+class ProfilingTests(TestCase):
+    def test_server_timing(self):
+        make_problem(make_user('alice'))
+        response = self.client.get(reverse('problem_list'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* queries", template;dur=[\d.]+$')
+
+    @override_settings(PROFILE_SAMPLE_RATE=0, PROFILE_CAPTURE_TOKEN='secret')
+    def test_capture_header(self):
+        with self.assertLogs('problems.slow_requests') as logs:
+            response = self.client.get(reverse('problem_list'), headers={'X-Profile': 'secret'})
+        self.assertIn('Server-Timing', response)
+        trace = logs.records[0].getMessage()
+        self.assertTrue(trace.startswith('GET / -> 200 in '))
+        # Run under cProfile
+        self.assertIn('cumulative', trace)
+        self.assertNotIn('Server-Timing', self.client.get(reverse('problem_list'), headers={'X-Profile': 'wrong'}))
+
+    @override_settings(PROFILE_SAMPLE_RATE=0)
+    def test_off(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('problem_list')))
+
+    def test_slow_request_trace_shows_repeated_queries(self):
+        profiling.hook_connections()
+        profile, token = profiling.start()
+        try:
+            for pk in range(6):
+                User.objects.filter(pk=pk % 2).exists()
+        finally:
+            profile.finish()
+            profiling.stop(token)
+        trace = profile.trace(RequestFactory().get('/x'), HttpResponse())
+        self.assertIn('6 queries', profile.server_timing())
+        self.assertIn('4 duplicate queries:', trace)
+        self.assertIn('repeated statements (N+1?):', trace)
+
+    def test_measurements_stay_with_their_request(self):
+        # Outside a profiled request these are no-ops
+        profiling.record('judge', 1.0)
+        profiling.count('session_writes')
+        self.assertFalse(profiling.active())
+
+        async def request(seconds):
+            profile, token = profiling.start()
+            try:
+                await asyncio.sleep(0)
+                profiling.record('judge', seconds)
+                await asyncio.sleep(0)
+                profiling.record('judge', seconds)
+            finally:
+                profiling.stop(token)
+            return profile.timings['judge']
+
+        async def both():
+            return await asyncio.gather(request(1.0), request(0.25))
+        self.assertEqual(asyncio.run(both()), [2.0, 0.5])
+        self.assertFalse(profiling.active())
+
+
+# --- Process startup (see benchmark_startup, docker_runner.py) ---
+
+class StartupTests(TestCase):
+    def test_web_path_leaves_the_heavy_imports_for_later(self):
+        saved = os.path.join(tempfile.mkdtemp(), 'startup.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(saved))
+        out = io.StringIO()
+        # Fails if docker, requests or PIL are imported by django.setup() and the URLconf
+        call_command('benchmark_startup', runs=1, save=saved, stdout=out)
+        self.assertIn('Startup OK', out.getvalue())
+        with open(saved) as f:
+            self.assertEqual(set(json.load(f)), {'setup_ms', 'urls_ms', 'startup_ms', 'rss_kb', 'modules'})
+
+    def test_regression_against_the_baseline(self):
+        baseline = os.path.join(tempfile.mkdtemp(), 'baseline.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(baseline))
+        with open(baseline, 'w') as f:
+            json.dump({'startup_ms': 100, 'rss_kb': 50000}, f)
+        run = {'setup_ms': 90.0, 'urls_ms': 40.0, 'rss_kb': 51000, 'modules': ['django'], 'packages': {'django': 80000}}
+        with mock.patch.object(benchmark_startup, 'probe', return_value=run):
+            with self.assertRaisesMessage(CommandError, 'startup_ms 130.0 vs baseline 100'):
+                call_command('benchmark_startup', runs=3, baseline=baseline, stdout=io.StringIO())
+            call_command('benchmark_startup', runs=3, baseline=baseline, tolerance=0.5, stdout=io.StringIO())
+            with self.assertRaisesMessage(CommandError, 'should be lazy: docker'):
+                run['modules'].append('docker')
+                call_command('benchmark_startup', runs=1, stdout=io.StringIO())
+
+    def test_parse_importtime(self):
+        report = ('import time: self [us] | cumulative | imported package\n'
+                  'import time:       120 |        120 |     _json\n'
+                  'import time:       300 |        420 |   json.decoder\n'
+                  'import time:       200 |        900 | json\n'
+                  'import time:        50 |         50 | json.tool\n')
+        self.assertEqual(benchmark_startup.parse_importtime(report), {'json': 950})
+
+    def test_named_pipe_imports_the_docker_sdk_on_first_use(self):
+        runner = SimpleNamespace(run_code_in_docker=mock.Mock(return_value=[{'passed': True, 'verdict': 'accepted'}]))
+        with mock.patch.dict(sys.modules, {'problems.docker_runner': runner}), \
+                mock.patch.dict(os.environ, {'DOCKER_HOST': 'npipe:////./pipe/docker_engine'}):
+            results = asyncio.run(judge.run_code_async('pass', [make_case(1), make_case(1)], [], time_limit=1.5,
+                                                       mem_limit=64))
+        self.assertEqual([result['passed'] for result in results], [True, True])
+        self.assertTrue(all('time_ms' in result for result in results))
+        self.assertEqual([call.kwargs for call in runner.run_code_in_docker.call_args_list],
+                         [{'time_limit': 1.5, 'mem_limit': 64}] * 2)
+
+
+# --- Admin changelists and actions (see admin.py) ---
+
+@plain_static
+class AdminTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('root', password='pw'))
+        self.alice = make_user('alice')
+        self.problems = [make_problem(self.alice, title=f'Problem {i}') for i in range(5)]
+        self.solutions = [Solution.objects.create(problem=problem, created_by=self.alice, code='pass\n')
+                          for problem in self.problems]
+
+    def test_estimated_count(self):
+        self.assertGreaterEqual(admin.estimated_count(Solution.objects.all()), 5)
+        with mock.patch.object(admin, 'estimated_count', return_value=123456) as estimated_count:
+            self.assertEqual(admin.EstimatedCountPaginator(Solution.objects.order_by('pk'), 2).count, 123456)
+            # Filtered changelists and small tables are counted exactly
+            filtered = Solution.objects.filter(problem=self.problems[0]).order_by('pk')
+            self.assertEqual(admin.EstimatedCountPaginator(filtered, 2).count, 1)
+            estimated_count.return_value = admin.EXACT_COUNT_BELOW - 1
+            self.assertEqual(admin.EstimatedCountPaginator(Solution.objects.order_by('pk'), 2).count, 5)
+
+    def test_changelist_uses_the_estimate(self):
+        with mock.patch.object(admin, 'estimated_count', return_value=123456):
+            response = self.client.get(reverse('admin:problems_solution_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 123456)
+        response = self.client.get(reverse('admin:problems_solution_changelist'), {'problem__id__exact': self.problems[0].pk})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_batched_delete(self):
+        url = reverse('admin:problems_problem_changelist')
+        selected = [problem.pk for problem in self.problems]
+        with mock.patch.object(admin, 'DELETE_PREVIEW_LIMIT', 3):
+            response = self.client.post(url, {'action': 'delete_selected', '_selected_action': selected})
+        # The confirmation page lists the first few; its per-model summary stays complete
+        [deleted] = response.context['deletable_objects']
+        self.assertEqual(len(deleted), 4)
+        self.assertRegex(deleted[-1], r'^\.\.\. and \d+ more$')
+        self.assertEqual([(str(name), count) for name, count in response.context['model_count']],
+                         [('problems', 5), ('solutions', 5)])
+
+        with mock.patch.object(admin, 'DELETE_BATCH_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            self.client.post(url, {'action': 'delete_selected', '_selected_action': selected, 'post': 'yes'})
+        self.assertFalse(Problem.objects.exists())
+        self.assertFalse(Solution.objects.exists())
+        deletes = [query['sql'] for query in queries if query['sql'].startswith('DELETE FROM "problems_problem" ')]
+        self.assertEqual(len(deletes), 3)
+
+    def test_rejudge_actions(self):
+        url = reverse('admin:problems_problem_changelist')
+        executor = mock.Mock(submit=lambda function, *args: function(*args))
+        with mock.patch.object(admin, '_rejudge_executor', executor), \
+                mock.patch.object(admin, 'call_command') as call, mock.patch.object(admin, 'close_old_connections'), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'action': 'rejudge', '_selected_action': [self.problems[0].pk]},
+                                        follow=True)
+            self.client.post(reverse('admin:problems_solution_changelist'),
+                             {'action': 'rejudge', '_selected_action': [self.solutions[1].pk]})
+        self.assertContains(response, 'Rejudging 1 solutions of 1 problems in the background')
+        (name,), options = call.call_args_list[0]
+        self.assertEqual((name, options['problem']), ('rejudge', [self.problems[0].pk]))
+        self.assertFalse(os.path.exists(options['checkpoint']))
+        self.assertEqual(call.call_args_list[1].kwargs['solution'], [self.solutions[1].pk])
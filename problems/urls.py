@@ -19,7 +19,7 @@ urlpatterns = [
 from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
-from . import views
+from . import avatars, views
 
 urlpatterns = [
     path('', views.problem_list, name='problem_list'),
@@ -27,10 +27,18 @@ urlpatterns = [
     path('create/', views.create_problem, name='create_problem'),
     path('signup/', views.signup, name='signup'),
     path('problem/<int:problem_id>/submit/', views.submit_solution, name='submit_solution'),
+    path('problem/<int:problem_id>/stream/', views.stream_solution, name='stream_solution'),
     path('accounts/profile/', views.profile, name='profile'),
+    path('leaderboard/', views.leaderboard, name='leaderboard'),
     path('problem/<int:problem_id>/rate/', views.rate_problem, name='rate_problem'),
     path('problem/<int:problem_id>/favorite/', views.toggle_favorite, name='toggle_favorite'),
+    path('interactions/batch/', views.batch_interactions, name='batch_interactions'),
     path('problem/<int:problem_id>/delete/', views.delete_problem, name='delete_problem'),
+    path('problem/<int:problem_id>/solutions/', views.community_solutions, name='community_solutions'),
+    path('solution/<int:solution_id>/code/', views.solution_code, name='solution_code'),
+    path('autocomplete/', views.search_suggestions, name='search_suggestions'),
+    # Resized profile pictures, with long-lived cache headers (see avatars.py)
+    path(f'{settings.MEDIA_URL.lstrip("/")}{avatars.DIRECTORY}/<str:name>', views.avatar_file, name='avatar_file'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,184 @@
+# problems/versioning.py
+#
+# Cheap version counters used to answer conditional GETs (ETag / Last-Modified)
+# without rendering templates or running the main queries of a view.
+#
+# Three kinds of counters exist:
+#   * Problem.version / Problem.updated_at  - anything on one problem's detail page
+#   * ContentVersion 'catalogue'            - anything shown on the problem list
+#   * ContentVersion 'user:<id>'            - one user's ratings, favorites, solutions...
+# The signal handlers in signals.py bump them; the helpers below read them.
+import hashlib
+from datetime import datetime, time
+from functools import wraps
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import ContentVersion, Problem
+
+CATALOGUE_KEY = 'catalogue'
+
+
+def user_key(user_id):
+    return f'user:{user_id}'
+
+
+def bump(*keys):
+    """Increment the ContentVersion counters for ``keys`` (creating them if needed)."""
+    if not keys:
+        return
+    now = timezone.now()
+    # One UPDATE for all keys in the common case where every counter already exists
+    updated = ContentVersion.objects.filter(key__in=keys).update(version=F('version') + 1, updated_at=now)
+    if updated == len(set(keys)):
+        return
+    existing = set(ContentVersion.objects.filter(key__in=keys).values_list('key', flat=True))
+    for key in set(keys) - existing:
+        try:
+            with transaction.atomic():
+                ContentVersion.objects.create(key=key, version=1)
+        except IntegrityError:
+            # Someone else created it in the meantime
+            ContentVersion.objects.filter(key=key).update(version=F('version') + 1, updated_at=now)
+
+
+def bump_catalogue():
+    bump(CATALOGUE_KEY)
+
+
+def bump_user(*user_ids):
+    bump(*(user_key(uid) for uid in user_ids if uid))
+
+
+def touch_problem(*problem_ids):
+    """Invalidate the detail page validators of the given problems."""
+    Problem.objects.filter(pk__in=problem_ids).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def _read_versions(*keys):
+    rows = ContentVersion.objects.filter(key__in=keys).values_list('key', 'version', 'updated_at')
+    found = {key: (version, updated_at) for key, version, updated_at in rows}
+    return [found.get(key, (0, None)) for key in keys]
+
+
+def _make_etag(*parts):
+    return hashlib.sha1(':'.join(str(p) for p in parts).encode()).hexdigest()
+
+
+def _latest(*stamps):
+    stamps = [s for s in stamps if s is not None]
+    return max(stamps) if stamps else None
+
+
+def _viewer_id(request):
+    return request.user.pk if request.user.is_authenticated else 0
+
+
+def _session_parts(request):
+    """What a cached copy depends on besides content: the viewer and their CSRF secret.
+
+    The pages embed {% csrf_token %}; logging in rotates the secret, so a copy
+    cached before that would post a stale token. CsrfViewMiddleware has already
+    put the secret in META; it only enters the ETag hashed. The matching time for
+    Last-Modified is the viewer's last login.
+    """
+    viewer = _viewer_id(request)
+    last_login = request.user.last_login if viewer else None
+    return viewer, request.META.get('CSRF_COOKIE', ''), last_login
+
+
+# Each validator function below stores its result on the request so that the
+# ETag and Last-Modified callables share a single round trip.
+
+def _list_validators(request):
+    if not hasattr(request, '_validators'):
+        viewer, csrf_secret, last_login = _session_parts(request)
+        keys = [CATALOGUE_KEY] + ([user_key(viewer)] if viewer else [])
+        versions = _read_versions(*keys)
+        request._validators = (
+            _make_etag('list', viewer, csrf_secret, *(v for v, _ in versions)),
+            _latest(last_login, *(stamp for _, stamp in versions)),
+        )
+    return request._validators
+
+
+def _detail_validators(request, problem_id):
+    if not hasattr(request, '_validators'):
+        row = Problem.objects.filter(pk=problem_id).values_list('version', 'updated_at').first()
+        if row is None:
+            # Let the view raise its 404
+            request._validators = (None, None)
+        else:
+            viewer, csrf_secret, last_login = _session_parts(request)
+            user_version, user_stamp = _read_versions(user_key(viewer))[0] if viewer else (0, None)
+            request._validators = (
+                _make_etag('detail', problem_id, row[0], viewer, csrf_secret, user_version),
+                _latest(row[1], last_login, user_stamp),
+            )
+    return request._validators
+
+
+def _profile_validators(request):
+    if not hasattr(request, '_validators'):
+        viewer, csrf_secret, last_login = _session_parts(request)
+        target = request.GET.get('user') or ''
+        if not target and not viewer:
+            request._validators = (None, None)
+            return request._validators
+        keys = [CATALOGUE_KEY]
+        if viewer:
+            keys.append(user_key(viewer))
+        if target:
+            target_id = User.objects.filter(username=target).values_list('pk', flat=True).first()
+            if target_id is None:
+                request._validators = (None, None)
+                return request._validators
+            keys.append(user_key(target_id))
+        versions = _read_versions(*keys)
+        # The current streak shown on the page lapses with the date alone
+        today = timezone.localdate()
+        request._validators = (
+            _make_etag('profile', viewer, csrf_secret, target, today, *(v for v, _ in versions)),
+            _latest(timezone.make_aware(datetime.combine(today, time.min)), last_login,
+                    *(stamp for _, stamp in versions)),
+        )
+    return request._validators
+
+
+def _revalidate(etag_func, last_modified_func):
+    """Like ``condition`` but also asks caches to revalidate on every use."""
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD') and response.has_header('ETag'):
+                if request.user.is_authenticated:
+                    patch_cache_control(response, no_cache=True, private=True)
+                else:
+                    patch_cache_control(response, no_cache=True)
+            return response
+        return inner
+    return decorator
+
+
+problem_list_condition = _revalidate(
+    etag_func=lambda request: _list_validators(request)[0],
+    last_modified_func=lambda request: _list_validators(request)[1],
+)
+
+problem_detail_condition = _revalidate(
+    etag_func=lambda request, problem_id: _detail_validators(request, problem_id)[0],
+    last_modified_func=lambda request, problem_id: _detail_validators(request, problem_id)[1],
+)
+
+profile_condition = _revalidate(
+    etag_func=lambda request: _profile_validators(request)[0],
+    last_modified_func=lambda request: _profile_validators(request)[1],
+)
@@ -1,162 +1,76 @@
-import docker
 import json
+import math
 import time
-import requests
 import re
-import platform
-import os
-from django.shortcuts import render, redirect, get_object_or_404
+from urllib.parse import urlencode
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.http import JsonResponse
-from django.db.models import Count, Case, When, IntegerField, Q
-from .models import Problem, Tag, Solution, TestCase, ProblemRating, FavoriteProblem, Profile
+from django.core.paginator import Paginator
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Problem, Tag, Solution, TestCase, FavoriteProblem, Profile, UserStats, ProblemStats
+from . import admission, autocomplete, avatars, events, interactions, judge, leaderboards, similarity, stats
 from .forms import ProblemForm, TestCaseFormSet, ProfileForm
-
-def run_code_in_docker(code, test_cases, input_vars, language='python'):
-    results = []
-    try:
-        if platform.system() == 'Windows':
-            base_url = 'npipe:////./pipe/docker_engine'
-        else:
-            base_url = os.environ.get('DOCKER_HOST', 'unix:///var/run/docker.sock')
-        
-        client = docker.DockerClient(base_url=base_url, timeout=10)
-        
-        try:
-            client.ping()
-            print("Docker daemon connection successful")
-        except docker.errors.APIError as e:
-            print(f"Failed to connect to Docker daemon: {str(e)}")
-            return [{'error': 'Cannot connect to Docker service. Please ensure Docker is running.'}]
-
-        type_converters = {
-            'int': int,
-            'float': float,
-            'str': str,
-            'bool': lambda x: str(x).lower() == 'true',
-            'list': json.loads,
-            'dict': json.loads,
-            'None': lambda x: None if str(x).lower() == 'null' else x
-        }
-        type_checks = {
-            'int': int,
-            'float': float,
-            'str': str,
-            'bool': bool,
-            'list': list,
-            'dict': dict,
-            'None': type(None)
-        }
-
-        for test_case in test_cases:
-            input_json = test_case.input_value
-            expected_output = test_case.expected_output
-
-            input_dict = json.loads(input_json)
-            for var in input_vars:
-                if var['name'] in input_dict:
-                    value = input_dict[var['name']]
-                    expected_type = type_checks.get(var['type'], str)
-                    converter = type_converters.get(var['type'], str)
-                    if not isinstance(value, expected_type):
-                        try:
-                            input_dict[var['name']] = converter(value)
-                        except (ValueError, json.JSONDecodeError, TypeError):
-                            input_dict[var['name']] = value
-
-            input_data_str = "{"
-            for key, value in input_dict.items():
-                if isinstance(value, bool):
-                    input_data_str += f'"{key}": {"True" if value else "False"}, '
-                elif value is None:
-                    input_data_str += f'"{key}": None, '
-                elif isinstance(value, (list, dict)):
-                    input_data_str += f'"{key}": {json.dumps(value)}, '
-                else:
-                    input_data_str += f'"{key}": {repr(value)}, '
-            input_data_str = input_data_str.rstrip(", ") + "}"
-
-            wrapper_code = (
-                "import json\n"
-                "import sys\n\n"
-                f"{code}\n\n"
-                f"input_data = {input_data_str}\n"
-                "print(\"Parameters: \" + str(input_data))\n"
-                "result = solution(**input_data)\n"
-                "print(\"RESULT_SEPARATOR:\" + json.dumps(result))"
-            )
-            print(f"Running wrapper code:\n{wrapper_code}")
-            try:
-                container = client.containers.create(
-                    image='python:3.9-slim',
-                    command='python -c "{}"'.format(wrapper_code.replace('"', '\\"')),
-                    mem_limit='128m',
-                    cpu_quota=10000,
-                    network_disabled=True,
-                    working_dir='/tmp',
-                )
-                container.start()
-                result = container.wait(timeout=5)
-                logs = container.logs(stdout=True, stderr=True).decode().strip()
-                container.remove()
-
-                log_lines = logs.split('\n')
-                console_logs = []
-                actual_output_raw = ""
-
-                for line in log_lines:
-                    if line.startswith("RESULT_SEPARATOR:"):
-                        actual_output_raw = line.replace("RESULT_SEPARATOR:", "").strip()
-                    else:
-                        console_logs.append(line)
-
-                try:
-                    actual_output = json.loads(actual_output_raw)
-                except json.JSONDecodeError:
-                    actual_output = actual_output_raw
-
-                console_logs_str = "\n".join(console_logs).strip() if console_logs else "No console output"
-                print(f"Container logs:\n{logs}")
-
-                return_type = test_case.__dict__.get('return_type', 'str')
-                converter = type_converters.get(return_type, str)
-                try:
-                    expected_parsed = expected_output if isinstance(expected_output, (list, dict)) else json.loads(expected_output)
-                except (json.JSONDecodeError, TypeError):
-                    expected_parsed = expected_output
-
-                if return_type == 'None':
-                    expected_parsed = None if expected_output in [None, 'null', ''] else expected_output
-                    actual_output = None if actual_output in [None, ''] else actual_output
-                elif return_type == 'str':
-                    actual_output = str(actual_output)
-                elif return_type in ['int', 'float', 'bool']:
-                    actual_output = converter(actual_output) if isinstance(actual_output, (str, int, float, bool)) else actual_output
-
-                passed = actual_output == expected_parsed
-                print(f"Debug: actual_output={actual_output} (type={type(actual_output)}), expected_parsed={expected_parsed} (type={type(expected_parsed)}), passed={passed}, return_type={return_type}")
-
-                results.append({
-                    'input': input_json,
-                    'expected': json.dumps(expected_output) if isinstance(expected_output, (list, dict)) else str(expected_output),
-                    'actual': actual_output_raw,
-                    'passed': passed,
-                    'console_logs': console_logs_str
-                })
-            except docker.errors.ContainerError as e:
-                results.append({'error': f"Container error: {str(e)}"})
-            except docker.errors.APIError as e:
-                results.append({'error': f"Execution timed out or failed: {str(e)}"})
-            except Exception as e:
-                results.append({'error': f"Unexpected error: {str(e)}"})
-    except Exception as e:
-        print(f"Docker client initialization failed: {str(e)}")
-        results.append({'error': f"Failed to initialize Docker client: {str(e)}"})
-
-    return results
+from .routers import use_replica
+from .versioning import problem_list_condition, problem_detail_condition, profile_condition
+
+MAX_BATCH_INTERACTIONS = 200
+COMMUNITY_SOLUTIONS_PAGE_SIZE = 10
+SOLUTION_PREVIEW_CHARS = 300
+
+# The view querysets below are also planned by the index_advisor command
+
+def community_solutions_queryset(problem, user):
+    solutions = (Solution.objects.filter(problem=problem)
+                 .select_related('created_by', 'created_by__profile', 'code_blob')
+                 .order_by('-created_at', '-id'))
+    if user.is_authenticated:
+        solutions = solutions.exclude(created_by=user)
+    return solutions
+
+def community_solutions_page(problem, user, cursor=None, limit=COMMUNITY_SOLUTIONS_PAGE_SIZE):
+    """One page of other users' solutions, newest first, using keyset pagination on (created_at, id).
+
+    Only a preview of each body is rendered; the full code is loaded on demand via `solution_code`.
+    Returns (solutions, next_cursor). Raises ValueError for a malformed cursor.
+    """
+    solutions = community_solutions_queryset(problem, user)
+    if cursor:
+        created_at, _, last_id = cursor.rpartition('~')
+        created_at = parse_datetime(created_at)
+        if created_at is None:
+            raise ValueError("Invalid cursor")
+        last_id = int(last_id)
+        solutions = solutions.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=last_id))
+    page = list(solutions[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        last = page[-1]
+        next_cursor = f"{last.created_at.isoformat()}~{last.id}"
+    for solution in page:
+        solution.preview = solution.code[:SOLUTION_PREVIEW_CHARS]
+        solution.truncated = len(solution.code) > SOLUTION_PREVIEW_CHARS
+    return page, next_cursor
+
+# Templates may still touch lazy relations, so async views render in a worker thread
+arender = sync_to_async(render)
+
+async def render_throttled(request, template, context, exc):
+    """Re-render a page with the admission error, as a 429/503 with Retry-After."""
+    context['error'] = str(exc)
+    response = await arender(request, template, context)
+    response.status_code = exc.status
+    response['Retry-After'] = str(exc.retry_after)
+    return response
 
 def generate_function_header(input_vars, return_type):
     params = [f"{var['name']}: {var['type']}" for var in input_vars if var['name'] and var['type']]
@@ -173,43 +87,48 @@ def signup(request):
         form = UserCreationForm()
     return render(request, 'signup.html', {'form': form})
 
-def problem_list(request):
-    search_query = request.GET.get('q', '')
-    selected_tags = request.GET.get('tags', '').split(',') if request.GET.get('tags') else []
-    selected_tags = [tag for tag in selected_tags if tag]
-    liked = request.GET.get('liked') == 'true'
-    disliked = request.GET.get('disliked') == 'true'
-    favorited = request.GET.get('favorited') == 'true'
-
-    problems = Problem.objects.all().annotate(
-        likes=Count('ratings', filter=Q(ratings__vote=1)),
-        dislikes=Count('ratings', filter=Q(ratings__vote=-1))
-    ).distinct()
+def problem_list_queryset(user, search_query='', selected_tags=(), liked=False, disliked=False, favorited=False):
+    problems = Problem.objects.select_related('stats').distinct()
 
     # Apply search query filter
     if search_query:
         problems = problems.filter(title__icontains=search_query)
 
     # Apply tag filter
-    if selected_tags:
-        for tag in selected_tags:
-            problems = problems.filter(tags__name=tag)
+    for tag in selected_tags:
+        problems = problems.filter(tags__name=tag)
 
     # Apply liked/disliked/favorited filters for authenticated users
-    if request.user.is_authenticated:
+    if user.is_authenticated:
         if liked:
-            problems = problems.filter(ratings__user=request.user, ratings__vote=1)
-            print(f"Liked filter applied. Problems: {problems.count()}")
+            problems = problems.filter(ratings__user=user, ratings__vote=1)
         if disliked:
-            problems = problems.filter(ratings__user=request.user, ratings__vote=-1)
-            print(f"Disliked filter applied. Problems: {problems.count()}")
+            problems = problems.filter(ratings__user=user, ratings__vote=-1)
+        if favorited:
+            problems = problems.filter(favorited_by__user=user)
+    return problems
+
+@use_replica
+@problem_list_condition
+def problem_list(request):
+    search_query = request.GET.get('q', '')
+    selected_tags = request.GET.get('tags', '').split(',') if request.GET.get('tags') else []
+    selected_tags = [tag for tag in selected_tags if tag]
+    liked = request.GET.get('liked') == 'true'
+    disliked = request.GET.get('disliked') == 'true'
+    favorited = request.GET.get('favorited') == 'true'
+
+    problems = problem_list_queryset(request.user, search_query, selected_tags, liked, disliked, favorited)
+
+    if request.user.is_authenticated:
+        if liked or disliked:
+            print(f"Liked/disliked filter applied. Problems: {problems.count()}")
         if favorited:
             # Debug: Check if there are any FavoriteProblem entries for the user
             favorite_entries = FavoriteProblem.objects.filter(user=request.user)
             print(f"FavoriteProblem entries for user {request.user.username}: {favorite_entries.count()}")
             if favorite_entries.exists():
                 print(f"Favorited problems IDs: {[fav.problem_id for fav in favorite_entries]}")
-            problems = problems.filter(favorited_by__user=request.user)
             print(f"Favorited filter applied. Problems: {problems.count()}")
 
     all_tags = Tag.objects.all()
@@ -221,7 +140,11 @@ def problem_list(request):
     })
 
 
-def problem_detail(request, problem_id):
+def user_solutions_queryset(problem, user):
+    return Solution.objects.filter(problem=problem, created_by=user).select_related('code_blob').order_by('-created_at')
+
+@problem_detail_condition
+def problem_detail_page(request, problem_id):
     problem = get_object_or_404(Problem, id=problem_id)
     
     # Get user-specific data only if authenticated
@@ -232,28 +155,30 @@ def problem_detail(request, problem_id):
     
     if request.user.is_authenticated:
         user_rating = problem.ratings.filter(user=request.user).first() or {'vote': 0}
-        user_solution = Solution.objects.filter(problem=problem, created_by=request.user).order_by('-created_at').first()
-        solutions = Solution.objects.filter(problem=problem, created_by=request.user).order_by('-created_at')
+        solutions = user_solutions_queryset(problem, request.user)
+        user_solution = solutions.first()
         is_favorited = problem.favorited_by.filter(user=request.user).exists()
     
-    # Get other users' solutions (exclude current user's solutions only if authenticated)
-    if request.user.is_authenticated:
-        other_solutions = Solution.objects.filter(problem=problem).exclude(created_by=request.user).order_by('-created_at')
-    else:
-        other_solutions = Solution.objects.filter(problem=problem).order_by('-created_at')
+    # First page of other users' solutions; the rest is fetched from community_solutions
+    other_solutions, other_solutions_cursor = community_solutions_page(problem, request.user)
     
     # Get likes and dislikes
-    likes = problem.ratings.filter(vote=1).count()
-    dislikes = problem.ratings.filter(vote=-1).count()
+    likes = problem.like_count
+    dislikes = problem.dislike_count
+    problem_stats = ProblemStats.objects.filter(problem=problem).first()
     
     # Prepare context
     context = {
         'problem': problem,
         'likes': likes,
         'dislikes': dislikes,
+        'problem_stats': problem_stats,
+        'runtime_distribution': events.runtime_distribution(problem_stats),
         'user_rating': user_rating,
         'solutions': solutions,
         'other_solutions': other_solutions,
+        'other_solutions_cursor': other_solutions_cursor,
+        'similar_problems': similarity.similar_to(problem),
         'is_favorited': is_favorited,
         'user_solution': user_solution,
         'function_header': problem.function_header,
@@ -264,271 +189,316 @@ def problem_detail(request, problem_id):
         'all_tests_passed': False,
     }
     
-    # Handle solution submission
-    if request.method == 'POST' and ('run' in request.POST or 'submit' in request.POST):
-        if not request.user.is_authenticated:
-            messages.error(request, "You must be logged in to submit a solution.")
-            return redirect('login')
-        
-        code = request.POST.get('code')
-        if not code:
-            context['error'] = "Solution code cannot be empty."
-        else:
-            # Process the solution (run tests or submit)
-            # This part depends on your existing logic for running tests or submitting
-            # For now, I'll assume you have a function to handle this
-            results, all_passed = run_tests(problem, code)  # Placeholder; replace with actual logic
-            context['results'] = results
-            context['all_tests_passed'] = all_passed
-            
-            if 'submit' in request.POST and all_passed:
-                solution = Solution.objects.create(
-                    problem=problem,
-                    created_by=request.user,
-                    code=code,
-                    status='Accepted' if all_passed else 'Failed'
-                )
-                if all_passed:
-                    problem.solved_by.add(request.user)
-                problem.attempted_by.add(request.user)
-                return redirect('problem_detail', problem_id=problem.id)
-    
     return render(request, 'problem_detail.html', context)
 
-def create_problem(request):
-    if request.method == 'POST':
+async def problem_detail(request, problem_id):
+    # Running or submitting code waits on the judge, so it takes the async path;
+    # plain page views stay sync (and conditional, see versioning.py)
+    if request.method == 'POST' and ('run' in request.POST or 'submit' in request.POST):
+        return await submit_solution(request, problem_id)
+    return await sync_to_async(problem_detail_page)(request, problem_id)
+
+def create_problem_form(request):
+    if request.method == 'POST' and 'generate_header' in request.POST:
         print(f"Full POST data: {request.POST}")
-        if 'generate_header' in request.POST:
-            problem_form = ProblemForm(request.POST)
+        problem_form = ProblemForm(request.POST)
+        input_vars = []
+        i = 0
+        while True:
+            name_key = f'input_name_{i}'
+            type_key = f'input_type_{i}'
+            name = request.POST.get(name_key)
+            var_type = request.POST.get(type_key)
+            print(f"Checking {name_key}: {name}, {type_key}: {var_type}")
+            if name is None and var_type is None:
+                break
+            if name and var_type:
+                input_vars.append({'name': name, 'type': var_type})
+            i += 1
+        return_type = request.POST.get('return_type', 'None')
+        function_header = generate_function_header(input_vars, return_type)
+        
+        selected_tags = request.POST.getlist('tags')
+        new_tags = request.POST.get('new_tags', '').split(',')
+        new_tags = [tag.strip() for tag in new_tags if tag.strip()]
+        
+        test_case_formset = TestCaseFormSet()
+        problem_form = ProblemForm(request.POST, initial={'solution_code': function_header})
+        print(f"Generated header: {function_header}, input_vars: {input_vars}")
+        return render(request, 'create_problem.html', {
+            'problem_form': problem_form,
+            'test_case_formset': test_case_formset,
+            'input_vars': input_vars,
+            'return_type': return_type,
+            'function_header': function_header,
+            'header_generated': True,
+            'selected_tags': selected_tags,
+            'new_tags': new_tags,
+            'all_tags': Tag.objects.all()
+        })
+
+    problem_form = ProblemForm()
+    return render(request, 'create_problem.html', {
+        'problem_form': problem_form,
+        'input_vars': [],
+        'return_type': 'None',
+        'header_generated': False,
+        'all_tags': Tag.objects.all()
+    })
+
+def parse_problem_post(request):
+    """Pull the input vars, tags and test cases out of a 'run'/'save' create_problem POST."""
+    input_vars_raw = request.POST.get('input_vars', '[]')
+    print(f"Raw input_vars: {input_vars_raw}")
+    try:
+        input_vars = json.loads(input_vars_raw)
+        if not isinstance(input_vars, list):
             input_vars = []
-            i = 0
-            while True:
-                name_key = f'input_name_{i}'
-                type_key = f'input_type_{i}'
-                name = request.POST.get(name_key)
-                var_type = request.POST.get(type_key)
-                print(f"Checking {name_key}: {name}, {type_key}: {var_type}")
-                if name is None and var_type is None:
-                    break
-                if name and var_type:
-                    input_vars.append({'name': name, 'type': var_type})
-                i += 1
-            return_type = request.POST.get('return_type', 'None')
-            function_header = generate_function_header(input_vars, return_type)
-            
-            selected_tags = request.POST.getlist('tags')
-            new_tags = request.POST.get('new_tags', '').split(',')
-            new_tags = [tag.strip() for tag in new_tags if tag.strip()]
-            
-            test_case_formset = TestCaseFormSet()
-            problem_form = ProblemForm(request.POST, initial={'solution_code': function_header})
-            print(f"Generated header: {function_header}, input_vars: {input_vars}")
-            return render(request, 'create_problem.html', {
+    except json.JSONDecodeError:
+        input_vars = []
+        print("Invalid input_vars JSON:", input_vars_raw)
+    print(f"Parsed input_vars: {input_vars}")
+
+    return_type = request.POST.get('return_type', 'None')
+    comparison = request.POST.get('comparison', 'auto')
+    function_header = generate_function_header(input_vars, return_type)
+
+    selected_tags = request.POST.getlist('tags')
+    new_tags = request.POST.get('new_tags', '').split(',')
+    new_tags = [tag.strip() for tag in new_tags if tag.strip()]
+
+    test_cases = []
+    test_case_data = []
+    total_forms = int(request.POST.get('form-TOTAL_FORMS', 0))
+    max_index = max([int(k.split('-')[1]) for k in request.POST.keys() if k.startswith('form-') and 'param_' in k] + [total_forms - 1], default=0)
+    print(f"Max test case index: {max_index + 1}")
+    for i in range(max_index + 1):
+        input_dict = {}
+        test_case_input = {}
+        for var in input_vars:
+            param_values = request.POST.getlist(f'form-{i}-param_{var["name"]}')
+            print(f"Test case {i} - {var['name']} values: {param_values}")
+            if param_values:
+                value = param_values[0].strip()
+                if var['type'] in ['dict', 'list']:
+                    if value.startswith(f"{var['name']}:"):
+                        value = value[len(var['name']) + 1:].strip()
+                    try:
+                        parsed_value = json.loads(value)
+                        input_dict[var['name']] = parsed_value
+                    except json.JSONDecodeError:
+                        input_dict[var['name']] = value
+                elif var['type'] == 'bool':
+                    input_dict[var['name']] = value.lower() == 'true'
+                elif var['type'] == 'int':
+                    input_dict[var['name']] = int(value)
+                elif var['type'] == 'float':
+                    input_dict[var['name']] = float(value)
+                elif var['type'] == 'None':
+                    input_dict[var['name']] = None if value.lower() == 'null' else value
+                else:
+                    input_dict[var['name']] = value
+                test_case_input[var['name']] = param_values[0]
+        expected_values = request.POST.getlist(f'form-{i}-expected_output')
+        print(f"Test case {i} - expected_values: {expected_values}")
+        if input_dict and expected_values:
+            expected_output = expected_values[0]
+            if return_type in ['list', 'dict']:
+                try:
+                    expected_output = json.loads(expected_output)
+                except json.JSONDecodeError:
+                    pass
+            test_cases.append(type('TestCase', (), {
+                'input_value': json.dumps(input_dict),
+                'expected_output': expected_output,
+                'return_type': return_type,
+                'comparison': comparison,
+            }))
+            test_case_data.append({
+                'inputs': test_case_input,
+                'expected_output': expected_values[0]
+            })
+    print(f"Test cases: {test_cases}")
+    print(f"Test case_data: {test_case_data}")
+
+    return {
+        'input_vars': input_vars,
+        'return_type': return_type,
+        'function_header': function_header,
+        'selected_tags': selected_tags,
+        'new_tags': new_tags,
+        'test_cases': test_cases,
+        'test_case_data': test_case_data,
+    }
+
+async def create_problem(request):
+    if request.method != 'POST' or not ('run' in request.POST or 'save' in request.POST):
+        return await sync_to_async(create_problem_form)(request)
+
+    print(f"Full POST data: {request.POST}")
+    problem_form = ProblemForm(request.POST)
+    test_case_formset = TestCaseFormSet(request.POST)
+    parsed = parse_problem_post(request)
+    input_vars = parsed['input_vars']
+    return_type = parsed['return_type']
+    function_header = parsed['function_header']
+    selected_tags = parsed['selected_tags']
+    new_tags = parsed['new_tags']
+    test_cases = parsed['test_cases']
+    test_case_data = parsed['test_case_data']
+    all_tags = [tag async for tag in Tag.objects.all()]
+
+    if await sync_to_async(problem_form.is_valid)():
+        solution_code = request.POST.get('solution_code', '')
+        # Both Run and Save judge the reference solution first
+        try:
+            async with admission.judge_slot(admission.client_key(request, await request.auser())):
+                results = await judge.run_code_async(solution_code, test_cases, input_vars, **problem_form.instance.judge_limits)
+        except admission.Throttled as e:
+            return await render_throttled(request, 'create_problem.html', {
                 'problem_form': problem_form,
                 'test_case_formset': test_case_formset,
+                'solution_code': solution_code,
                 'input_vars': input_vars,
                 'return_type': return_type,
                 'function_header': function_header,
                 'header_generated': True,
+                'test_case_data': test_case_data,
                 'selected_tags': selected_tags,
                 'new_tags': new_tags,
-                'all_tags': Tag.objects.all()
-            })
+                'all_tags': all_tags
+            }, e)
 
-        elif 'run' in request.POST or 'save' in request.POST:
-            problem_form = ProblemForm(request.POST)
-            test_case_formset = TestCaseFormSet(request.POST)
-            input_vars_raw = request.POST.get('input_vars', '[]')
-            print(f"Raw input_vars: {input_vars_raw}")
-            try:
-                input_vars = json.loads(input_vars_raw)
-                if not isinstance(input_vars, list):
-                    input_vars = []
-            except json.JSONDecodeError:
-                input_vars = []
-                print("Invalid input_vars JSON:", input_vars_raw)
-            print(f"Parsed input_vars: {input_vars}")
-
-            return_type = request.POST.get('return_type', 'None')
-            function_header = generate_function_header(input_vars, return_type)
-
-            selected_tags = request.POST.getlist('tags')
-            new_tags = request.POST.get('new_tags', '').split(',')
-            new_tags = [tag.strip() for tag in new_tags if tag.strip()]
-            print(f"POST data: {request.POST}")
-
-            test_cases = []
-            test_case_data = []
-            total_forms = int(request.POST.get('form-TOTAL_FORMS', 0))
-            max_index = max([int(k.split('-')[1]) for k in request.POST.keys() if k.startswith('form-') and 'param_' in k] + [total_forms - 1], default=0)
-            print(f"Max test case index: {max_index + 1}")
-            for i in range(max_index + 1):
-                input_dict = {}
-                test_case_input = {}
-                for var in input_vars:
-                    param_values = request.POST.getlist(f'form-{i}-param_{var["name"]}')
-                    print(f"Test case {i} - {var['name']} values: {param_values}")
-                    if param_values:
-                        value = param_values[0].strip()
-                        if var['type'] in ['dict', 'list']:
-                            if value.startswith(f"{var['name']}:"):
-                                value = value[len(var['name']) + 1:].strip()
-                            try:
-                                parsed_value = json.loads(value)
-                                input_dict[var['name']] = parsed_value
-                            except json.JSONDecodeError:
-                                input_dict[var['name']] = value
-                        elif var['type'] == 'bool':
-                            input_dict[var['name']] = value.lower() == 'true'
-                        elif var['type'] == 'int':
-                            input_dict[var['name']] = int(value)
-                        elif var['type'] == 'float':
-                            input_dict[var['name']] = float(value)
-                        elif var['type'] == 'None':
-                            input_dict[var['name']] = None if value.lower() == 'null' else value
-                        else:
-                            input_dict[var['name']] = value
-                        test_case_input[var['name']] = param_values[0]
-                expected_values = request.POST.getlist(f'form-{i}-expected_output')
-                print(f"Test case {i} - expected_values: {expected_values}")
-                if input_dict and expected_values:
-                    expected_output = expected_values[0]
-                    if return_type in ['list', 'dict']:
-                        try:
-                            expected_output = json.loads(expected_output)
-                        except json.JSONDecodeError:
-                            pass
-                    test_cases.append(type('TestCase', (), {
-                        'input_value': json.dumps(input_dict),
-                        'expected_output': expected_output,
-                        'return_type': return_type
-                    }))
-                    test_case_data.append({
-                        'inputs': test_case_input,
-                        'expected_output': expected_values[0]
-                    })
-            print(f"Test cases: {test_cases}")
-            print(f"Test case_data: {test_case_data}")
-
-            if problem_form.is_valid():
-                solution_code = request.POST.get('solution_code', '')
-
-                if 'run' in request.POST:
-                    print(f"Solution code: {solution_code}")
-                    results = run_code_in_docker(solution_code, test_cases, input_vars)
-                    all_tests_passed = all(result.get('passed', False) for result in results) and len(results) == len(test_cases)
-                    request.session['last_run_results'] = results
-                    print(f"Results from run_code_in_docker: {results}, all_tests_passed: {all_tests_passed}")
-                    return render(request, 'create_problem.html', {
-                        'problem_form': problem_form,
-                        'test_case_formset': test_case_formset,
-                        'results': results,
-                        'solution_code': solution_code,
-                        'input_vars': input_vars,
-                        'return_type': return_type,
-                        'function_header': function_header,
-                        'header_generated': True,
-                        'test_case_data': test_case_data,
-                        'all_tests_passed': all_tests_passed,
-                        'selected_tags': selected_tags,
-                        'new_tags': new_tags,
-                        'all_tags': Tag.objects.all()
-                    })
-                elif 'save' in request.POST:
-                    print(f"Re-running tests before save with solution code: {solution_code}")
-                    results = run_code_in_docker(solution_code, test_cases, input_vars)
-                    all_tests_passed = all(result.get('passed', False) for result in results) and len(results) == len(test_cases)
-                    if all_tests_passed:
-                        print("Attempting to save problem")
-                        problem = problem_form.save(commit=False)
-                        problem.created_by = request.user
-                        problem.input_vars = input_vars
-                        problem.return_type = return_type
-                        problem.function_header = function_header
-                        problem.solution_code = solution_code
-                        problem.save()
-                        
-                        for tag_name in selected_tags:
-                            tag, _ = Tag.objects.get_or_create(name=tag_name.strip())
-                            problem.tags.add(tag)
-                        for tag_name in new_tags:
-                            tag, _ = Tag.objects.get_or_create(name=tag_name.strip())
-                            problem.tags.add(tag)
-                        
-                        for tc in test_cases:
-                            TestCase.objects.create(
-                                problem=problem,
-                                input_value=tc.input_value,
-                                expected_output=tc.expected_output
-                            )
-                        print(f"Problem saved with ID: {problem.id} and {len(test_cases)} test cases")
-                        if 'last_run_results' in request.session:
-                            del request.session['last_run_results']
-                        return redirect('problem_detail', problem_id=problem.id)
-                    else:
-                        print("Cannot save: Not all tests passed with current test cases")
-                        return render(request, 'create_problem.html', {
-                            'problem_form': problem_form,
-                            'test_case_formset': test_case_formset,
-                            'results': results,
-                            'solution_code': solution_code,
-                            'input_vars': input_vars,
-                            'return_type': return_type,
-                            'function_header': function_header,
-                            'header_generated': True,
-                            'test_case_data': test_case_data,
-                            'all_tests_passed': False,
-                            'error': 'All test cases must pass with the current configuration before submitting.',
-                            'selected_tags': selected_tags,
-                            'new_tags': new_tags,
-                            'all_tags': Tag.objects.all()
-                        })
-            print("Form errors:", problem_form.errors, test_case_formset.errors)
-            return render(request, 'create_problem.html', {
+        if 'run' in request.POST:
+            print(f"Solution code: {solution_code}")
+            all_tests_passed = all(result.get('passed', False) for result in results) and len(results) == len(test_cases)
+            print(f"Results from run_code_async: {results}, all_tests_passed: {all_tests_passed}")
+            return await arender(request, 'create_problem.html', {
                 'problem_form': problem_form,
                 'test_case_formset': test_case_formset,
+                'results': results,
+                'solution_code': solution_code,
                 'input_vars': input_vars,
                 'return_type': return_type,
                 'function_header': function_header,
                 'header_generated': True,
                 'test_case_data': test_case_data,
-                'error': 'Please correct the errors in the form.',
+                'all_tests_passed': all_tests_passed,
                 'selected_tags': selected_tags,
                 'new_tags': new_tags,
-                'all_tags': Tag.objects.all()
+                'all_tags': all_tags
             })
+        elif 'save' in request.POST:
+            print(f"Re-running tests before save with solution code: {solution_code}")
+            all_tests_passed = all(result.get('passed', False) for result in results) and len(results) == len(test_cases)
+            if all_tests_passed:
+                print("Attempting to save problem")
+                problem = problem_form.save(commit=False)
+                problem.created_by = await request.auser()
+                problem.input_vars = input_vars
+                problem.return_type = return_type
+                problem.function_header = function_header
+                problem.solution_code = solution_code
+                await problem.asave()
+                
+                for tag_name in selected_tags + new_tags:
+                    tag, _ = await Tag.objects.aget_or_create(name=tag_name.strip())
+                    await problem.tags.aadd(tag)
+                
+                await TestCase.objects.abulk_create([
+                    TestCase(problem=problem, input_value=tc.input_value, expected_output=tc.expected_output)
+                    for tc in test_cases
+                ])
+                print(f"Problem saved with ID: {problem.id} and {len(test_cases)} test cases")
+                return redirect('problem_detail', problem_id=problem.id)
+            else:
+                print("Cannot save: Not all tests passed with current test cases")
+                return await arender(request, 'create_problem.html', {
+                    'problem_form': problem_form,
+                    'test_case_formset': test_case_formset,
+                    'results': results,
+                    'solution_code': solution_code,
+                    'input_vars': input_vars,
+                    'return_type': return_type,
+                    'function_header': function_header,
+                    'header_generated': True,
+                    'test_case_data': test_case_data,
+                    'all_tests_passed': False,
+                    'error': 'All test cases must pass with the current configuration before submitting.',
+                    'selected_tags': selected_tags,
+                    'new_tags': new_tags,
+                    'all_tags': all_tags
+                })
+    print("Form errors:", problem_form.errors, test_case_formset.errors)
+    return await arender(request, 'create_problem.html', {
+        'problem_form': problem_form,
+        'test_case_formset': test_case_formset,
+        'input_vars': input_vars,
+        'return_type': return_type,
+        'function_header': function_header,
+        'header_generated': True,
+        'test_case_data': test_case_data,
+        'error': 'Please correct the errors in the form.',
+        'selected_tags': selected_tags,
+        'new_tags': new_tags,
+        'all_tags': all_tags
+    })
+
+async def load_judge_test_cases(problem):
+    return [
+        type('TestCase', (), {
+            'input_value': tc.input_value,
+            'expected_output': tc.expected_output,
+            'return_type': problem.return_type,
+            'comparison': problem.comparison,
+        }) async for tc in problem.test_cases.all()
+    ]
+
+async def mark_attempted(problem, user):
+    if not await problem.attempted_by.filter(pk=user.pk).aexists():
+        await problem.attempted_by.aadd(user)
+        print(f"User {user.username} marked as attempted problem {problem.id} for the first time")
+
+async def record_accepted_solution(problem, user, code, user_solution=None):
+    if user_solution:
+        user_solution.code = code
+        user_solution.verdict = 'accepted'
+        user_solution.judged_at = timezone.now()
+        await user_solution.asave()
+        print("Updated existing solution")
     else:
-        if 'last_run_results' in request.session:
-            del request.session['last_run_results']
-        problem_form = ProblemForm()
-        return render(request, 'create_problem.html', {
-            'problem_form': problem_form,
-            'input_vars': [],
-            'return_type': 'None',
-            'header_generated': False,
-            'all_tags': Tag.objects.all()
-        })
+        await Solution.objects.acreate(problem=problem, code=code, created_by=user, judged_at=timezone.now())
+        print("Created new solution")
+    if not await problem.solved_by.filter(pk=user.pk).aexists():
+        await problem.solved_by.aadd(user)
+        print(f"User {user.username} marked as solved problem {problem.id} for the first time")
 
 @login_required
-def submit_solution(request, problem_id):
-    problem = get_object_or_404(Problem, id=problem_id)
+async def submit_solution(request, problem_id):
+    problem = await aget_object_or_404(Problem, id=problem_id)
+    user = await request.auser()
     function_header = problem.function_header
-    test_cases = problem.test_cases.all()
-    user_solution = Solution.objects.filter(problem=problem, created_by=request.user).order_by('-created_at').first()
+    user_solutions = Solution.objects.filter(problem=problem, created_by=user).select_related('code_blob')
+    user_solution = await user_solutions.order_by('-created_at').afirst()
     initial_code = user_solution.code if user_solution else function_header
-    solutions = Solution.objects.filter(problem=problem, created_by=request.user) if request.user.is_authenticated else []
-    other_solutions = Solution.objects.filter(problem=problem).exclude(created_by=request.user) if request.user.is_authenticated else Solution.objects.filter(problem=problem)
-    likes = problem.ratings.filter(vote=1).count()
-    dislikes = problem.ratings.filter(vote=-1).count()
+    solutions = [solution async for solution in user_solutions]
+    other_solutions, other_solutions_cursor = await sync_to_async(community_solutions_page)(problem, user)
+    likes = problem.like_count
+    dislikes = problem.dislike_count
+    problem_stats = await ProblemStats.objects.filter(problem=problem).afirst()
 
     context = {
         'problem': problem,
+        'problem_stats': problem_stats,
+        'runtime_distribution': events.runtime_distribution(problem_stats),
         'function_header': function_header,
         'code': initial_code,
         'input_vars': problem.input_vars,
         'return_type': problem.return_type,
         'solutions': solutions,
         'other_solutions': other_solutions,
+        'other_solutions_cursor': other_solutions_cursor,
+        'similar_problems': similarity.similar_to(problem),
         'likes': likes,
         'dislikes': dislikes,
     }
@@ -541,92 +511,159 @@ def submit_solution(request, problem_id):
         if not code:
             print("No code provided")
             context['error'] = 'Please enter code to run or submit.'
-            return render(request, 'problem_detail.html', context)
-
-        test_cases_with_return_type = [
-            type('TestCase', (), {
-                'input_value': tc.input_value,
-                'expected_output': tc.expected_output,
-                'return_type': problem.return_type
-            }) for tc in test_cases
-        ]
+            return await arender(request, 'problem_detail.html', context)
+
+        test_cases_with_return_type = await load_judge_test_cases(problem)
         print(f"Test cases loaded: {len(test_cases_with_return_type)}")
 
         if not test_cases_with_return_type:
             print("No test cases available for this problem")
             context['error'] = 'No test cases defined for this problem.'
-            return render(request, 'problem_detail.html', context)
+            return await arender(request, 'problem_detail.html', context)
 
-        if request.user not in problem.attempted_by.all():
-            problem.attempted_by.add(request.user)
-            print(f"User {request.user.username} marked as attempted problem {problem.id} for the first time")
+        await mark_attempted(problem, user)
 
         if 'run' in request.POST:
             print(f"Run button clicked. Executing code:\n{code}")
             try:
-                results = run_code_in_docker(code, test_cases_with_return_type, problem.input_vars)
-                print(f"Raw results from run_code_in_docker: {results}")
+                async with admission.judge_slot(admission.client_key(request, user)):
+                    results = await judge.run_code_async(code, test_cases_with_return_type, problem.input_vars, **problem.judge_limits)
+                print(f"Raw results from run_code_async: {results}")
+                events.record_results(problem.id, user.id, events.RUN, results, len(test_cases_with_return_type))
                 all_tests_passed = all(result.get('passed', False) for result in results) if results else False
                 if not results:
-                    print("No results returned from run_code_in_docker")
+                    print("No results returned from run_code_async")
                     context['error'] = 'No test results generated. Check your code or test cases.'
-                    return render(request, 'problem_detail.html', context)
+                    return await arender(request, 'problem_detail.html', context)
                 context.update({
                     'results': results,
                     'all_tests_passed': all_tests_passed,
                 })
                 print(f"Processed results: {results}, all_tests_passed: {all_tests_passed}")
-                return render(request, 'problem_detail.html', context)
+                return await arender(request, 'problem_detail.html', context)
+            except admission.Throttled as e:
+                return await render_throttled(request, 'problem_detail.html', context, e)
             except Exception as e:
                 print(f"Error during code execution: {str(e)}")
                 context['error'] = f"Failed to run code: {str(e)}"
-                return render(request, 'problem_detail.html', context)
+                return await arender(request, 'problem_detail.html', context)
         elif 'submit' in request.POST:
             print(f"Submit button clicked. Executing code:\n{code}")
             try:
-                results = run_code_in_docker(code, test_cases_with_return_type, problem.input_vars)
+                async with admission.judge_slot(admission.client_key(request, user)):
+                    results = await judge.run_code_async(code, test_cases_with_return_type, problem.input_vars, **problem.judge_limits)
                 all_tests_passed = all(result.get('passed', False) for result in results) if results else False
-                print(f"Results from run_code_in_docker: {results}, all_tests_passed: {all_tests_passed}")
+                print(f"Results from run_code_async: {results}, all_tests_passed: {all_tests_passed}")
+                events.record_results(problem.id, user.id, events.SUBMIT, results, len(test_cases_with_return_type))
+                await sync_to_async(stats.record_submission)(user.id, all_tests_passed)
                 if all_tests_passed:
-                    if user_solution:
-                        user_solution.code = code
-                        user_solution.save()
-                        print("Updated existing solution")
-                    else:
-                        Solution.objects.create(problem=problem, code=code, created_by=request.user)
-                        print("Created new solution")
-                    if request.user not in problem.solved_by.all():
-                        problem.solved_by.add(request.user)
-                        print(f"User {request.user.username} marked as solved problem {problem.id} for the first time")
+                    await record_accepted_solution(problem, user, code, user_solution)
                     return redirect('problem_detail', problem_id=problem.id)
                 context.update({
                     'results': results,
                     'all_tests_passed': all_tests_passed,
                     'error': 'Solution failed some test cases.',
                 })
-                return render(request, 'problem_detail.html', context)
+                return await arender(request, 'problem_detail.html', context)
+            except admission.Throttled as e:
+                return await render_throttled(request, 'problem_detail.html', context, e)
             except Exception as e:
                 print(f"Error during submission: {str(e)}")
                 context['error'] = f"Error submitting code: {str(e)}"
-                return render(request, 'problem_detail.html', context)
+                return await arender(request, 'problem_detail.html', context)
     else:
         print("GET request to submit_solution")
-        return render(request, 'problem_detail.html', context)
+    return await arender(request, 'problem_detail.html', context)
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@login_required
+async def stream_solution(request, problem_id):
+    """Run (or submit) code and stream each test-case result as a Server-Sent Event.
+
+    Emits one ``case`` event per test case as soon as it finishes, then a
+    ``summary`` event. POST with ``code`` and ``action`` ('run' or 'submit').
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    problem = await aget_object_or_404(Problem, id=problem_id)
+    user = await request.auser()
+    code = request.POST.get('code', '').strip()
+    action = request.POST.get('action', 'run')
+    if not code:
+        return JsonResponse({'error': 'Please enter code to run or submit.'}, status=400)
+    test_cases = await load_judge_test_cases(problem)
+    if not test_cases:
+        return JsonResponse({'error': 'No test cases defined for this problem.'}, status=400)
+    try:
+        slot = await admission.acquire(admission.client_key(request, user))
+    except admission.Throttled as e:
+        response = JsonResponse({'error': str(e), 'retry_after': e.retry_after}, status=e.status)
+        response['Retry-After'] = str(e.retry_after)
+        return response
+
+    async def case_events():
+        started = time.monotonic()
+        results = []
+        async for result in judge.iter_code_async(code, test_cases, problem.input_vars, **problem.judge_limits):
+            result['index'] = len(results)
+            results.append(result)
+            yield sse_event('case', result)
+        total = len(results)
+        passed = sum(bool(result.get('passed')) for result in results)
+        all_passed = total == len(test_cases) and passed == total
+        events.record_results(problem.id, user.id, events.SUBMIT if action == 'submit' else events.RUN,
+                              results, len(test_cases))
+        accepted = False
+        if action == 'submit':
+            await sync_to_async(stats.record_submission)(user.id, all_passed)
+        if action == 'submit' and all_passed:
+            user_solution = await Solution.objects.filter(problem=problem, created_by=user).order_by('-created_at').afirst()
+            await record_accepted_solution(problem, user, code, user_solution)
+            accepted = True
+        yield sse_event('summary', {
+            'total': len(test_cases),
+            'passed': passed,
+            'all_passed': all_passed,
+            'accepted': accepted,
+            'time_ms': round((time.monotonic() - started) * 1000),
+        })
 
+    # From here on the slot belongs to the response; until then, to us
+    try:
+        await mark_attempted(problem, user)
+        response = StreamingHttpResponse(admission.SlotStream(case_events(), slot), content_type='text/event-stream')
+    except BaseException:
+        await admission.release(slot)
+        raise
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let a proxy hold events back
+    return response
+
+PROFILE_PAGE_SIZE = 20
+
+def created_problems_queryset(user):
+    return Problem.objects.filter(created_by=user).only('id', 'title', 'difficulty', 'created_at').order_by('-created_at')
+
+def submitted_solutions_queryset(user):
+    return (Solution.objects.filter(created_by=user).select_related('problem')
+            .only('id', 'created_at', 'problem__id', 'problem__title').order_by('-created_at'))
+
+@use_replica
+@profile_condition
 def profile(request):
     target_username = request.GET.get('user')
     
     if target_username:
         target_user = get_object_or_404(User, username=target_username)
-        profile, created = Profile.objects.get_or_create(user=target_user)
-        problems = Problem.objects.filter(created_by=target_user)
-        solutions = Solution.objects.filter(created_by=target_user)
+        # Read only: creating the row would fire profile_changed and move
+        # every visitor's problem list validators
+        profile = Profile.objects.filter(user=target_user).first() or Profile(user=target_user)
         form = None
     else:
         target_user = request.user
-        profile, created = Profile.objects.get_or_create(user=target_user)
-        problems = Problem.objects.filter(created_by=target_user)
-        solutions = Solution.objects.filter(created_by=target_user)
+        profile = Profile.objects.filter(user=target_user).first() or Profile(user=target_user)
         if request.method == 'POST':
             form = ProfileForm(request.POST, request.FILES, instance=profile)
             if form.is_valid():
@@ -635,78 +672,177 @@ def profile(request):
                 return redirect('profile')
         else:
             form = ProfileForm(instance=profile)
+
+    problems = Paginator(created_problems_queryset(target_user), PROFILE_PAGE_SIZE).get_page(request.GET.get('problems_page'))
+    solutions = Paginator(submitted_solutions_queryset(target_user), PROFILE_PAGE_SIZE).get_page(request.GET.get('solutions_page'))
+    user_stats = UserStats.objects.filter(user=target_user).first() or UserStats(user=target_user)
+    overall_rank = leaderboards.rank(leaderboards.OVERALL, target_user.pk)
     
     return render(request, 'profile.html', {
         'target_user': target_user,
         'profile': profile,
         'problems': problems,
         'solutions': solutions,
+        'user_stats': user_stats,
+        'current_streak': stats.current_streak(user_stats),
+        'overall_rank': overall_rank[0] if overall_rank else None,
         'form': form,
     })
 
-def rate_problem(request, problem_id):
+AVATAR_NAME = re.compile(r'^[0-9a-f]{16}-\d+\.(webp|jpg)$')
+
+def avatar_file(request, name):
+    """A resized profile picture. The names are content hashes, so they can be cached for good."""
+    if not AVATAR_NAME.match(name):
+        raise Http404("No such avatar")
+    path = f'{avatars.DIRECTORY}/{name}'
+    if not default_storage.exists(path):
+        raise Http404("No such avatar")
+    content_type = 'image/webp' if name.endswith('.webp') else 'image/jpeg'
+    response = FileResponse(default_storage.open(path, 'rb'), content_type=content_type)
+    response['Cache-Control'] = f'public, max-age={avatars.CACHE_MAX_AGE}, immutable'
+    return response
+
+SUGGESTIONS_MAX_AGE = 30
+
+def search_suggestions(request):
+    """Type-ahead for the search box: problems and tags whose words start with ?q=, most solved first."""
+    try:
+        limit = min(max(int(request.GET.get('limit', autocomplete.DEFAULT_LIMIT)), 1), autocomplete.MAX_LIMIT)
+    except ValueError:
+        limit = autocomplete.DEFAULT_LIMIT
+    list_url = reverse('problem_list')
+    results = []
+    for kind, pk, label, score in autocomplete.search(request.GET.get('q', ''), limit):
+        if kind == autocomplete.PROBLEM:
+            results.append({'type': kind, 'label': label, 'solves': score,
+                            'url': reverse('problem_detail', args=[pk])})
+        else:
+            results.append({'type': kind, 'label': label, 'problems': score,
+                            'url': f'{list_url}?{urlencode({"tags": label})}'})
+    response = JsonResponse({'results': results})
+    # The same for everyone, and a little staleness is fine
+    response['Cache-Control'] = f'public, max-age={SUGGESTIONS_MAX_AGE}'
+    return response
+
+def leaderboard(request):
+    board = request.GET.get('board', leaderboards.OVERALL)
+    if not leaderboards.is_board(board):
+        raise Http404("No such leaderboard")
+    total = leaderboards.board_size(board)
+    # Like Paginator.get_page: garbage means the first page, past the end the last one
+    last_page = max(math.ceil(total / leaderboards.PAGE_SIZE), 1)
+    try:
+        page = min(max(int(request.GET.get('page', 1)), 1), last_page)
+    except ValueError:
+        page = 1
+    offset = (page - 1) * leaderboards.PAGE_SIZE
+    entries = leaderboards.top(board, offset, leaderboards.PAGE_SIZE)
+    my_rank = leaderboards.rank(board, request.user.pk) if request.user.is_authenticated else None
+
+    boards = [leaderboards.OVERALL] + list(leaderboards.WINDOWS) + [
+        leaderboards.difficulty_board(choice) for choice, _ in Problem.DIFFICULTY_CHOICES
+    ]
+    return render(request, 'leaderboard.html', {
+        'board': board,
+        'board_label': leaderboards.board_label(board),
+        'boards': [(key, leaderboards.board_label(key)) for key in boards],
+        'tag_boards': [(leaderboards.tag_board(pk), name) for pk, name in Tag.objects.order_by('name').values_list('pk', 'name')],
+        'entries': entries,
+        'my_rank': my_rank,
+        'page': page,
+        'has_previous': page > 1,
+        'has_next': offset + len(entries) < total,
+        'total': total,
+    })
+
+def community_solutions(request, problem_id):
     problem = get_object_or_404(Problem, id=problem_id)
-    print(f"Rate problem {problem_id} by {request.user.username}")
-    if request.method == 'POST':
-        vote = request.POST.get('vote')
-        print(f"Received vote: {vote}")
-        try:
-            vote = int(vote)
-            if vote not in [1, -1, 0]:
-                print("Invalid vote value")
-                return JsonResponse({'error': 'Invalid vote'}, status=400)
-            
-            rating = ProblemRating.objects.filter(problem=problem, user=request.user).first()
-            if vote == 0:
-                if rating:
-                    rating.delete()
-                    print(f"Rating removed for user {request.user.username}")
-                user_vote = 0
-            else:
-                rating, created = ProblemRating.objects.get_or_create(
-                    problem=problem,
-                    user=request.user,
-                    defaults={'vote': vote}
-                )
-                if not created:
-                    rating.vote = vote
-                    rating.save()
-                print(f"Rating saved: vote={vote}, created={created}")
-                user_vote = vote
-            
-            likes = problem.ratings.filter(vote=1).count()
-            dislikes = problem.ratings.filter(vote=-1).count()
-            response = {
-                'likes': likes,
-                'dislikes': dislikes,
-                'net_rating': likes - dislikes,
-                'user_vote': user_vote,
-            }
-            print(f"Returning response: {response}")
-            return JsonResponse(response)
-        except ValueError:
-            print("Vote could not be converted to int")
-            return JsonResponse({'error': 'Vote must be an integer'}, status=400)
-        except Exception as e:
-            print(f"Error saving rating: {str(e)}")
-            return JsonResponse({'error': f'Server error: {str(e)}'}, status=500)
-    print("Not a POST request")
-    return JsonResponse({'error': 'Invalid request'}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', COMMUNITY_SOLUTIONS_PAGE_SIZE)), 1), 50)
+        solutions, next_cursor = community_solutions_page(problem, request.user, request.GET.get('cursor'), limit)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor or limit'}, status=400)
+    return JsonResponse({
+        'solutions': [{
+            'id': solution.id,
+            'author': solution.created_by.username,
+            'avatar': avatars.sources(solution.created_by, 'small'),
+            'created_at': solution.created_at.isoformat(),
+            'preview': solution.preview,
+            'truncated': solution.truncated,
+        } for solution in solutions],
+        'next_cursor': next_cursor,
+    })
+
+def solution_code(request, solution_id):
+    solution = get_object_or_404(Solution.objects.select_related('code_blob').only('id', 'code_blob'), id=solution_id)
+    return JsonResponse({'id': solution.id, 'code': solution.code})
+
+def rate_problem(request, problem_id):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Login required'}, status=401)
+    try:
+        vote = int(request.POST.get('vote'))
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'Vote must be an integer'}, status=400)
+    if vote not in [1, -1, 0]:
+        return JsonResponse({'error': 'Invalid vote'}, status=400)
+    try:
+        likes, dislikes = interactions.set_vote(problem_id, request.user.id, vote)
+    except interactions.ProblemNotFound:
+        return JsonResponse({'error': 'Problem not found'}, status=404)
+    return JsonResponse({
+        'likes': likes,
+        'dislikes': dislikes,
+        'net_rating': likes - dislikes,
+        'user_vote': vote,
+    })
 
 def toggle_favorite(request, problem_id):
-    problem = get_object_or_404(Problem, id=problem_id)
-    if request.method == 'POST':
-        favorite, created = FavoriteProblem.objects.get_or_create(
-            problem=problem,
-            user=request.user
-        )
-        if not created:
-            favorite.delete()
-            is_favorited = False
-        else:
-            is_favorited = True
-        return JsonResponse({'is_favorited': is_favorited})
-    return JsonResponse({'error': 'Invalid request'}, status=400)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Login required'}, status=401)
+    try:
+        is_favorited, favorites = interactions.toggle_favorite(problem_id, request.user.id)
+    except interactions.ProblemNotFound:
+        return JsonResponse({'error': 'Problem not found'}, status=404)
+    return JsonResponse({'is_favorited': is_favorited, 'favorites': favorites})
+
+def _problem_id(value):
+    # int(1e400) overflows; ids past 2**63 overflow the database driver instead
+    problem_id = int(value)
+    if not 0 < problem_id < 2 ** 63:
+        raise ValueError(f'Problem id out of range: {problem_id}')
+    return problem_id
+
+def batch_interactions(request):
+    """Apply many votes/favorites in one transaction.
+
+    Body: {"votes": [{"problem": 1, "vote": 1}, ...], "favorites": [{"problem": 2, "favorited": true}, ...]}
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Login required'}, status=401)
+    try:
+        payload = json.loads(request.body)
+        votes = [(_problem_id(item['problem']), int(item['vote'])) for item in payload.get('votes', [])]
+        favorites = [(_problem_id(item['problem']), bool(item['favorited'])) for item in payload.get('favorites', [])]
+    except (ValueError, TypeError, KeyError, AttributeError, OverflowError):
+        return JsonResponse({'error': 'Malformed batch'}, status=400)
+    if any(vote not in [1, -1, 0] for _, vote in votes):
+        return JsonResponse({'error': 'Invalid vote'}, status=400)
+    if len(votes) + len(favorites) > MAX_BATCH_INTERACTIONS:
+        return JsonResponse({'error': f'At most {MAX_BATCH_INTERACTIONS} changes per batch'}, status=400)
+    try:
+        results = interactions.apply_batch(request.user.id, votes, favorites)
+    except interactions.ProblemNotFound as e:
+        return JsonResponse({'error': f'Problem {e} not found'}, status=404)
+    return JsonResponse({'results': {str(problem_id): result for problem_id, result in results.items()}})
 
 def delete_problem(request, problem_id):
     problem = get_object_or_404(Problem, id=problem_id)